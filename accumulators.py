@@ -0,0 +1,97 @@
+import heapq
+import math
+from array import array
+from itertools import compress
+from utils import np
+
+
+def array_top(doc_ids, scores, k: int) -> list:
+    #   the k best (doc_id, score) pairs of aligned numpy arrays, ties are broken by the lowest doc id as in ScoreAccumulator
+    candidates = np.arange(len(scores))
+    if 0 < k < len(scores):
+        kth = np.partition(scores, len(scores) - k)[len(scores) - k]
+        candidates = np.flatnonzero(scores >= kth)
+    order = candidates[np.lexsort((doc_ids[candidates], -scores[candidates]))][:k]
+    return list(zip(doc_ids[order].tolist(), scores[order].tolist()))
+
+
+class ScoreAccumulator:
+
+    #   a query with at least N / dense_ratio postings accumulates in a dense array indexed by doc id,
+    #   more selective queries use a dict with only the matched documents. With numpy the dense scores are
+    #   added a whole posting list at a time and the top-k is selected with array operations
+    dense_ratio = 16
+
+    def __init__(self, N: int, nr_postings: int) -> None:
+        self.N = N
+        self.dense = nr_postings * self.dense_ratio >= N
+        self.vectorized = self.dense and np is not None
+        if self.vectorized:
+            self.scores = np.zeros(N)
+            self.matched = np.zeros(N, dtype=bool)
+        elif self.dense:
+            self.scores = array("d", bytes(8 * N))
+            self.matched = bytearray(N)
+        else:
+            self.scores = {}
+
+    def __len__(self):
+        if self.vectorized:
+            return int(np.count_nonzero(self.matched))
+        if self.dense:
+            return self.matched.count(1)
+        return len(self.scores)
+
+    def add(self, doc_ids, scores):
+        #   doc_ids and scores are aligned sequences or arrays, every doc id appears once in a call
+        acc = self.scores
+        if self.vectorized:
+            doc_ids = np.asarray(doc_ids, dtype=np.intp)
+            np.add.at(acc, doc_ids, np.asarray(scores, dtype=np.float64))
+            self.matched[doc_ids] = True
+            return
+
+        if np is not None and isinstance(scores, np.ndarray):
+            scores = scores.tolist()
+        if self.dense:
+            matched = self.matched
+            for doc_id, score in zip(doc_ids, scores):
+                acc[doc_id] += score
+                matched[doc_id] = 1
+        else:
+            get = acc.get
+            for doc_id, score in zip(doc_ids, scores):
+                acc[doc_id] = get(doc_id, 0.0) + score
+
+    def doc_ids(self):
+        #   matched documents in doc id order, so ties are broken by the lowest doc id
+        if self.vectorized:
+            return iter(np.flatnonzero(self.matched).tolist())
+        if self.dense:
+            return compress(range(self.N), self.matched)
+        return iter(sorted(self.scores))
+
+    def get(self, doc_id: int) -> float:
+        return float(self.scores[doc_id])
+
+    def roots(self):
+        #   square roots of the accumulated scores, indexed by doc id
+        if self.vectorized:
+            return np.sqrt(self.scores)
+        if self.dense:
+            return array("d", map(math.sqrt, self.scores))
+        return {doc_id: math.sqrt(score) for doc_id, score in self.scores.items()}
+
+    def top(self, k: int, norms=None):
+        #   the k best (doc_id, score) pairs, the scores are divided by the norms of the documents when they are given
+        if self.vectorized:
+            doc_ids = np.flatnonzero(self.matched)
+            scores = self.scores[doc_ids]
+            if norms is not None:
+                divisors = np.asarray(norms)[doc_ids]
+                scores = scores / np.where(divisors == 0, 1, divisors)
+            return array_top(doc_ids, scores, k)
+
+        acc = self.scores
+        score = acc.__getitem__ if norms is None else lambda doc_id: acc[doc_id] / (norms[doc_id] or 1)
+        return [(doc_id, score(doc_id)) for doc_id in heapq.nlargest(k, self.doc_ids(), key=score)]
@@ -0,0 +1,59 @@
+import math
+from array import array
+from index_reader import map_file
+from postings import load_offsets
+from utils import np, rsv, rsv_array
+
+#   bm25 cache that does not depend on k1 and b, the columns follow the order of the lexicon:
+#       {path}_idf      idf of every term (d)
+#       {path}_doc_ids  doc id of every posting (I)
+#       {path}_tfs      term frequency of every posting (I)
+#       {path}_dls      length of the document of every posting (I)
+#       {path}_offsets  first posting of every term and the total number of postings (Q)
+#   the scores of a term are computed for the k1 and b of the search from the columns of its postings
+
+
+def write_bm25_tf_cache(reader, lengths, N: int, path: str):
+    #   writes the columns of the postings of the index of the reader, lengths is the length of every document
+    idfs = array("d")
+    offsets = array("Q", [0])
+    with open(f"{path}_doc_ids", "wb") as doc_ids_file, open(f"{path}_tfs", "wb") as tfs_file, open(f"{path}_dls", "wb") as dls_file:
+        for _, doc_ids, tfs in reader:
+            idfs.append(math.log10(N / len(doc_ids)))
+            array("I", doc_ids).tofile(doc_ids_file)
+            array("I", tfs).tofile(tfs_file)
+            array("I", map(lengths.__getitem__, doc_ids)).tofile(dls_file)
+            offsets.append(offsets[-1] + len(doc_ids))
+
+    with open(f"{path}_idf", "wb") as f:
+        idfs.tofile(f)
+    with open(f"{path}_offsets", "wb") as f:
+        offsets.tofile(f)
+
+
+class BM25TFCache:
+
+    def __init__(self, path: str, avgdl: float) -> None:
+        self.idfs = memoryview(map_file(f"{path}_idf")).cast("d")
+        self.doc_ids = memoryview(map_file(f"{path}_doc_ids")).cast("I")
+        self.tfs = memoryview(map_file(f"{path}_tfs")).cast("I")
+        self.dls = memoryview(map_file(f"{path}_dls")).cast("I")
+        self.offsets = load_offsets(f"{path}_offsets")
+        self.avgdl = avgdl
+
+    def postings(self, ordinal: int, bm25_k1: float, bm25_b: float):
+        #   (doc_ids, scores, upper_bound) of the term, the bound is the score of the highest tf in the shortest document.
+        #   The scores are an array with numpy
+        start, end = self.offsets[ordinal], self.offsets[ordinal + 1]
+        idf = self.idfs[ordinal]
+        tfs, dls = self.tfs[start:end], self.dls[start:end]
+
+        if np is None:
+            scores = [rsv(bm25_b, bm25_k1, idf, tf, dl, self.avgdl) for tf, dl in zip(tfs, dls)]
+            upper_bound = rsv(bm25_b, bm25_k1, idf, max(tfs), min(dls), self.avgdl)
+        else:
+            #   the columns are read in place and scored with array operations
+            tfs, dls = np.frombuffer(tfs, dtype=np.uint32), np.frombuffer(dls, dtype=np.uint32)
+            scores = rsv_array(bm25_b, bm25_k1, idf, tfs, dls, self.avgdl)
+            upper_bound = rsv(bm25_b, bm25_k1, idf, int(tfs.max()), int(dls.min()), self.avgdl)
+        return self.doc_ids[start:end].tolist(), scores, upper_bound
@@ -0,0 +1,50 @@
+import json
+import os
+import random
+import pytest
+from indexer import Indexer
+from memory_manager import MemoryManager
+from searcher import Searcher
+from tokenizer import Tokenizer
+
+STOPWORDS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "default_stopwords.txt")
+
+
+@pytest.fixture
+def collection(tmp_path, monkeypatch):
+    #   the indexer asks before merging and the tokenizer and the memory manager are singletons
+    monkeypatch.setattr("builtins.input", lambda prompt="": "")
+    monkeypatch.setattr(Tokenizer, "_Tokenizer__instance", None)
+    monkeypatch.setattr(MemoryManager, "_MemoryManager__instance", None)
+    random.seed(0)
+    words = [f"word{i}" for i in range(300)]
+    with open(tmp_path / "collection.jsonl", "w") as f:
+        for pmid in range(500):
+            text = " ".join(random.choices(words, weights=range(300, 0, -1), k=random.randint(5, 80)))
+            f.write(json.dumps({"pmid": str(pmid), "title": text[:20], "abstract": text[20:]}) + "\n")
+    return tmp_path
+
+
+@pytest.fixture
+def build(collection):
+    def build(name: str, **kwargs):
+        #   index of the collection in its own folder, built again over an earlier build of the same name.
+        #   Returns the folder and its metadata
+        folder = f"{collection}/{name}/"
+        os.makedirs(folder, exist_ok=True)
+        Tokenizer._Tokenizer__instance = None
+        MemoryManager._MemoryManager__instance = None
+        options = {"index_format": "binary", "stopwords_path": STOPWORDS, "regular_exp": "[a-zA-Z0-9]{3,}", "lowercase": True, **kwargs}
+        Indexer(path_to_collection=f"{collection}/collection.jsonl", index_output_path=folder, **options).index()
+        with open(f"{folder}metadata.json") as f:
+            return folder, json.load(f)
+    return build
+
+
+@pytest.fixture
+def searcher(collection):
+    def searcher(folder: str, **kwargs):
+        #   searcher of an index built by build, in batch mode unless it is given
+        Tokenizer._Tokenizer__instance = None
+        return Searcher(**{"searcher_mode": "batch", "index_folder": folder, **kwargs})
+    return searcher
@@ -0,0 +1,73 @@
+import mmap
+from array import array
+
+#   document table file layout (native byte order, widest columns first so every column stays aligned):
+#       number of documents (Q)
+#       pmid offset (Q) * (n + 1)
+#       document length (I) * n
+#       pmids, utf-8 encoded in doc id order
+
+
+class DocumentTableWriter:
+
+    def __init__(self) -> None:
+        self.pmids = bytearray()
+        self.pmid_offsets = array("Q", [0])
+        self.lengths = array("I")
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def add(self, pmid: str, length: int):
+        #   documents must be added in doc id order
+        self.pmids += pmid.encode("utf-8")
+        self.pmid_offsets.append(len(self.pmids))
+        self.lengths.append(length)
+
+    def add_mapping(self, path: str):
+        #   read the document mapping in the format: pmid:length
+        with open(path, "r") as doc_map:
+            for line in doc_map:
+                pmid, length = line.rsplit(":", 1)
+                self.add(pmid, int(length))
+
+    def statistics(self):
+        #   collection statistics stored in the metadata of the index
+        total_tokens = sum(self.lengths)
+        return {"N": len(self), "total_tokens": total_tokens, "avgdl": total_tokens / len(self) if len(self) else 0}
+
+    def write(self, path: str):
+        with open(path, "wb") as f:
+            array("Q", [len(self.lengths)]).tofile(f)
+            for column in (self.pmid_offsets, self.lengths):
+                column.tofile(f)
+            f.write(self.pmids)
+
+
+class DocumentTable:
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        #   every column is a zero-copy view over the mapped file
+        view = memoryview(self.buffer)
+        n = view[:8].cast("Q")[0]
+        pos = 8
+        columns = []
+        for fmt, size in (("Q", n + 1), ("I", n)):
+            end = pos + size * array(fmt).itemsize
+            columns.append(view[pos:end].cast(fmt))
+            pos = end
+        self.pmid_offsets, self.lengths = columns
+        self.pmids = view[pos:]
+        self.size = n
+
+    def __len__(self):
+        return self.size
+
+    def pmid(self, doc_id: int) -> str:
+        return str(self.pmids[self.pmid_offsets[doc_id]:self.pmid_offsets[doc_id + 1]], "utf-8")
+
+    def length(self, doc_id: int) -> int:
+        return self.lengths[doc_id]
@@ -2,24 +2,45 @@ import json
 from math import log2
 
 class Evaluator:
-    def __init__(self, gold_standard_file: str, run_file: str, metrics: list = ["F1", "DCG", "AP", "precision", "recall"]):
+
+    #   key of every metric in the results of compute
+    metric_names = {"F1": "F-measure", "DCG": "Discounted Cumulative Gain (DCG)", "AP": "Average Precision (AP)", "precision": "Precision", "recall": "Recall"}
+    cutoffs = [10, 50, 100]
+
+    def __init__(self, gold_standard_file: str, run_file: str = None, metrics: list = ["F1", "DCG", "AP", "precision", "recall"]):
 
         self.gold_standard_file_name = gold_standard_file.split("/")[-1].split(".")[0]
         self.gold_standard_file = self.load_files(gold_standard_file)
-        self.run_file = self.load_files(run_file)
+        #   without a run file the runs are given to compute, already in memory
+        self.run_file = self.load_files(run_file) if run_file else None
         self.metrics = metrics
             
     def evaluate(self):
+        evals = self.compute(self.run_file)
+
+        # Save results to file
+        with open(f"{self.gold_standard_file_name}_eval.json", "w") as f:
+            f.write("[")
+            json.dump({"query_file_name":self.gold_standard_file_name},f)
+            f.write(",\n")
+            json.dump(evals, f, indent=4)
+            f.write("]")
+
+        self.eval_results = evals
+        self.print_results()
+
+    def compute(self, run: list) -> dict:
+        #   metrics of a run, a list with the ranked documents of every question in the order of the gold standard
         evals = {}
         
-        for j in [10, 50, 100]:
+        for j in self.cutoffs:
             precision_list = []
             recall_list = []
             f_measure_list = []
             average_precision_list = []
             dcg_list = []
 
-            for gold_query, run_query in zip(self.gold_standard_file, self.run_file):
+            for gold_query, run_query in zip(self.gold_standard_file, run):
                 gold_pmid = set(gold_query["documents_pmid"])
                 run_pmid = set(run_query["documents_pmid"][:j])
                 intersection = gold_pmid.intersection(run_pmid)
@@ -65,16 +86,7 @@ class Evaluator:
                 "Discounted Cumulative Gain (DCG)": avg_dcg
             }
 
-        # Save results to file
-        with open(f"{self.gold_standard_file_name}_eval.json", "w") as f:
-            f.write("[")
-            json.dump({"query_file_name":self.gold_standard_file_name},f)
-            f.write(",\n")
-            json.dump(evals, f, indent=4)
-            f.write("]")
-
-        self.eval_results = evals
-        self.print_results()
+        return evals
 
     def print_results(self,):
 
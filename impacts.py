@@ -0,0 +1,71 @@
+import mmap
+import os
+from array import array
+from postings import decode_gaps, decode_varint, encode_gaps, encode_varint, load_offsets
+
+#   impact ordered file layout, the lists of the terms follow the order of the lexicon and every list is:
+#       segment_count (impact count length) * segment_count segment segment ...
+#   a segment holds the gap encoded doc ids of the postings with the same impact, the segments are sorted by
+#   decreasing impact. An impact is the BM25 score quantized to bits bits, score = impact * scale
+
+
+def write_impact_index(reader, path: str, bits: int = 8) -> float:
+    #   writes the impact ordered lists of the scores of the cache of the reader, returns the scale
+    levels = (1 << bits) - 1
+    if reader.cache_max_scores is not None:
+        max_score = max(reader.cache_max_scores, default=0)
+    else:
+        max_score = max((max(reader.cache_postings_at(ordinal)[1], default=0) for ordinal in range(len(reader.lexicon))), default=0) * reader.cache_scale
+    scale = max_score / levels or 1.0
+
+    offsets = array("Q", [0])
+    with open(path, "wb") as f:
+        for ordinal in range(len(reader.lexicon)):
+            segments = {}
+            for doc_id, score in zip(*reader.cache_postings_at(ordinal)):
+                #   postings that round to a zero impact add nothing to the scores and are left out
+                impact = min(levels, round(score * reader.cache_scale / scale))
+                if impact > 0:
+                    segments.setdefault(impact, []).append(doc_id)
+
+            header, data = bytearray(), bytearray()
+            encode_varint(len(segments), header)
+            for impact in sorted(segments, reverse=True):
+                segment = encode_gaps(segments[impact])
+                encode_varint(impact, header)
+                encode_varint(len(segments[impact]), header)
+                encode_varint(len(segment), header)
+                data += segment
+            f.write(header)
+            f.write(data)
+            offsets.append(offsets[-1] + len(header) + len(data))
+
+    with open(f"{path}_offsets", "wb") as f:
+        offsets.tofile(f)
+    return scale
+
+
+class ImpactIndex:
+
+    def __init__(self, path: str, scale: float) -> None:
+        with open(path, "rb") as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(path) else b""
+        self.offsets = load_offsets(f"{path}_offsets")
+        self.scale = scale
+
+    def segments(self, ordinal: int) -> list:
+        #   (impact, count, doc ids) of every segment of the list, the doc ids are decoded when they are called
+        pos = self.offsets[ordinal]
+        count, pos = decode_varint(self.buffer, pos)
+        headers = []
+        for _ in range(count):
+            impact, pos = decode_varint(self.buffer, pos)
+            postings, pos = decode_varint(self.buffer, pos)
+            length, pos = decode_varint(self.buffer, pos)
+            headers.append((impact, postings, length))
+
+        segments = []
+        for impact, postings, length in headers:
+            segments.append((impact, postings, lambda start=pos, end=pos + length: decode_gaps(self.buffer[start:end])))
+            pos += length
+        return segments
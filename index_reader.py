@@ -0,0 +1,141 @@
+import mmap
+import os
+from array import array
+from lexicon import Lexicon
+from postings import *
+from intersection import ListCursor, SkipCursor
+
+
+def map_file(path: str):
+    #   read only mapping of a whole file, the OS page cache does the caching
+    with open(path, "rb") as f:
+        if not os.path.getsize(path):
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class IndexReader:
+
+    def __init__(self, index_folder: str, index_format: str = "text", positional: bool = False, cache_file: str = None, skip_block_size: int = 0,
+                 cache_bits: int = 0, cache_scale: float = 1.0) -> None:
+        self.index_format = index_format
+        self.positional = positional
+        #   binary postings of an index built with skip blocks start with the skip data
+        self.skips = index_format == "binary" and skip_block_size > 0
+
+        #   the lexicon holds the byte offset of every term in the index
+        self.lexicon = Lexicon(f"{index_folder}lexicon")
+        self.index = memoryview(map_file(f"{index_folder}index"))
+
+        #   cache lines follow the order of the lexicon
+        self.cache = None
+        #   the values of a quantized cache are integers, score = value * cache_scale
+        self.cache_bits = cache_bits
+        self.cache_scale = cache_scale if cache_bits else 1.0
+        if cache_file:
+            self.cache = memoryview(map_file(cache_file))
+            if cache_bits:
+                self.cache = self.cache.cast("B" if cache_bits == 8 else "H")
+            self.cache_offsets = load_offsets(f"{cache_file}_offsets")
+            self.cache_max_scores = None
+            if os.path.exists(f"{cache_file}_max_scores"):
+                self.cache_max_scores = array("d")
+                with open(f"{cache_file}_max_scores", "rb") as f:
+                    self.cache_max_scores.frombytes(f.read())
+
+    def raw_postings(self, term: str):
+        #   zero-copy slice with the postings of the term, None if the term is not indexed
+        entry = self.lexicon.get(term)
+        if entry is None:
+            return None
+        _, offset, length, _, _ = entry
+        return self.index[offset:offset + length]
+
+    def postings(self, term: str):
+        #   returns the doc ids and the term frequencies of the term
+        data = self.raw_postings(term)
+        if data is None:
+            return None
+        return self.decode(data)
+
+    def __iter__(self):
+        #   iterate over (term, doc_ids, tfs) in the order of the lexicon
+        lexicon = self.lexicon
+        for ordinal in range(len(lexicon)):
+            offset = lexicon.offsets[ordinal]
+            yield str(lexicon.term(ordinal), "utf-8"), *self.decode(self.index[offset:offset + lexicon.lengths[ordinal]])
+
+    def decode(self, data):
+        if self.index_format == "binary":
+            _, payload, _ = decode_record(data)
+            if self.skips:
+                payload = skip_blocks(payload, self.positional)
+                if self.positional:
+                    return decode_positional_skip_blocks(payload)[:2]
+            if self.positional:
+                return decode_positional_postings(payload)[:2]
+            return decode_postings(payload)
+
+        doc_ids, tfs = [], []
+        for doc in str(data, "utf-8").split(";")[1:]:
+            doc_id, tf = doc.split(":")
+            doc_ids.append(int(doc_id))
+            #   positional entries are doc:pos,pos,...
+            tfs.append(tf.count(",") + 1 if self.positional else int(tf))
+        return doc_ids, tfs
+
+    def cursor(self, term: str):
+        #   cursor over the postings of the term for conjunctive queries, None if the term is not indexed
+        entry = self.lexicon.get(term)
+        if entry is None:
+            return None
+        _, offset, length, df, _ = entry
+        data = self.index[offset:offset + length]
+        if self.skips:
+            _, payload, _ = decode_record(data)
+            return SkipCursor(payload, df, self.positional)
+
+        if self.positional and self.index_format == "binary":
+            _, payload, _ = decode_record(data)
+            doc_ids, tfs, positions = decode_positional_postings(payload)
+            return ListCursor(doc_ids, tfs, positions.__getitem__)
+        if self.positional:
+            #   the positions of a document are only parsed when they are needed
+            docs = str(data, "utf-8").split(";")[1:]
+            doc_ids, tfs = self.decode(data)
+            return ListCursor(doc_ids, tfs, lambda i: [int(pos) for pos in docs[i][docs[i].index(":") + 1:].split(",")])
+        return ListCursor(*self.decode(data))
+
+    def cache_postings(self, term: str):
+        #   returns the doc ids and the cached scores of the term, in units of cache_scale
+        ordinal = self.lexicon.find(term)
+        if ordinal is None:
+            return None
+        return self.cache_postings_at(ordinal)
+
+    def cache_postings_at(self, ordinal: int):
+        if self.cache_bits:
+            #   the quantized scores follow the order of the postings of the term in the index
+            offset = self.lexicon.offsets[ordinal]
+            doc_ids, _ = self.decode(self.index[offset:offset + self.lexicon.lengths[ordinal]])
+            return doc_ids, self.cache[self.cache_offsets[ordinal]:self.cache_offsets[ordinal + 1]].tolist()
+
+        doc_ids, scores = [], []
+        for doc in str(self.cache[self.cache_offsets[ordinal]:self.cache_offsets[ordinal + 1]], "utf-8").split(";")[1:]:
+            doc_id, score = doc.split(":")
+            doc_ids.append(int(doc_id))
+            scores.append(float(score))
+        return doc_ids, scores
+
+    def cache_max_score(self, term: str):
+        #   highest cached score of the term, None if the cache does not store it
+        ordinal = self.lexicon.find(term)
+        if ordinal is None or self.cache_max_scores is None:
+            return None
+        if self.cache_bits:
+            return round(self.cache_max_scores[ordinal] / self.cache_scale)
+        return self.cache_max_scores[ordinal]
+
+    def df(self, term: str):
+        entry = self.lexicon.get(term)
+        return entry[3] if entry else 0
@@ -1,18 +1,44 @@
 import time
+import heapq
+import statistics
+import multiprocessing
+from collections import Counter, deque
+from itertools import chain, islice, repeat
 from memory_manager import MemoryManager
 from tokenizer import Tokenizer
-from reader import JsonReader, Reader
+from reader import JsonReader, Reader, RunReader
 import os
+try:
+    import resource
+except ImportError:
+    resource = None
 from utils import *
-import linecache
+from postings import *
+from lexicon import Lexicon, LexiconWriter
+from documents import DocumentTableWriter
+from index_reader import IndexReader
+from impacts import write_impact_index
+from bm25_cache import write_bm25_tf_cache
 import json
+from array import array
+
+#   indexer shared with the worker processes of the parallel indexing
+_worker_indexer = None
+
+def _init_worker(indexer):
+    global _worker_indexer
+    _worker_indexer = indexer
+
+def _invert_block(block_number: int, first_doc_id: int, docs: list):
+    return _worker_indexer.invert_block(block_number, first_doc_id, docs)
 
 class Indexer:
     
     def __init__(self, path_to_collection: str, index_output_path: str,
-                 index_algorithm: str = "SPIMI", memory_threshold: int = None, store_term_positions: bool = False, 
-                 bm25_cache_in_disk: bool = False, bm25_k1: float = 1.2, bm25_b: float = 0.75,
-                 tfidf_cache_in_disk: bool = False, tfidf_smart: str = "lnc.ltc",
+                 index_algorithm: str = "SPIMI", memory_threshold: int = None, memory_high_water: float = 0.9, store_term_positions: bool = False, workers: int = 1,
+                 bm25_cache_in_disk: bool = False, bm25_k1: float = 1.2, bm25_b: float = 0.75, bm25_impact_ordered: bool = False, bm25_impact_bits: int = 8, bm25_tf_cache: bool = False,
+                 tfidf_cache_in_disk: bool = False, tfidf_smart: str = "lnc.ltc", index_format: str = "text", skip_block_size: int = 128, cache_bits: int = 0,
+                 biwords: int = 0, biwords_path: str = None, biword_terms: int = 1000,
                  minL: int = 0, stopwords_path: str = "default_stopwords.txt", stemmer: str = None, regular_exp: str = "", lowercase: bool = False) -> None:
         
         #   check if the index algorithm is valid
@@ -25,13 +51,11 @@ class Indexer:
             raise NotImplementedError
         
         #   start the memory manager
-        self.memory_manager = MemoryManager(memory_threshold)
+        self.memory_manager = MemoryManager(memory_threshold, memory_high_water)
 
         #   read the collection
-        if path_to_collection.endswith(".jsonl") or path_to_collection.endswith(".json.gz"):
-            self.reader = JsonReader(path_to_collection).read()
-        else:
-            self.reader = Reader(path_to_collection).read()
+        self.path_to_collection = path_to_collection
+        self.reader = self.open_collection()
 
         #   check if the cache options are valid
         if bm25_cache_in_disk and tfidf_cache_in_disk:
@@ -48,13 +72,53 @@ class Indexer:
         else:
             self.cache = None
 
-        #   '\0' is the lowest unicode character
-        self.last_term = '\0'
-        self.last_index = 0
+        #   the bm25 cache can also be written as impact ordered lists for the time budgeted searches
+        if bm25_impact_ordered and not bm25_cache_in_disk:
+            raise ValueError("Cannot use bm25_impact_ordered without bm25_cache_in_disk")
+        self.impact_ordered = bm25_impact_ordered
+        #   bits of the quantized scores of the impact ordered lists, more bits are closer to the bm25 and make more segments
+        if not 1 <= bm25_impact_bits <= 16:
+            raise ValueError(f"Invalid impact bits: {bm25_impact_bits}")
+        self.impact_bits = bm25_impact_bits
+
+        #   the parts of the bm25 that do not depend on k1 and b, so any k1 and b is searched without re-indexing
+        if bm25_tf_cache and isinstance(self, Positional_Indexer):
+            raise ValueError("Cannot use bm25_tf_cache with positional indexer")
+        self.bm25_tf_cache = bm25_tf_cache
+
+        #   adjacent token pairs indexed as their own lists, read from a file or the most frequent pairs of the most common terms
+        if (biwords or biwords_path) and not store_term_positions:
+            raise ValueError("Cannot index biwords without the term positions")
+        self.biwords = biwords
+        self.biwords_path = biwords_path
+        self.biword_terms = biword_terms
+
+        #   the document vectors are normalized with the weighting scheme of the tf-idf documents
+        self.tfidf_smart = tfidf_smart.split(".")[0]
+
+        #   check if the index format is valid
+        if index_format not in ("text", "binary"):
+            raise ValueError(f"Invalid index format: {index_format}")
+        self.index_format = index_format
+        #   binary posting lists start with the last doc id and the length of every block of postings, so a
+        #   conjunctive query only decodes the blocks that can hold its candidates
+        self.skip_block_size = skip_block_size if index_format == "binary" else 0
+        self.cache_offsets = array("Q")
+        #   caches with cache_bits store the scores quantized to 8 or 16 bits in the order of the postings of the index,
+        #   instead of "doc:score" text lines. The offsets of a quantized cache count postings instead of bytes
+        if cache_bits not in (0, 8, 16):
+            raise ValueError(f"Invalid cache bits: {cache_bits}")
+        self.cache_bits = cache_bits
+        #   score = value * cache_scale, set when the cache is quantized
+        self.cache_scale = 1.0
+        self.cache_postings = 0
+        #   highest score of every term in the cache, used to skip documents while searching
+        self.cache_max_scores = array("d")
 
         #   start the tokenizer
         self.tokenizer = Tokenizer(regular_exp=regular_exp, stemmer=stemmer, stopwords_path=stopwords_path, minL=minL, lowercase=lowercase)
         self.index_output_path = index_output_path
+        self.workers = max(1, workers)
         self.stats = {"index_size": 0, "index_time": 0, "nr_parcial_indexes": 0, "merge_time": 0}
 
         #   create the folder to store the parcial indexes
@@ -72,27 +136,61 @@ class Indexer:
                        "bm25_cache_in_disk": bm25_cache_in_disk,
                        "bm25_k1": bm25_k1,
                        "bm25_b": bm25_b,
+                       "bm25_impact_ordered": bm25_impact_ordered,
+                       "bm25_impact_bits": bm25_impact_bits,
                        "tfidf_cache_in_disk": tfidf_cache_in_disk,
                        "tfidf_smart": tfidf_smart,
+                       "index_format": index_format,
+                       "skip_block_size": self.skip_block_size,
+                       "cache_bits": cache_bits,
+                       "biwords": bool(biwords or biwords_path),
                        "minL": minL,
                        "stopwords_path": stopwords_path,
                        "stemmer": stemmer,
                        "regular_exp": regular_exp,
                        "lowercase": lowercase}, f)
+
+    def open_collection(self):
+        if self.path_to_collection.endswith(".jsonl") or self.path_to_collection.endswith(".json.gz"):
+            return JsonReader(self.path_to_collection).read()
+        return Reader(self.path_to_collection).read()
+
+    def update_metadata(self, values: dict):
+        with open(f"{self.index_output_path}metadata.json", "r") as f:
+            metadata = json.load(f)
+        metadata.update(values)
+        with open(f"{self.index_output_path}metadata.json", "w") as f:
+            json.dump(metadata, f)
             
 
 class SPIMI(Indexer):
 
+    #   documents between two checks of the real memory usage
+    memory_check_interval = 1000
+    #   documents read by the parallel indexer for each worker task
+    parallel_block_size = 10000
+    #   minimum bytes of an in memory block, even when the memory threshold is below the memory already in use
+    min_block_budget = 16 * 1024 * 1024
+    #   minimum bytes used by the merge buffers
+    min_merge_budget = 16 * 1024 * 1024
+    #   runs merged at a time, lowered to the open file limit of the process minus the files the merge keeps open
+    max_merge_fan_in = 512
+    reserved_file_descriptors = 32
+    #   files computed from the postings of a build: the caches with their offsets, bounds and tf columns,
+    #   the impact ordered lists and the document norms
+    derived_file_prefixes = ("cache_", "impacts_", "doc_norms_")
+    #   bytes of floats read at a time when a cache is quantized
+    quantize_chunk_size = 4 * 1024 * 1024
+
     def __init__(self, **kwargs) -> None:
         super().__init__(**kwargs)
 
     def index(self):
 
-        index = {}
+        index = self.new_block()
         index_count = 0
         doc_id = 0
         map_list = []
-        line_count = 0
 
         #   delete all temp_index files if they exist
         self.clean_partial_index()
@@ -102,14 +200,8 @@ class SPIMI(Indexer):
             os.remove(f"{self.index_output_path}document_mapping")
         mapper = open(f"{self.index_output_path}document_mapping", 'a')
 
-        #   clear the cache if it exists
-        if self.cache == "tfidf":
-            if os.path.exists(f"{self.index_output_path}cache_{self.cache}_{self.smart}"):
-                os.remove(f"{self.index_output_path}cache_{self.cache}_{self.smart}")
-
-        elif self.cache == "bm25":
-            if os.path.exists(f"{self.index_output_path}cache_{self.cache}_{self.bm25_k1}_{self.bm25_b}"):
-                os.remove(f"{self.index_output_path}cache_{self.cache}_{self.bm25_k1}_{self.bm25_b}")
+        #   clear the caches and the other files of an earlier build, the searcher would read them with this index
+        self.clean_derived_files()
 
         def write_in_document_mapper():
             mapper.writelines(map_list)
@@ -120,97 +212,45 @@ class SPIMI(Indexer):
             self.save_index(index, path=f"{self.index_output_path}.temp_index/index{index_count}")
             index.clear()
 
-        control = True
-
         start = time.perf_counter()
-        doc = next(self.reader)
+        self.memory_manager.start_accounting(self.workers, self.min_block_budget)
 
-        max_iter = 10000
-        stop = False
-        current_memory = self.memory_manager.get_memory_usage()
+        if self.workers > 1:
+            index_count, doc_id = self.parallel_index(mapper)
 
-        def check_max_iter(max_iter: int):
-            memory_diff = self.memory_manager.get_memory_usage() - current_memory
-            prod_factor = 1.0
+        else:
+            for doc in self.reader:
+                map_list.append(self.invert_document(index, doc_id, doc))
+                doc_id += 1
 
-            #   based on the memory usage of the first 10000 iterations, we calculate the number of iterations that we can do
-            while prod_factor >= 0.05:
-                if self.memory_manager.can_afford_memory(memory_diff + memory_diff * prod_factor):
-                    memory_diff += memory_diff * prod_factor
-                    max_iter += max_iter * prod_factor
-                else:
-                    prod_factor -= 0.05
-
-            return int(max_iter)
-
-        if isinstance(self, Positional_Indexer):
-            while control:
-                for _ in range(max_iter):
-                    for i, token in enumerate(self.tokenizer.tokenize(doc["title"] + doc["abstract"])):
-                        try:
-                            index[token][doc_id].append(i)
-                        except KeyError:
-                            try:
-                                index[token][doc_id] = [i]
-                            except KeyError:
-                                index[token] = {doc_id: [i]}
-
-                    map_list.append(f'{doc["pmid"]}:{i}\n')
-                    
-                    doc_id += 1
-                    try:
-                        doc = next(self.reader)
-                    except StopIteration:
-                        control = False
-                        break
-                
-                if not stop:
-                    max_iter = check_max_iter(max_iter)
-                    stop = True
-                        
-                line_count += len(index)
-                save_partial_index()
-                index_count += 1
+                #   flush the block when its estimated size reaches the memory budget, the real usage is checked every few documents
+                if self.memory_manager.block_is_full(index.size, doc_id % self.memory_check_interval == 0):
+                    save_partial_index()
+                    index_count += 1
 
-        elif isinstance(self, Non_Positional_Indexer):
-            while control:
-                for _ in range(max_iter):
-                    tokens = self.tokenizer.tokenize(doc["title"] + doc["abstract"])
-                    for token in set(tokens):
-                        try:
-                            index[token].append(f"{doc_id}:{tokens.count(token)}")
-                        except KeyError:
-                            index[token]=[f"{doc_id}:{tokens.count(token)}"]
-
-                    map_list.append(f"{doc['pmid']}:{len(tokens)}\n")
-
-                    doc_id += 1
-                    try:
-                        doc = next(self.reader)
-                    except StopIteration:
-                        control = False
-                        break
-
-                if not stop:
-                    max_iter = check_max_iter(max_iter)
-                    stop = True
-                    
-                line_count += len(index)
+            if len(index) or not index_count:
                 save_partial_index()
                 index_count += 1
 
         end = time.perf_counter() - start
         self.stats["index_time"] = end
         mapper.close()
+
+        #   the document table and the collection statistics are loaded once by the searcher
+        self.documents = DocumentTableWriter()
+        self.documents.add_mapping(f"{self.index_output_path}document_mapping")
+        self.documents.write(f"{self.index_output_path}documents")
+        self.update_metadata(self.documents.statistics())
         
         print(f"Total indexing time:         {round(self.stats['index_time'], 2)} s")
         input("Next?")
 
-        self.index_map = {}
+        self.lexicon = LexiconWriter()
 
         start = time.perf_counter()
-        #   tell the merger to fill the blocks with the same number of lines as the medium number of lines per parcial index 
-        self.merge_index(max_iter // index_count, line_count)
+        #   the merge gets the memory left below the high-water mark, part of the memory of the blocks is not returned to the system
+        self.memory_manager.start_accounting()
+        self.merge_index(max(self.memory_manager.budget, self.min_merge_budget), doc_id)
         end = time.perf_counter() - start
         self.stats["merge_time"] = end
         
@@ -225,216 +265,512 @@ class SPIMI(Indexer):
             print(f"Total cache size on disk:    {round(os.path.getsize(f'{self.index_output_path}cache_{self.cache}_{self.bm25_k1}_{self.bm25_b}') / 1024 / 1024, 2)} MB")
         
         print(f"Number of parcial indexes:   {self.stats['nr_parcial_indexes']}")
+        if self.stats["merge_passes"]:
+            print(f"Intermediate merge passes:   {self.stats['merge_passes']}")
         print(f"Merging time:                {round(self.stats['merge_time'], 2)} s")
+        if self.stats["run_read_throughput"]:
+            throughput = self.stats["run_read_throughput"]
+            print(f"Run read throughput:         min {round(min(throughput), 2)}, median {round(statistics.median(throughput), 2)}, max {round(max(throughput), 2)} MB/s")
 
         self.create_dictionary()
 
-        self.write_map()
+        if self.biwords or self.biwords_path:
+            self.index_biwords()
 
-    def merge_index(self, block_size: int, N: int = None):
+    def parallel_index(self, mapper):
+        index_count = 0
+        doc_count = 0
+        pending = deque()
+
+        def collect(result):
+            nonlocal index_count, doc_count
+            map_list, nr_parts = result.get()
+            #   the results are collected in block order, so the document mapping is written in doc id order
+            mapper.writelines(map_list)
+            doc_count += len(map_list)
+            index_count += nr_parts
+
+        #   fork keeps the tokenizer and the indexer settings in the workers without pickling them
+        with multiprocessing.get_context("fork").Pool(self.workers, initializer=_init_worker, initargs=(self,)) as pool:
+            for block in self.read_blocks(self.parallel_block_size):
+                pending.append(pool.apply_async(_invert_block, block))
+                #   limit the number of blocks in flight so the reader does not load the whole collection
+                if len(pending) >= 2 * self.workers:
+                    collect(pending.popleft())
+
+            while pending:
+                collect(pending.popleft())
+
+        return index_count, doc_count
+
+    def read_blocks(self, block_size: int):
+        block_number = 0
+        first_doc_id = 0
+        docs = list(islice(self.reader, block_size))
+        while docs:
+            yield block_number, first_doc_id, docs
+            block_number += 1
+            first_doc_id += len(docs)
+            docs = list(islice(self.reader, block_size))
+
+    def invert_block(self, block_number: int, first_doc_id: int, docs: list):
+        index = self.new_block()
+        map_list = []
+        part = 0
+        #   the documents of the block are already in memory and must not be counted as postings
+        self.memory_manager.reset_base()
+
+        for doc_id, doc in enumerate(docs, first_doc_id):
+            map_list.append(self.invert_document(index, doc_id, doc))
+
+            #   every worker has its share of the memory budget, a block that does not fit is saved in parts
+            if self.memory_manager.block_is_full(index.size, (doc_id + 1) % self.memory_check_interval == 0) or doc_id == first_doc_id + len(docs) - 1:
+                self.save_index(index, path=f"{self.index_output_path}.temp_index/index{block_number}_{part}")
+                index.clear()
+                part += 1
+
+        return map_list, part
+
+    def new_block(self):
+        raise NotImplementedError
+
+    def invert_document(self, index: PostingsBlock, doc_id: int, doc: dict):
+        #   add the document to the in memory block and return its line of the document mapping
+        tokens = self.tokenize_document(doc)
+        index.add_document(doc_id, tokens)
+
+        return f"{doc['pmid']}:{len(tokens)}\n"
+
+    def tokenize_document(self, doc: dict):
+        return self.tokenizer.tokenize(doc["title"] + doc["abstract"])
+
+    def index_biwords(self):
+        raise NotImplementedError
+
+    def merge_index(self, memory_budget: float, N: int = None):
         final_terms = {}
-        new_final_terms = {}
-        indexes, queues = self.start_final_index()
+        final_size = 0
+        #   half of the budget buffers the runs and the other half holds the merged terms, which take about
+        #   9 times their size on disk once split in postings
+        runs = self.start_final_index(memory_budget / 2)
+        block_size = memory_budget / 2 / 9
 
         #   if we are using bm25 we need to calculate the average document length
-        if self.cache:
-            if self.cache == "bm25":
-                with open(f"{self.index_output_path}document_mapping", "r") as doc_map:
-                    self.avg_dl = sum(int(line.split(":")[1]) for line in doc_map)/N
+        if self.cache == "bm25":
+            self.avg_dl = self.documents.statistics()["avgdl"]
             block_size = block_size // 2
-                    
-        #  fill the queues with the first block_size lines of each parcial index
-        for idx in list(indexes.keys()):
-            for _ in range(block_size - len(queues[idx])):
-                try:
-                    line = next(indexes[idx])
-                    queues[idx].append(line.split(";"))
-                except StopIteration:
-                    del indexes[idx]
-                    break
-
-        #  while there are still blocks to merge
-        while True:
-            lower_term = '\U0010ffff'
-            #   find the lowest term in the blocks
-            for idx in list(queues.keys()):
-                try:
-                    term = queues[idx][0][0]
-                    if term < lower_term:
-                       lower_term = term
-                       lower_idx = idx
-                    elif term == lower_term:
-                        queues[lower_idx][0].extend(queues[idx][0][1:])
-                        del queues[idx][0]
-                except IndexError:
-                    if idx not in indexes:
-                        del queues[idx]
-                    continue
 
-            #   add the lowest term to the final terms
-            try:
-                final_terms[lower_term]=queues[lower_idx][0][1:]
-            except KeyError:
-                break
-            del queues[lower_idx][0]
+        #   squared norm of the tf-idf vector of every document, the weights of every term are added to it
+        self.N = N
+        self.doc_norms = array("d", bytes(8 * N)) if self.tfidf_smart[2] == "c" else None
 
-            #   if the block is empty we need to fill it again
-            if not queues[lower_idx]:
+        for lower_term, postings in self.merged_terms(runs):
+            final_size += sum(map(len, postings))
+            final_terms[lower_term] = ";".join(postings).split(";")
 
-                new_final_terms[lower_term] = final_terms.pop(lower_term)
-                self.save_index(final_terms, path = f"{self.index_output_path}index" , final = True, N = N)
+            #   write the merged terms to the final index in blocks
+            if final_size >= block_size:
+                self.save_index(final_terms, path = f"{self.index_output_path}index", final = True, N = N)
                 final_terms.clear()
-                final_terms[lower_term] = new_final_terms.pop(lower_term)
+                final_size = 0
 
-                for idx in list(indexes.keys()):
-                    for _ in range(block_size - len(queues[idx])):
-                        try:
-                            line = next(indexes[idx])
-                            queues[idx].append(line.split(";"))
-                        except StopIteration:
-                            del indexes[idx]
-                            break
+        if final_terms:
+            self.save_index(final_terms, path = f"{self.index_output_path}index", final = True, N = N)
+            final_terms.clear()
 
-        self.save_index(final_terms, path = f"{self.index_output_path}index", final = True, N = N)
-        final_terms.clear()
+        self.lexicon.write(f"{self.index_output_path}lexicon")
+
+        if self.doc_norms is not None:
+            with open(f"{self.index_output_path}doc_norms_{self.tfidf_smart}", 'wb') as f:
+                array("f", map(math.sqrt, self.doc_norms)).tofile(f)
+            #   weighting scheme of the norms, the searcher only reads the norms of this build
+            self.update_metadata({"doc_norms": self.tfidf_smart})
+
+        #   the tf-idf cache needs the norms of the documents, so it is written from the final index
+        if self.cache == "tfidf":
+            self.write_tfidf_cache(f"{self.index_output_path}cache_{self.cache}_{self.smart}")
+            self.write_cache_offsets(f"{self.index_output_path}cache_{self.cache}_{self.smart}")
+            if self.cache_bits:
+                self.quantize_cache(f"{self.index_output_path}cache_{self.cache}_{self.smart}")
+        elif self.cache == "bm25":
+            self.write_cache_offsets(f"{self.index_output_path}cache_{self.cache}_{self.bm25_k1}_{self.bm25_b}")
+            if self.cache_bits:
+                self.quantize_cache(f"{self.index_output_path}cache_{self.cache}_{self.bm25_k1}_{self.bm25_b}")
+            if self.impact_ordered:
+                reader = IndexReader(self.index_output_path, self.index_format, cache_file=f"{self.index_output_path}cache_{self.cache}_{self.bm25_k1}_{self.bm25_b}", skip_block_size=self.skip_block_size,
+                                     cache_bits=self.cache_bits, cache_scale=self.cache_scale)
+                scale = write_impact_index(reader, f"{self.index_output_path}impacts_{self.cache}_{self.bm25_k1}_{self.bm25_b}", self.impact_bits)
+                self.update_metadata({"impact_scale": scale})
+
+        if self.bm25_tf_cache:
+            reader = IndexReader(self.index_output_path, self.index_format, skip_block_size=self.skip_block_size)
+            write_bm25_tf_cache(reader, self.documents.lengths, self.N, f"{self.index_output_path}cache_bm25_tf")
+            #   only set once the columns are written, the searcher reads them when it is set
+            self.update_metadata({"bm25_tf_cache": True})
+
+        #   MB/s of every run, only a summary is printed so many runs do not flood the output
+        self.stats["run_read_throughput"].extend(run.throughput() for run in runs)
+
+    @staticmethod
+    def merged_terms(runs: list):
+        #   (term, postings of every run that has it) in term order
+        #   priority queue with the head term of every run, ties are broken by the run order so the doc ids stay sorted
+        heap = [(run.term(), idx) for idx, run in enumerate(runs) if run.term() is not None]
+        heapq.heapify(heap)
+
+        while heap:
+            lower_term = heap[0][0]
+            postings = []
+
+            #   pop the lowest term from every run that has it
+            while heap and heap[0][0] == lower_term:
+                idx = heap[0][1]
+                postings.append(runs[idx].pop())
+                term = runs[idx].term()
+                if term is None:
+                    heapq.heappop(heap)
+                else:
+                    heapq.heapreplace(heap, (term, idx))
+
+            yield lower_term, postings
+
+    def merge_fan_in(self):
+        #   number of runs that can be open at once
+        fan_in = self.max_merge_fan_in
+        if resource is not None:
+            limit, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+            if limit != resource.RLIM_INFINITY:
+                fan_in = min(fan_in, limit - self.reserved_file_descriptors)
+        return max(2, fan_in)
+
+    def merge_runs(self, paths: list[str], fan_in: int, buffer_size: float):
+        #   groups of fan_in consecutive runs are merged into a single run until all the runs can be open at once,
+        #   the groups keep the block order so the postings of each term stay sorted by doc id
+        merge_pass = 0
+        while len(paths) > fan_in:
+            merged = []
+            for start in range(0, len(paths), fan_in):
+                if start + 1 == len(paths):
+                    merged.append(paths[start])
+                    continue
+                runs = [RunReader(path, buffer_size) for path in paths[start:start + fan_in]]
+                path = f"{self.index_output_path}.temp_index/merge{merge_pass}_{len(merged)}"
+                with open(path, "w") as f:
+                    for term, postings in self.merged_terms(runs):
+                        f.write(f"{term};{';'.join(postings)}\n")
+                self.stats["run_read_throughput"].extend(run.throughput() for run in runs)
+                for run in runs:
+                    os.remove(run.path)
+                merged.append(path)
+            paths = merged
+            merge_pass += 1
+        self.stats["merge_passes"] = merge_pass
+        return paths
 
     def save_index(self):
         raise NotImplementedError
 
+    def open_final_index(self, path: str):
+        #   the final index is always written in bytes so the lexicon can keep the byte offset of every term
+        return open(path, 'ab')
+
+    def write_postings(self, f, term: str, postings: list[str]):
+        #   write a term of the final index and add it to the lexicon, postings are given as "doc:value" strings
+        if self.index_format == "binary":
+            data = encode_record(term, self.encode_postings(postings))
+        else:
+            data = f"{term};{';'.join(postings)}\n".encode("utf-8")
+
+        self.lexicon.add(term, self.index_position, len(data), len(postings), self.collection_frequency(postings))
+        f.write(data)
+        self.index_position += len(data)
+
+        if self.doc_norms is not None:
+            self.add_to_norms(*self.parse_postings(postings))
+
+    def add_to_norms(self, doc_ids: list[int], tfs: list[int]):
+        #   add the squared tf-idf weight of the term to the norm of every document that contains it
+        idf = single_document_frequency_weighting(self.tfidf_smart[1], len(doc_ids), self.N)
+        if np is not None:
+            #   the squared weights of the list are scattered into the norms of the documents in place
+            weights = scale_array(idf, term_frequency_weighting_array(self.tfidf_smart[0], tfs))
+            np.add.at(np.frombuffer(self.doc_norms), np.asarray(doc_ids, dtype=np.intp), np.square(weights))
+            return
+
+        weights = {tf: (single_term_frequency_weighting(self.tfidf_smart[0], tf) * idf) ** 2 for tf in set(tfs)}
+        doc_norms = self.doc_norms
+        for doc_id, tf in zip(doc_ids, tfs):
+            doc_norms[doc_id] += weights[tf]
+
+    def write_cache_line(self, cache, term: str, entries):
+        #   cache lines follow the order of the lexicon, so only their byte offsets are stored
+        data = f"{term};{';'.join(entries)}\n".encode("utf-8")
+        self.cache_offsets.append(cache.tell())
+        cache.write(data)
+
+    def write_cache_scores(self, cache, scores: list[float]):
+        #   the scores of a quantized cache are written as floats and quantized once the highest score is known
+        self.cache_offsets.append(self.cache_postings)
+        array("f", scores).tofile(cache)
+        self.cache_postings += len(scores)
+
+    def quantize_cache(self, cache_file: str):
+        #   the scores are stored as round(score / scale) in cache_bits bits, the scale maps the highest score to the highest value
+        levels = (1 << self.cache_bits) - 1
+        typecode = "B" if self.cache_bits == 8 else "H"
+        max_score = 0.0
+        with open(cache_file, "rb") as f:
+            for chunk in iter(lambda: f.read(self.quantize_chunk_size), b""):
+                max_score = max(max_score, max(array("f", chunk)))
+        self.cache_scale = max_score / levels or 1.0
+
+        with open(cache_file, "rb") as f, open(f"{cache_file}.quantized", "wb") as quantized:
+            for chunk in iter(lambda: f.read(self.quantize_chunk_size), b""):
+                array(typecode, [min(levels, max(0, round(score / self.cache_scale))) for score in array("f", chunk)]).tofile(quantized)
+        os.replace(f"{cache_file}.quantized", cache_file)
+        self.update_metadata({"cache_scale": self.cache_scale})
+
+    def encode_postings(self, postings: list[str]):
+        raise NotImplementedError
+
+    def parse_postings(self, postings):
+        raise NotImplementedError
+
+    def collection_frequency(self, postings: list[str]):
+        raise NotImplementedError
+
+    def write_cache_offsets(self, cache_file: str):
+        #   byte offset of every line of the cache, the last offset is the end of the file
+        self.cache_offsets.append(self.cache_postings if self.cache_bits else os.path.getsize(cache_file))
+        with open(f"{cache_file}_offsets", 'wb') as f:
+            self.cache_offsets.tofile(f)
+        if self.cache_max_scores:
+            with open(f"{cache_file}_max_scores", 'wb') as f:
+                self.cache_max_scores.tofile(f)
+
+    def clean_derived_files(self):
+        folder = self.index_output_path or "."
+        for file in os.listdir(folder):
+            if file.startswith(self.derived_file_prefixes) and os.path.isfile(f"{self.index_output_path}{file}"):
+                os.remove(f"{self.index_output_path}{file}")
+
     def clean_partial_index(self):
         for file in list(os.listdir(f"{self.index_output_path}.temp_index")):
             os.remove(f"{self.index_output_path}.temp_index/{file}")
 
-    def start_final_index(self):
+    def start_final_index(self, buffer_budget: float):
         #   delete the index file if it exists
         if os.path.exists(f"{self.index_output_path}index"):
             os.remove(f"{self.index_output_path}index")
+        self.index_position = 0
 
-        indexes = {}
-        queues = {}
-        for doc in list(os.listdir(f"{self.index_output_path}.temp_index")):
-            #   open all the parcial indexes
-            if doc.startswith("index"):
-                indexes[doc] = Reader(f"{self.index_output_path}.temp_index/{doc}").read()
-                queues[doc] = []
+        #   the parcial indexes in block order, so the postings of each term stay sorted by doc id
+        paths = [f"{self.index_output_path}.temp_index/{doc}"
+                 for doc in sorted((doc for doc in os.listdir(f"{self.index_output_path}.temp_index") if doc.startswith("index")),
+                                   key=lambda name: [int(n) for n in name[len("index"):].split("_")])]
 
-        self.stats["nr_parcial_indexes"] = len(indexes)
+        self.stats["nr_parcial_indexes"] = len(paths)
+        self.stats["run_read_throughput"] = []
 
-        return indexes, queues
+        #   the buffer budget is shared by the runs that are open at once
+        fan_in = self.merge_fan_in()
+        paths = self.merge_runs(paths, fan_in, buffer_budget / fan_in)
+        return [RunReader(path, buffer_budget / max(1, len(paths))) for path in paths]
     
     def create_dictionary(self):
         raise NotImplementedError
 
-    def create_index_map(self, index):
-        term_comp = self.last_term
-        for i, term in enumerate(sorted(index)):
-            #   if the first two letters of the term are different from the last term, we need to update the index map
-            if term[:2] > term_comp:
-                term_comp = term[:2]
-                self.index_map[term_comp] = i + self.last_index
-        
-        #   update the last term and the last index taking into account the number of terms already indexed
-        self.last_index += i
-        self.last_term = term_comp
-
-    def start_index_map(self):
-        if os.path.exists(f"{self.index_output_path}index_map.json"):
-            os.remove(f"{self.index_output_path}index_map.json")
-
-    def write_map(self):
-        with open(f"{self.index_output_path}index_map.json", 'w') as f:
-            json.dump(self.index_map, f)
-
 class Positional_Indexer(SPIMI):
 
     def __init__(self,**kwargs) -> None:
         super().__init__(**kwargs)
 
+    def new_block(self):
+        return PositionalPostingsBlock()
+
     def save_index(self, index: dict, path: str, final: bool = False, N: int = None):
         #   write to disk the index in the format: term;doc1:pos,pos,pos;doc2:pos,pos,pos;doc3:pos;...
         if final:
-            with open(path, 'a') as f:
+            with self.open_final_index(path) as f:
                 for term in index:
-                    f.write(f"{term};{';'.join(doc for doc in index[term])}\n")
-            
-            self.create_index_map(index)
+                    self.write_postings(f, term, index[term])
         else:
             with open(path, 'w') as f:
-                for term in sorted(index):
-                    f.write(f"{term};{';'.join('{0}:{1}'.format(doc,','.join(map(str, index[term][doc]))) for doc in index[term])}\n")
+                f.writelines(index.lines())
+
+    def parse_postings(self, postings):
+        #   split "doc:pos,pos" strings in the doc ids and the term frequencies
+        doc_ids, tfs = [], []
+        for doc in postings:
+            doc_ids.append(int(doc[:doc.index(":")]))
+            tfs.append(doc.count(",") + 1)
+        return doc_ids, tfs
+
+    def encode_postings(self, postings: list[str]):
+        doc_ids, positions = [], []
+        for doc in postings:
+            doc_id, doc_positions = doc.split(":")
+            doc_ids.append(int(doc_id))
+            positions.append([int(pos) for pos in doc_positions.split(",")])
+        if self.skip_block_size:
+            return encode_positional_skip_postings(doc_ids, positions, self.skip_block_size)
+        return encode_positional_postings(doc_ids, positions)
+
+    def collection_frequency(self, postings: list[str]):
+        return sum(doc.count(",") + 1 for doc in postings)
+
+    def index_biwords(self):
+        #   the biwords are a positional index of their own in the biwords folder, a biword is the two terms
+        #   separated by a space and its positions are the positions of its first term
+        start = time.perf_counter()
+        if self.biwords_path:
+            pairs = set()
+            with open(self.biwords_path, "r") as f:
+                for line in f:
+                    tokens = self.tokenizer.tokenize(line)
+                    pairs.update(zip(tokens, tokens[1:]))
+        else:
+            #   only the pairs of common terms are counted, so the counter stays small
+            common = {term for term, _, _ in heapq.nlargest(self.biword_terms, Lexicon(f"{self.index_output_path}lexicon"), key=lambda entry: entry[1])}
+            counts = Counter()
+            for doc in self.open_collection():
+                tokens = self.tokenize_document(doc)
+                counts.update(pair for pair in zip(tokens, tokens[1:]) if pair[0] in common and pair[1] in common)
+            pairs = {pair for pair, _ in counts.most_common(self.biwords)}
+
+        postings = {pair: ([], []) for pair in pairs}
+        for doc_id, doc in enumerate(self.open_collection()):
+            tokens = self.tokenize_document(doc)
+            for position, pair in enumerate(zip(tokens, tokens[1:])):
+                if pair in postings:
+                    doc_ids, positions = postings[pair]
+                    if not doc_ids or doc_ids[-1] != doc_id:
+                        doc_ids.append(doc_id)
+                        positions.append([])
+                    positions[-1].append(position)
+
+        if not os.path.exists(f"{self.index_output_path}biwords"):
+            os.mkdir(f"{self.index_output_path}biwords")
+        lexicon = LexiconWriter()
+        index_position = 0
+        with open(f"{self.index_output_path}biwords/index", "wb") as f:
+            for term, (doc_ids, positions) in sorted((" ".join(pair), lists) for pair, lists in postings.items()):
+                if not doc_ids:
+                    continue
+                if self.index_format == "binary" and self.skip_block_size:
+                    data = encode_record(term, encode_positional_skip_postings(doc_ids, positions, self.skip_block_size))
+                elif self.index_format == "binary":
+                    data = encode_record(term, encode_positional_postings(doc_ids, positions))
+                else:
+                    docs = ('{0}:{1}'.format(doc_id, ','.join(map(str, doc_positions))) for doc_id, doc_positions in zip(doc_ids, positions))
+                    data = f"{term};{';'.join(docs)}\n".encode("utf-8")
+                lexicon.add(term, index_position, len(data), len(doc_ids), sum(map(len, positions)))
+                f.write(data)
+                index_position += len(data)
+        lexicon.write(f"{self.index_output_path}biwords/lexicon")
 
-    def create_dictionary(self):
-        dictionary = open(f"{self.index_output_path}dictionary", 'w')
+        self.stats["biwords_size"] = index_position / 1024 / 1024
+        print(f"Biwords indexed:             {len(lexicon.dfs)} in {round(time.perf_counter() - start, 2)} s, {round(self.stats['biwords_size'], 2)} MB")
 
-        with open(f"{self.index_output_path}index", 'r') as f:
-            for line in f:
-                term = line.split(";")[0]
-                dictionary.write(f"{term}:{line.count(':')}\n")
-        
-        dictionary.close()
+    def create_dictionary(self):
+        #   the dictionary of the positional index stores the document frequency of each term
+        with open(f"{self.index_output_path}dictionary", 'w') as dictionary:
+            for term, df, _ in Lexicon(f"{self.index_output_path}lexicon"):
+                dictionary.write(f"{term}:{df}\n")
 
 
 class Non_Positional_Indexer(SPIMI):
 
     def __init__(self,**kwargs) -> None:
         super().__init__(**kwargs)
+
+    def new_block(self):
+        return PostingsBlock()
+
     def save_index(self, index: dict, path: str, final: bool = False, N: int = None):
         #   write to disk the index in the format: term;doc1:freq;doc2:freq;doc3:freq;...
         if final:
-            if not self.cache:
-                with open(path, 'a') as f:
+            if self.cache != "bm25":
+                with self.open_final_index(path) as f:
                     for term in index:
-                        f.write(f"{term};{';'.join(doc for doc in index[term])}\n")
-                        
-            elif self.cache == "tfidf":
-                with open(path, 'a') as f:
-                    with open(f"{self.index_output_path}cache_{self.cache}_{self.smart}", 'a') as tfidf:
-                        for term in index:
-                            tfidfs = {}
-                            #   calculate the tfidf for each document that contains the term
-                            idfs = document_frequency_weighting(self.smart[1], {doc: int(doc.split(":")[1]) for doc in index[term]}, N)
-                            for doc in index[term]:
-                                doc_id, tf = doc.split(":")
-                                #   calculate the tf weight for the term in the document
-                                tfidfs[doc_id] = single_term_frequency_weighting(self.smart[0], int(tf)) * idfs[doc]
-                            #   write the tfidf to the cache file
-                            tfidf.write(f"{term};{';'.join('{}:{}'.format(doc, round(tfidf, 4)) for doc, tfidf in normalization_factor(self.smart[2], tfidfs).items())}\n")
-                            #   write the index to the index file
-                            f.write(f"{term};{';'.join(doc for doc in index[term])}\n")
+                        self.write_postings(f, term, index[term])
 
             elif self.cache == "bm25":
-                with open(path, 'a') as f:
-                    with open(f"{self.index_output_path}cache_{self.cache}_{self.bm25_k1}_{self.bm25_b}", 'a') as bm25:
-                        for term in index:
-                            bm25s = {}
-                            #   calculate the idf for each document that contains the term
-                            idfs = document_frequency_weighting("t", {doc: len(index[term]) for doc in index[term]}, N)
-                            for doc in index[term]:
-                                doc_id, tf = doc.split(":")
-                                #   calculate the bm25 for the term in the document
-                                bm25s[doc_id] = rsv(bm25_k1=self.bm25_k1,
-                                                    bm25_b=self.bm25_b,
-                                                    idf=idfs[doc],
-                                                    tf=int(tf),
-                                                    dl=int(linecache.getline(f'{self.index_output_path}document_mapping', int(doc_id)+1).split(":")[1]),
-                                                    avgdl=self.avg_dl)
-                            #   write the bm25 to the cache file
-                            bm25.write(f"{term};{';'.join('{}:{:}'.format(doc, round(bm25, 4)) for doc, bm25 in bm25s.items())}\n")
+                #   the postings of all the terms of the block are scored at once
+                dfs = [len(index[term]) for term in index]
+                doc_ids, tfs = self.parse_postings(chain.from_iterable(index.values()))
+                if np is None:
+                    idfs = list(chain.from_iterable(repeat(math.log10(N / df), df) for df in dfs))
+                    dls = list(map(self.documents.lengths.__getitem__, doc_ids))
+                else:
+                    idfs = np.repeat(document_frequency_weighting_array('t', dfs, N), dfs)
+                    dls = np.frombuffer(self.documents.lengths, dtype=np.uint32)[doc_ids]
+                scores = rsv_array(bm25_k1=self.bm25_k1,
+                                   bm25_b=self.bm25_b,
+                                   idfs=idfs,
+                                   tfs=tfs,
+                                   dls=dls,
+                                   avgdl=self.avg_dl)
+                if np is not None:
+                    scores = scores.tolist()
+                if not self.cache_bits:
+                    entries = list(map('{}:{:.4f}'.format, doc_ids, scores))
+
+                with self.open_final_index(path) as f:
+                    with open(f"{self.index_output_path}cache_{self.cache}_{self.bm25_k1}_{self.bm25_b}", 'ab') as bm25:
+                        start = 0
+                        for term, df in zip(index, dfs):
+                            #   write the bm25 to the cache file, with the highest score as it is read back from the cache
+                            if self.cache_bits:
+                                self.write_cache_scores(bm25, scores[start:start + df])
+                                #   the float32 value that is quantized, so the bound is exactly the highest quantized score
+                                self.cache_max_scores.append(max(array("f", scores[start:start + df])))
+                            else:
+                                self.write_cache_line(bm25, term, entries[start:start + df])
+                                self.cache_max_scores.append(float('{:.4f}'.format(max(scores[start:start + df]))))
                             #   write the index to the index file
-                            f.write(f"{term};{';'.join(doc for doc in index[term])}\n")
-            self.create_index_map(index)
+                            self.write_postings(f, term, index[term])
+                            start += df
 
         else:
             with open(path, 'w') as f:
-                for term in sorted(index):
-                    f.write(f"{term};{';'.join(doc for doc in index[term])}\n")
+                f.writelines(index.lines())
+
+    def parse_postings(self, postings):
+        #   split "doc:tf" strings in the doc ids and the term frequencies
+        values = list(map(int, ":".join(postings).split(":")))
+        return values[0::2], values[1::2]
+
+    def encode_postings(self, postings: list[str]):
+        if self.skip_block_size:
+            return encode_skip_postings(*self.parse_postings(postings), self.skip_block_size)
+        return encode_postings(*self.parse_postings(postings))
+
+    def write_tfidf_cache(self, cache_file: str):
+        #   tf-idf of every posting of the final index, normalized with the norm of the whole document vector
+        if self.doc_norms is not None:
+            doc_norms = array("d", map(math.sqrt, self.doc_norms)) if np is None else np.sqrt(self.doc_norms)
+        with open(cache_file, 'wb') as tfidf:
+            for term, doc_ids, tfs in IndexReader(self.index_output_path, self.index_format, skip_block_size=self.skip_block_size):
+                idf = single_document_frequency_weighting(self.smart[1], len(doc_ids), self.N)
+                weights = scale_array(idf, term_frequency_weighting_array(self.smart[0], tfs))
+                if self.doc_norms is not None and np is None:
+                    weights = [weight / (doc_norms[doc_id] or 1) for doc_id, weight in zip(doc_ids, weights)]
+                elif self.doc_norms is not None:
+                    norms = doc_norms[doc_ids]
+                    weights = weights / np.where(norms == 0, 1, norms)
+                if np is not None:
+                    weights = weights.tolist()
+                if self.cache_bits:
+                    self.write_cache_scores(tfidf, weights)
+                else:
+                    self.write_cache_line(tfidf, term, map('{}:{:.4f}'.format, doc_ids, weights))
 
-    def create_dictionary(self):
-        dictionary = open(f"{self.index_output_path}dictionary", 'w')
+    def collection_frequency(self, postings: list[str]):
+        return sum(int(doc[doc.index(":") + 1:]) for doc in postings)
 
-        with open(f"{self.index_output_path}index", 'r') as f:
-            for line in f:
-                block = line.split(";")
-                dictionary.write(f"{block[0]}:{sum([int(doc.split(':')[1]) for doc in block[1:]])}\n")
-        
-        dictionary.close()
+    def create_dictionary(self):
+        #   the dictionary of the non positional index stores the collection frequency of each term
+        with open(f"{self.index_output_path}dictionary", 'w') as dictionary:
+            for term, _, ctf in Lexicon(f"{self.index_output_path}lexicon"):
+                dictionary.write(f"{term}:{ctf}\n")
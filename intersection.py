@@ -0,0 +1,163 @@
+from bisect import bisect_left
+from itertools import accumulate
+from postings import decode_gaps, decode_positional_skip_blocks, decode_postings, decode_skips
+
+#   cursors over a posting list for conjunctive queries, next_geq(target) moves the cursor to the first
+#   document >= target and returns it, or None when the list is exhausted. Cursors only move forward
+
+
+class ListCursor:
+
+    #   cursor over a decoded list, the target is found with galloping search from the current position.
+    #   position_list(i) returns the positions of the i-th posting of a positional list
+
+    def __init__(self, doc_ids: list[int], tfs: list[int], position_list=None) -> None:
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.position_list = position_list
+        self.pos = 0
+
+    def __len__(self):
+        return len(self.doc_ids)
+
+    def next_geq(self, target: int):
+        doc_ids, pos, n = self.doc_ids, self.pos, len(self.doc_ids)
+        if pos < n and doc_ids[pos] < target:
+            step = 1
+            while pos + step < n and doc_ids[pos + step] < target:
+                step *= 2
+            pos = bisect_left(doc_ids, target, pos + step // 2, min(pos + step + 1, n))
+            self.pos = pos
+        return doc_ids[pos] if pos < n else None
+
+    def tf(self) -> int:
+        return self.tfs[self.pos]
+
+    def positions(self) -> list[int]:
+        return self.position_list(self.pos)
+
+
+class SkipCursor(ListCursor):
+
+    #   cursor over an encoded list with skip data, only the blocks that can hold a target are decoded and
+    #   the positions of a positional list are only decoded for the documents that ask for them
+
+    def __init__(self, payload, df: int, positional: bool = False) -> None:
+        self.df = df
+        self.last_docs, self.offsets, self.position_offsets, start = decode_skips(payload, positional)
+        self.blocks = payload[start:start + self.offsets[-1]]
+        self.stream = payload[start + self.offsets[-1]:]
+        self.positional = positional
+        self.block = -1
+        self.doc_ids, self.tfs = [], []
+        self.pos = 0
+
+    def __len__(self):
+        return self.df
+
+    def load(self, block: int):
+        data = self.blocks[self.offsets[block]:self.offsets[block + 1]]
+        if self.positional:
+            doc_ids, tfs, lengths = decode_positional_skip_blocks(data)
+            #   offsets of the positions of every document of the block in the positions stream
+            self.doc_offsets = list(accumulate(lengths, initial=self.position_offsets[block]))
+        else:
+            doc_ids, tfs = decode_postings(data)
+        #   the first gap of a block is relative to the last doc id of the previous block
+        base = self.last_docs[block - 1] if block else 0
+        self.doc_ids = [doc_id + base for doc_id in doc_ids]
+        self.tfs = tfs
+        self.block = block
+        self.pos = 0
+
+    def block_postings(self, blocks) -> tuple[list[int], list[int]]:
+        #   doc ids and term frequencies of the postings of the given blocks, in block order
+        doc_ids, tfs = [], []
+        for block in blocks:
+            self.load(block)
+            doc_ids += self.doc_ids
+            tfs += self.tfs
+        return doc_ids, tfs
+
+    def next_geq(self, target: int):
+        if self.block < 0 or self.block < len(self.last_docs) and self.last_docs[self.block] < target:
+            block = bisect_left(self.last_docs, target, max(self.block, 0))
+            if block == len(self.last_docs):
+                self.block = block
+                self.doc_ids, self.pos = [], 0
+                return None
+            self.load(block)
+        if self.block == len(self.last_docs):
+            return None
+        return super().next_geq(target)
+
+    def positions(self) -> list[int]:
+        return decode_gaps(self.stream[self.doc_offsets[self.pos]:self.doc_offsets[self.pos + 1]])
+
+
+def intersect(cursors: list, match=None) -> tuple[list[int], list[list[int]]]:
+    #   documents in all the lists and the term frequency of every list in them, in the order of the cursors.
+    #   The candidates come from the shortest list and are searched in the others, shortest first. match is
+    #   called with the cursors on every common document and can reject it
+    order = sorted(range(len(cursors)), key=lambda i: len(cursors[i]))
+    first, others = cursors[order[0]], [cursors[i] for i in order[1:]]
+    doc_ids, tfs = [], [[] for _ in cursors]
+
+    doc = first.next_geq(0)
+    while doc is not None:
+        for cursor in others:
+            other = cursor.next_geq(doc)
+            if other is None:
+                return doc_ids, tfs
+            if other != doc:
+                doc = first.next_geq(other)
+                break
+        else:
+            if match is None or match(cursors):
+                doc_ids.append(doc)
+                for i, cursor in enumerate(cursors):
+                    tfs[i].append(cursor.tf())
+            doc = first.next_geq(doc + 1)
+
+    return doc_ids, tfs
+
+
+def phrase_match(offsets: list[list[int]]):
+    #   the term of the i-th cursor appears at offsets[i] of the phrase, the possible starts of the phrase are
+    #   narrowed term by term and the positions of the next terms are not decoded once none is left
+    def match(cursors: list) -> bool:
+        starts = None
+        for i in range(len(cursors)):
+            positions = cursors[i].positions()
+            for offset in offsets[i]:
+                term_starts = {position - offset for position in positions}
+                starts = term_starts if starts is None else starts & term_starts
+                if not starts:
+                    return False
+        return True
+
+    return match
+
+
+def window_match(window: int):
+    #   all the terms of the cursors appear inside a span of window tokens
+    def match(cursors: list) -> bool:
+        events = sorted((position, i) for i, cursor in enumerate(cursors) for position in cursor.positions())
+        counts = [0] * len(cursors)
+        missing = len(cursors)
+        first = 0
+        for position, i in events:
+            if not counts[i]:
+                missing -= 1
+            counts[i] += 1
+            while not missing:
+                start, j = events[first]
+                if position - start < window:
+                    return True
+                counts[j] -= 1
+                if not counts[j]:
+                    missing += 1
+                first += 1
+        return False
+
+    return match
@@ -0,0 +1,87 @@
+import mmap
+from array import array
+
+#   lexicon file layout (native byte order, widest columns first so every column stays aligned):
+#       number of terms (Q)
+#       postings offset (Q) * n, collection frequency (Q) * n
+#       term offset (I) * (n + 1), postings length (I) * n, document frequency (I) * n
+#       terms, utf-8 encoded and sorted
+
+
+class LexiconWriter:
+
+    def __init__(self) -> None:
+        self.terms = bytearray()
+        self.term_offsets = array("I", [0])
+        self.offsets = array("Q")
+        self.lengths = array("I")
+        self.dfs = array("I")
+        self.ctfs = array("Q")
+
+    def add(self, term: str, offset: int, length: int, df: int, ctf: int):
+        #   terms must be added in sorted order
+        self.terms += term.encode("utf-8")
+        self.term_offsets.append(len(self.terms))
+        self.offsets.append(offset)
+        self.lengths.append(length)
+        self.dfs.append(df)
+        self.ctfs.append(ctf)
+
+    def write(self, path: str):
+        with open(path, "wb") as f:
+            array("Q", [len(self.offsets)]).tofile(f)
+            for column in (self.offsets, self.ctfs, self.term_offsets, self.lengths, self.dfs):
+                column.tofile(f)
+            f.write(self.terms)
+
+
+class Lexicon:
+
+    def __init__(self, path: str) -> None:
+        with open(path, "rb") as f:
+            self.buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        #   every column is a zero-copy view over the mapped file
+        view = memoryview(self.buffer)
+        n = view[:8].cast("Q")[0]
+        pos = 8
+        columns = []
+        for fmt, size in (("Q", n), ("Q", n), ("I", n + 1), ("I", n), ("I", n)):
+            end = pos + size * array(fmt).itemsize
+            columns.append(view[pos:end].cast(fmt))
+            pos = end
+        self.offsets, self.ctfs, self.term_offsets, self.lengths, self.dfs = columns
+        self.terms = view[pos:]
+        self.size = n
+
+    def __len__(self):
+        return self.size
+
+    def term(self, ordinal: int) -> bytes:
+        return self.terms[self.term_offsets[ordinal]:self.term_offsets[ordinal + 1]].tobytes()
+
+    def find(self, term: str):
+        #   binary search of the term, returns its ordinal or None
+        key = term.encode("utf-8")
+        low, high = 0, self.size
+        while low < high:
+            mid = (low + high) // 2
+            if self.term(mid) < key:
+                low = mid + 1
+            else:
+                high = mid
+        if low < self.size and self.term(low) == key:
+            return low
+        return None
+
+    def get(self, term: str):
+        #   returns (ordinal, postings offset, postings length, df, ctf) or None
+        ordinal = self.find(term)
+        if ordinal is None:
+            return None
+        return ordinal, self.offsets[ordinal], self.lengths[ordinal], self.dfs[ordinal], self.ctfs[ordinal]
+
+    def __iter__(self):
+        #   iterate over (term, df, ctf) in sorted order
+        for ordinal in range(self.size):
+            yield str(self.term(ordinal), "utf-8"), self.dfs[ordinal], self.ctfs[ordinal]
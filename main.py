@@ -62,10 +62,35 @@ if __name__ == "__main__":
                                          default=None,
                                          help='Maximum limit of RAM that the program (index) should consume. (Default: None)')
 
+    indexer_settings_parser.add_argument('--indexer.memory_high_water',
+                                         type=float,
+                                         default=0.9,
+                                         help='Fraction of the memory threshold at which the in memory block is written to disk. (Default: 0.9)')
+
+    indexer_settings_parser.add_argument('--indexer.workers',
+                                         type=int,
+                                         default=1,
+                                         help='Number of processes used to tokenize and invert the collection. (Default: 1)')
+
     indexer_settings_parser.add_argument('--indexer.storing.store_term_position',
                                          action="store_true",
                                          help='Signals if the indexer should store the term positions along side the term frequencies. (Default is False)')
 
+    indexer_settings_parser.add_argument('--indexer.storing.biwords',
+                                         type=int,
+                                         default=0,
+                                         help='Number of the most frequent adjacent pairs of common terms indexed as their own lists to speed up phrase queries, needs the term positions. (Default: 0)')
+
+    indexer_settings_parser.add_argument('--indexer.storing.biwords_path',
+                                         type=str,
+                                         default=None,
+                                         help='File with the phrases, one per line, whose adjacent pairs are indexed as biwords instead of the most frequent pairs. (Default: None)')
+
+    indexer_settings_parser.add_argument('--indexer.storing.biword_terms',
+                                         type=int,
+                                         default=1000,
+                                         help='Number of the most common terms whose pairs are counted to choose the biwords. (Default: 1000)')
+
     indexer_settings_parser.add_argument('--indexer.storing.bm25.cache_in_disk',
                                          action="store_true",
                                          help='Signals if the index should create a cache file to store all intermediate computations of the BM25 ranking method. (Default is False)')
@@ -78,6 +103,19 @@ if __name__ == "__main__":
                                          type=float, default=0.75,
                                          help='The b value of the bm25, this value will only be used if the flag --indexer.bm25.cache_in_disk is set to True. (Default=0.75)')
 
+    indexer_settings_parser.add_argument('--indexer.storing.bm25.impact_ordered',
+                                         action="store_true",
+                                         help='Also writes the bm25 cache as lists sorted by decreasing quantized score, used by the searches with a time or posting budget. (Default is False)')
+
+    indexer_settings_parser.add_argument('--indexer.storing.bm25.impact_bits',
+                                         type=int,
+                                         default=8,
+                                         help='Bits of the quantized scores of the impact ordered lists, from 1 to 16. The searches of these lists rank by the quantized scores, more bits are closer to the bm25. (Default=8)')
+
+    indexer_settings_parser.add_argument('--indexer.storing.bm25.tf_cache',
+                                         action="store_true",
+                                         help='Stores the idf, tf and document length of every posting in arrays, so the bm25 of any k1 and b is computed without the cache of those values or re-indexing. (Default is False)')
+
     indexer_settings_parser.add_argument('--indexer.storing.tfidf.cache_in_disk',
                                          action="store_true",
                                          help='Signals if the index should create a cache file to store all intermediate computations of the TFIDF ranking method. (Default is False)')
@@ -87,6 +125,23 @@ if __name__ == "__main__":
                                          default="lnc.ltc",
                                          help='The smart notation of the tfidf, this value will only be used if the flag --indexer.tfidf.cache_in_disk is set to True. (Default=lnc.ltc)')
 
+    indexer_settings_parser.add_argument('--indexer.storing.index_format',
+                                         type=str,
+                                         default="text",
+                                         choices=["text", "binary"],
+                                         help='Format of the final index, binary stores the doc ids as gaps and all the integers with variable-byte encoding. (Default=text)')
+
+    indexer_settings_parser.add_argument('--indexer.storing.skip_block_size',
+                                         type=int,
+                                         default=128,
+                                         help='Postings between two skip entries of the binary index, 0 stores no skip data. (Default=128)')
+
+    indexer_settings_parser.add_argument('--indexer.storing.cache_bits',
+                                         type=int,
+                                         default=0,
+                                         choices=[0, 8, 16],
+                                         help='Bits of the quantized scores of the bm25 and tfidf caches, 0 stores them as text. (Default=0)')
+
     indexer_doc_parser = indexer_parser.add_argument_group(
         'Tokenizer settings', 'This settings are related to how the documents should be loaded and processed to tokens.')
 
@@ -141,6 +196,56 @@ if __name__ == "__main__":
                                       default=1000,
                                       help='Number maximum of documents that should be returned per question.')
 
+    searcher_interactive.add_argument('--posting_cache',
+                                      type=float,
+                                      default=0,
+                                      help='Memory in MB for the decoded posting lists of popular terms, 0 disables the cache. (Default: 0)')
+
+    searcher_interactive.add_argument('--cache_warmup',
+                                      type=str,
+                                      default=None,
+                                      help='Questions file or query log, one query per line, whose most frequent terms are loaded in the posting cache at startup. (Default: None)')
+
+    searcher_interactive.add_argument('--result_cache',
+                                      type=int,
+                                      default=1024,
+                                      help='Number of query results kept in memory, 0 disables the cache. (Default: 1024)')
+
+    searcher_interactive.add_argument('--result_cache_ttl',
+                                      type=float,
+                                      default=600,
+                                      help='Seconds a cached query result stays valid. (Default: 600)')
+
+    searcher_interactive.add_argument('--result_cache_snapshot',
+                                      type=str,
+                                      default=None,
+                                      help='File where the result cache is saved on exit and loaded on startup. (Default: None)')
+
+    searcher_interactive.add_argument('--query_operator',
+                                      type=str,
+                                      default="or",
+                                      choices=["or", "and", "phrase", "near"],
+                                      help='and only returns the documents that contain every term of the question, phrase the documents with the terms in the order of the question and near the documents with all the terms inside the proximity window. phrase and near need an index with term positions. (Default: or)')
+
+    searcher_interactive.add_argument('--time_budget_ms',
+                                      type=float,
+                                      default=None,
+                                      help='Milliseconds after which a bm25 search returns the best results found so far, needs an impact ordered bm25 cache. (Default: None)')
+
+    searcher_interactive.add_argument('--posting_budget',
+                                      type=int,
+                                      default=None,
+                                      help='Postings after which a bm25 search returns the best results found so far, needs an impact ordered bm25 cache. (Default: None)')
+
+    searcher_interactive.add_argument('--proximity_window',
+                                      type=int,
+                                      default=8,
+                                      help='Tokens that can hold all the terms of a near question. (Default: 8)')
+
+    searcher_interactive.add_argument('--dynamic_pruning',
+                                      action="store_true",
+                                      help='Skips the blocks of postings of a bm25 question that cannot lift a document into the top-k (MaxScore), needs a binary index with skip blocks. The results are the same, the number of results only counts the documents of the decoded blocks. (Default: False)')
+
     # mutual exclusive searching modes this is duplicated with batch mode, argparse does not support multiple
     # subparsers, rn let it be this way.
     searcher_modes_interactive_parser = searcher_interactive.add_subparsers(
@@ -177,6 +282,57 @@ if __name__ == "__main__":
                                 default=1000,
                                 help='Number maximum of documents that should be returned per question.')
 
+    searcher_batch.add_argument('--workers',
+                                type=int,
+                                default=1,
+                                help='Number of processes that score the questions. (Default: 1)')
+
+    searcher_batch.add_argument('--batch_strategy',
+                                type=str,
+                                default="query",
+                                choices=["query", "term"],
+                                help='query scores one question at a time, term decodes the posting list of every term shared by a group of questions once and runs in a single process. (Default: query)')
+
+    searcher_batch.add_argument('--batch_memory',
+                                type=float,
+                                default=512,
+                                help='Memory in MB for the decoded posting lists of a group of questions with the term strategy. (Default: 512)')
+
+    searcher_batch.add_argument('--posting_cache',
+                                type=float,
+                                default=0,
+                                help='Memory in MB for the decoded posting lists of popular terms, 0 disables the cache. (Default: 0)')
+
+    searcher_batch.add_argument('--cache_warmup',
+                                type=str,
+                                default=None,
+                                help='Questions file or query log, one query per line, whose most frequent terms are loaded in the posting cache at startup. (Default: None)')
+
+    searcher_batch.add_argument('--query_operator',
+                                type=str,
+                                default="or",
+                                choices=["or", "and", "phrase", "near"],
+                                help='and only returns the documents that contain every term of the question, phrase the documents with the terms in the order of the question and near the documents with all the terms inside the proximity window. phrase and near need an index with term positions. (Default: or)')
+
+    searcher_batch.add_argument('--time_budget_ms',
+                                type=float,
+                                default=None,
+                                help='Milliseconds after which a bm25 search returns the best results found so far, needs an impact ordered bm25 cache. (Default: None)')
+
+    searcher_batch.add_argument('--posting_budget',
+                                type=int,
+                                default=None,
+                                help='Postings after which a bm25 search returns the best results found so far, needs an impact ordered bm25 cache. (Default: None)')
+
+    searcher_batch.add_argument('--proximity_window',
+                                type=int,
+                                default=8,
+                                help='Tokens that can hold all the terms of a near question. (Default: 8)')
+
+    searcher_batch.add_argument('--dynamic_pruning',
+                                action="store_true",
+                                help='Skips the blocks of postings of a bm25 question that cannot lift a document into the top-k (MaxScore), needs a binary index with skip blocks. The results are the same, the number of results only counts the documents of the decoded blocks. (Default: False)')
+
     # mutual exclusive searching modes
     searcher_modes_batch_parser = searcher_batch.add_subparsers(
         dest='ranking_mode', required=True)
@@ -193,6 +349,145 @@ if __name__ == "__main__":
     # bm25_mode_parser.add_argument("--ranking.bm25.k1", type=float, default=None)
     # bm25_mode_parser.add_argument("--ranking.bm25.b", type=float, default=None)
 
+    searcher_serve = searcher_mode_subparsers.add_parser(
+        'serve', help='Keeps the index loaded and answers queries over HTTP')
+    searcher_serve.add_argument('index_folder',
+                                type=str,
+                                help='Folder where all the index related files will be loaded.')
+
+    searcher_serve.add_argument('--top_k',
+                                type=int,
+                                default=1000,
+                                help='Number maximum of documents that should be returned per question.')
+
+    searcher_serve.add_argument('--host',
+                                type=str,
+                                default="127.0.0.1",
+                                help='Address where the server listens. (Default: 127.0.0.1)')
+
+    searcher_serve.add_argument('--port',
+                                type=int,
+                                default=8000,
+                                help='Port where the server listens. (Default: 8000)')
+
+    searcher_serve.add_argument('--unix_socket',
+                                type=str,
+                                default=None,
+                                help='Path of a unix socket to listen on instead of the host and port. (Default: None)')
+
+    searcher_serve.add_argument('--workers',
+                                type=int,
+                                default=1,
+                                help='Number of processes that score the queries. (Default: 1)')
+
+    searcher_serve.add_argument('--posting_cache',
+                                type=float,
+                                default=0,
+                                help='Memory in MB for the decoded posting lists of popular terms, 0 disables the cache. (Default: 0)')
+
+    searcher_serve.add_argument('--cache_warmup',
+                                type=str,
+                                default=None,
+                                help='Questions file or query log, one query per line, whose most frequent terms are loaded in the posting cache at startup. (Default: None)')
+
+    searcher_serve.add_argument('--result_cache',
+                                type=int,
+                                default=1024,
+                                help='Number of query results kept in memory, 0 disables the cache. (Default: 1024)')
+
+    searcher_serve.add_argument('--result_cache_ttl',
+                                type=float,
+                                default=600,
+                                help='Seconds a cached query result stays valid. (Default: 600)')
+
+    searcher_serve.add_argument('--result_cache_snapshot',
+                                type=str,
+                                default=None,
+                                help='File where the result cache is saved on exit and loaded on startup. (Default: None)')
+
+    searcher_serve.add_argument('--query_operator',
+                                type=str,
+                                default="or",
+                                choices=["or", "and", "phrase", "near"],
+                                help='and only returns the documents that contain every term of the question, phrase the documents with the terms in the order of the question and near the documents with all the terms inside the proximity window. phrase and near need an index with term positions. (Default: or)')
+
+    searcher_serve.add_argument('--time_budget_ms',
+                                type=float,
+                                default=None,
+                                help='Milliseconds after which a bm25 search returns the best results found so far, needs an impact ordered bm25 cache. (Default: None)')
+
+    searcher_serve.add_argument('--posting_budget',
+                                type=int,
+                                default=None,
+                                help='Postings after which a bm25 search returns the best results found so far, needs an impact ordered bm25 cache. (Default: None)')
+
+    searcher_serve.add_argument('--proximity_window',
+                                type=int,
+                                default=8,
+                                help='Tokens that can hold all the terms of a near question. (Default: 8)')
+
+    searcher_serve.add_argument('--dynamic_pruning',
+                                action="store_true",
+                                help='Skips the blocks of postings of a bm25 question that cannot lift a document into the top-k (MaxScore), needs a binary index with skip blocks. The results are the same, the number of results only counts the documents of the decoded blocks. (Default: False)')
+
+    # mutual exclusive searching modes
+    searcher_modes_serve_parser = searcher_serve.add_subparsers(
+        dest='ranking_mode', required=True)
+
+    bm25_mode_parser = searcher_modes_serve_parser.add_parser(
+        'ranking.bm25', help='Uses the BM25 as the searching method')
+    bm25_mode_parser.add_argument("--ranking.bm25.k1", type=float, default=1.2)
+    bm25_mode_parser.add_argument("--ranking.bm25.b", type=float, default=0.75)
+
+    tfidf_mode_parser = searcher_modes_serve_parser.add_parser(
+        'ranking.tfidf', help='Uses the TFIDF as the searching method')
+    tfidf_mode_parser.add_argument(
+        "--ranking.tfidf.smart", type=str, default="lnc.ltc")
+
+    searcher_sweep = searcher_mode_subparsers.add_parser(
+        'sweep', help='Ranks the questions with every combination of the ranking parameters and evaluates every one')
+    searcher_sweep.add_argument('index_folder',
+                                type=str,
+                                help='Folder where all the index related files will be loaded.')
+
+    searcher_sweep.add_argument('path_to_questions',
+                                type=str,
+                                help='Path to the file that contains the questions and the goldstandard judments, one per line.')
+
+    searcher_sweep.add_argument('--output_file',
+                                type=str,
+                                default=None,
+                                help='File where the metrics of every configuration are written, one per line. (Default: None)')
+
+    searcher_sweep.add_argument('--top_k',
+                                type=int,
+                                default=1000,
+                                help='Number maximum of documents that should be returned per question.')
+
+    searcher_sweep.add_argument('--batch_memory',
+                                type=float,
+                                default=512,
+                                help='Memory in MB for the decoded posting lists of a group of questions. (Default: 512)')
+
+    searcher_sweep.add_argument('--sweep_metrics',
+                                nargs="*",
+                                default=["F1", "DCG", "AP"],
+                                choices=["F1", "DCG", "AP", "precision", "recall"],
+                                help='Metrics of the table of configurations. (Default: F1 DCG AP)')
+
+    searcher_modes_sweep_parser = searcher_sweep.add_subparsers(
+        dest='ranking_mode', required=True)
+
+    bm25_mode_parser = searcher_modes_sweep_parser.add_parser(
+        'ranking.bm25', help='Uses the BM25 as the searching method')
+    bm25_mode_parser.add_argument("--ranking.bm25.k1", type=float, nargs="+", default=[1.2], help="BM25 k1 values of the grid")
+    bm25_mode_parser.add_argument("--ranking.bm25.b", type=float, nargs="+", default=[0.75], help="BM25 b values of the grid")
+
+    tfidf_mode_parser = searcher_modes_sweep_parser.add_parser(
+        'ranking.tfidf', help='Uses the TFIDF as the searching method')
+    tfidf_mode_parser.add_argument(
+        "--ranking.tfidf.smart", type=str, nargs="+", default=["lnc.ltc"], help="TFIDF smart notations of the grid")
+
     ############################
     ## Evaluator CLI interface ##
     ############################
@@ -223,12 +518,23 @@ if __name__ == "__main__":
                 index_output_path=args.index_output_folder,
                 index_algorithm=args.indexer.algorithm,
                 memory_threshold=args.indexer.memory_threshold,
+                memory_high_water=args.indexer.memory_high_water,
                 store_term_positions=args.indexer.storing.store_term_position,
+                workers=args.indexer.workers,
                 bm25_cache_in_disk=args.indexer.storing.bm25.cache_in_disk,
                 bm25_k1=args.indexer.storing.bm25.k1,
                 bm25_b=args.indexer.storing.bm25.b,
+                bm25_impact_ordered=args.indexer.storing.bm25.impact_ordered,
+                bm25_impact_bits=args.indexer.storing.bm25.impact_bits,
+                bm25_tf_cache=args.indexer.storing.bm25.tf_cache,
                 tfidf_cache_in_disk=args.indexer.storing.tfidf.cache_in_disk,
                 tfidf_smart=args.indexer.storing.tfidf.smart,
+                index_format=args.indexer.storing.index_format,
+                skip_block_size=args.indexer.storing.skip_block_size,
+                cache_bits=args.indexer.storing.cache_bits,
+                biwords=args.indexer.storing.biwords,
+                biwords_path=args.indexer.storing.biwords_path,
+                biword_terms=args.indexer.storing.biword_terms,
                 minL=args.tokenizer.minL,
                 stopwords_path=args.tokenizer.stopwords_path,
                 stemmer=args.tokenizer.stemmer,
@@ -237,15 +543,29 @@ if __name__ == "__main__":
 
     elif args.mode=="searcher":
 
+        #   only the parameters of the chosen ranking method are in the arguments
+        if args.ranking_mode == "ranking.bm25":
+            ranking_args = {"ranking_bm25_k1": args.ranking.bm25.k1, "ranking_bm25_b": args.ranking.bm25.b}
+        else:
+            ranking_args = {"ranking_tfidf_smart": args.ranking.tfidf.smart}
+
+        #   the arguments that only exist in some searcher modes
+        mode_args = {arg: getattr(args, arg) for arg in ("path_to_questions", "output_file", "host", "port", "unix_socket", "workers", "batch_strategy", "batch_memory", "posting_cache", "cache_warmup", "result_cache", "result_cache_ttl", "result_cache_snapshot", "query_operator", "proximity_window", "time_budget_ms", "posting_budget", "dynamic_pruning", "sweep_metrics") if hasattr(args, arg)}
+
+        #   the sweep is given lists of values, every combination is a point of the grid and the searcher starts with the first one
+        if args.searcher_mode == "sweep":
+            if args.ranking_mode == "ranking.bm25":
+                mode_args["sweep_grid"] = [{"ranking_bm25_k1": k1, "ranking_bm25_b": b} for k1 in args.ranking.bm25.k1 for b in args.ranking.bm25.b]
+            else:
+                mode_args["sweep_grid"] = [{"ranking_tfidf_smart": smart} for smart in args.ranking.tfidf.smart]
+            ranking_args = mode_args["sweep_grid"][0]
+
         Searcher(searcher_mode=args.searcher_mode,
                  index_folder=args.index_folder,
-                 path_to_questions=args.path_to_questions,
-                 output_file=args.output_file,
                  ranking_mode=args.ranking_mode,
                  top_k=args.top_k,
-                #  ranking_bm25_k1=args.ranking.bm25.k1,
-                #  ranking_bm25_b=args.ranking.bm25.b,
-                 ranking_tfidf_smart=args.ranking.tfidf.smart).start()
+                 **ranking_args,
+                 **mode_args).start()
 
     elif args.mode=="evaluator":
         Evaluator(gold_standard_file=args.gold_standard_file,
@@ -1,5 +1,8 @@
 import psutil
 
+#   cgroup v2 and v1 memory limits, used when running inside a container
+CGROUP_LIMITS = ["/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory/memory.limit_in_bytes"]
+
 class MemoryManager:
 
     __instance = None
@@ -10,23 +13,63 @@ class MemoryManager:
             MemoryManager()
         return MemoryManager.__instance
 
-    def __init__(self, memory_limit_percentage: float = None):
+    def __init__(self, memory_limit_percentage: float = None, high_water: float = 0.9):
         if MemoryManager.__instance == None:
+            self.total_memory = self.get_total_memory()
             if memory_limit_percentage == None:
-                self.max_memory = None
+                self.max_memory = self.total_memory
             else:
-                self.max_memory = 4096 * 1024 * 1024 * memory_limit_percentage * 0.97
-                print("Using {:.0f} MB of memory".format(self.max_memory/0.97/1024/1024))
+                self.max_memory = self.total_memory * memory_limit_percentage
+                print("Using {:.0f} MB of memory".format(self.max_memory/1024/1024))
+            #   blocks are flushed when the memory usage reaches the high-water mark
+            self.high_water = self.max_memory * high_water
             self.pid = psutil.Process()
             MemoryManager.__instance = self
         else:
             raise Exception("This class is a singleton!")
 
-    def can_afford_memory(self, memory: int = 0):
-        if self.max_memory == None:
-            return self.pid.memory_info().rss + memory < psutil.virtual_memory().available
-        return self.pid.memory_info().rss + memory < self.max_memory
-    
+    @staticmethod
+    def get_total_memory():
+        #   the real memory of the system, or the cgroup limit if it is lower
+        total = psutil.virtual_memory().total
+        for path in CGROUP_LIMITS:
+            try:
+                with open(path) as f:
+                    limit = f.read().strip()
+            except OSError:
+                continue
+            if limit.isdigit():
+                total = min(total, int(limit))
+            break
+        return total
+
+    def start_accounting(self, workers: int = 1, min_budget: float = 0):
+        #   memory that each in memory block can use before reaching the high-water mark, a high-water mark below
+        #   the memory already in use would flush the blocks after every document, so they get at least min_budget
+        usage = self.get_memory_usage()
+        self.budget = max(0, self.high_water - usage) / workers
+        if self.budget < min_budget:
+            print("Memory high-water mark of {:.0f} MB leaves {:.0f} MB above the {:.0f} MB in use, using blocks of {:.0f} MB".format(
+                self.high_water/1024/1024, self.budget * workers/1024/1024, usage/1024/1024, min_budget/1024/1024))
+            self.budget = min_budget
+        self.reset_base()
+
+    def reset_base(self):
+        #   memory used before the blocks start to fill, called again in every worker process with its own pid
+        self.pid = psutil.Process()
+        self.base = self.peak = self.get_memory_usage()
+        self.correction = 1.0
+
+    def block_is_full(self, block_size: float, check_usage: bool = False):
+        #   the estimated size of the block is corrected with the real memory usage whenever it is checked
+        if check_usage:
+            usage = self.get_memory_usage()
+            #   only memory above the previous peak is new, the memory of flushed blocks is reused before the process grows
+            if usage > self.peak:
+                if block_size:
+                    self.correction = max(self.correction, (usage - self.base) / block_size)
+                self.peak = usage
+        return block_size * self.correction >= self.budget
+
     def get_memory_usage(self):
         return self.pid.memory_info().rss
-
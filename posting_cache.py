@@ -0,0 +1,65 @@
+from collections import OrderedDict
+
+
+class PostingCache:
+
+    #   estimated bytes of a decoded posting, two python numbers and their list slots
+    posting_size = 80
+
+    def __init__(self, max_bytes: int) -> None:
+        #   least recently used entries are at the start of the dict
+        self.entries = OrderedDict()
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def size(self, value) -> int:
+        #   value is a term list, doc ids first, or None for a term that is not indexed
+        return self.posting_size * (len(value[0]) if value else 1)
+
+    def get(self, key, load):
+        #   the cached value of the key, load(key) is called and its value cached on a miss
+        if key in self.entries:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key][0]
+
+        self.misses += 1
+        value = load(key)
+        self.put(key, value)
+        return value
+
+    def put(self, key, value) -> bool:
+        #   a value larger than the whole budget is not cached
+        size = self.size(value)
+        if size > self.max_bytes:
+            return False
+        if key in self.entries:
+            self.bytes -= self.entries.pop(key)[1]
+
+        while self.bytes + size > self.max_bytes:
+            _, (_, evicted_size) = self.entries.popitem(last=False)
+            self.bytes -= evicted_size
+            self.evictions += 1
+
+        self.entries[key] = (value, size)
+        self.bytes += size
+        return True
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {"entries": len(self.entries), "bytes": self.bytes, "max_bytes": self.max_bytes,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0}
@@ -0,0 +1,304 @@
+import mmap
+import os
+import sys
+from array import array
+from collections import Counter
+from itertools import accumulate, islice
+
+#   binary posting lists: every integer is stored with variable-byte encoding (7 bits per byte,
+#   the high bit marks that more bytes follow) and the doc ids are stored as gaps to the previous doc id
+
+
+def encode_varint(value: int, buffer: bytearray):
+    while value > 127:
+        buffer.append((value & 127) | 128)
+        value >>= 7
+    buffer.append(value)
+
+
+def decode_varints(buffer) -> list[int]:
+    values = []
+    append = values.append
+    value = shift = 0
+    for byte in buffer:
+        if byte < 128:
+            append(value | (byte << shift))
+            value = shift = 0
+        else:
+            value |= (byte & 127) << shift
+            shift += 7
+    return values
+
+
+def decode_varint(buffer, pos: int = 0) -> tuple[int, int]:
+    #   decode a single integer, returns the value and the position after it
+    value = shift = 0
+    while True:
+        byte = buffer[pos]
+        pos += 1
+        value |= (byte & 127) << shift
+        if byte < 128:
+            return value, pos
+        shift += 7
+
+
+def encode_postings(doc_ids: list[int], tfs: list[int], last_doc: int = 0) -> bytearray:
+    #   format: gap tf gap tf ...
+    buffer = bytearray()
+    for doc_id, tf in zip(doc_ids, tfs):
+        encode_varint(doc_id - last_doc, buffer)
+        encode_varint(tf, buffer)
+        last_doc = doc_id
+    return buffer
+
+
+def decode_postings(buffer) -> tuple[list[int], list[int]]:
+    values = decode_varints(buffer)
+    return list(accumulate(values[0::2])), values[1::2]
+
+
+def encode_positional_postings(doc_ids: list[int], positions: list[list[int]], last_doc: int = 0) -> bytearray:
+    #   format: gap tf pos_gap pos_gap ... gap tf pos_gap ...
+    buffer = bytearray()
+    for doc_id, doc_positions in zip(doc_ids, positions):
+        encode_varint(doc_id - last_doc, buffer)
+        encode_varint(len(doc_positions), buffer)
+        last_pos = 0
+        for pos in doc_positions:
+            encode_varint(pos - last_pos, buffer)
+            last_pos = pos
+        last_doc = doc_id
+    return buffer
+
+
+def decode_positional_postings(buffer) -> tuple[list[int], list[int], list[list[int]]]:
+    values = decode_varints(buffer)
+    doc_ids, tfs, positions = [], [], []
+    doc_id = 0
+    i = 0
+    while i < len(values):
+        doc_id += values[i]
+        tf = values[i + 1]
+        doc_ids.append(doc_id)
+        tfs.append(tf)
+        positions.append(list(accumulate(values[i + 2:i + 2 + tf])))
+        i += 2 + tf
+    return doc_ids, tfs, positions
+
+
+def encode_skip_postings(doc_ids: list[int], tfs: list[int], block_size: int) -> bytearray:
+    #   format: block_count (last_doc_gap block_length) * block_count block block ...
+    #   the gaps of a block continue from the last doc id of the previous block, so the blocks together
+    #   are the plain encoding of the list and a block can be decoded on its own from the skip data
+    header, data = bytearray(), bytearray()
+    starts = range(0, len(doc_ids), block_size)
+    encode_varint(len(starts), header)
+    last_doc = 0
+    for start in starts:
+        end = min(start + block_size, len(doc_ids))
+        block = encode_postings(doc_ids[start:end], tfs[start:end], last_doc)
+        encode_varint(doc_ids[end - 1] - last_doc, header)
+        encode_varint(len(block), header)
+        data += block
+        last_doc = doc_ids[end - 1]
+    return header + data
+
+
+def encode_positional_skip_postings(doc_ids: list[int], positions: list[list[int]], block_size: int) -> bytearray:
+    #   format: block_count (last_doc_gap block_length positions_length) * block_count block block ... positions
+    #   every document of a block is gap tf positions_length, its gap encoded positions are in a separate
+    #   stream after the blocks, so they are only decoded for the documents that need them
+    header, data, stream = bytearray(), bytearray(), bytearray()
+    starts = range(0, len(doc_ids), block_size)
+    encode_varint(len(starts), header)
+    last_doc = 0
+    for start in starts:
+        end = min(start + block_size, len(doc_ids))
+        block, block_start, block_last_doc = bytearray(), len(stream), last_doc
+        for doc_id, doc_positions in zip(doc_ids[start:end], positions[start:end]):
+            encoded = encode_gaps(doc_positions)
+            encode_varint(doc_id - last_doc, block)
+            encode_varint(len(doc_positions), block)
+            encode_varint(len(encoded), block)
+            stream += encoded
+            last_doc = doc_id
+        encode_varint(last_doc - block_last_doc, header)
+        encode_varint(len(block), header)
+        encode_varint(len(stream) - block_start, header)
+        data += block
+    return header + data + stream
+
+
+def encode_gaps(values: list[int]) -> bytearray:
+    buffer = bytearray()
+    last = 0
+    for value in values:
+        encode_varint(value - last, buffer)
+        last = value
+    return buffer
+
+
+def decode_gaps(buffer) -> list[int]:
+    return list(accumulate(decode_varints(buffer)))
+
+
+def decode_skips(buffer, positional: bool = False) -> tuple[list[int], list[int], list[int], int]:
+    #   returns the last doc id of every block, the offsets of the blocks after the skip data and, for positional
+    #   lists, the offsets of their positions in the positions stream (both with the end of the last block)
+    #   and the position where the blocks start
+    block_count, pos = decode_varint(buffer)
+    last_docs, offsets = [], [0]
+    position_offsets = [0] if positional else None
+    last_doc = 0
+    for _ in range(block_count):
+        gap, pos = decode_varint(buffer, pos)
+        length, pos = decode_varint(buffer, pos)
+        last_doc += gap
+        last_docs.append(last_doc)
+        offsets.append(offsets[-1] + length)
+        if positional:
+            length, pos = decode_varint(buffer, pos)
+            position_offsets.append(position_offsets[-1] + length)
+    return last_docs, offsets, position_offsets, pos
+
+
+def skip_blocks(buffer, positional: bool = False) -> memoryview:
+    #   the encoded blocks that follow the skip data, without the positions stream
+    _, offsets, _, pos = decode_skips(buffer, positional)
+    return memoryview(buffer)[pos:pos + offsets[-1]]
+
+
+def decode_positional_skip_blocks(buffer) -> tuple[list[int], list[int], list[int]]:
+    #   returns the doc ids, the term frequencies and the length in bytes of the positions of every document
+    values = decode_varints(buffer)
+    return list(accumulate(values[0::3])), values[1::3], values[2::3]
+
+
+def encode_record(term: str, payload: bytearray) -> bytearray:
+    #   format: term_length term payload_length payload
+    term = term.encode("utf-8")
+    record = bytearray()
+    encode_varint(len(term), record)
+    record += term
+    encode_varint(len(payload), record)
+    record += payload
+    return record
+
+
+def decode_record(buffer, pos: int = 0) -> tuple[str, memoryview, int]:
+    #   returns the term, the payload and the position of the next record
+    term_length, pos = decode_varint(buffer, pos)
+    term = str(buffer[pos:pos + term_length], "utf-8")
+    pos += term_length
+    payload_length, pos = decode_varint(buffer, pos)
+    return term, memoryview(buffer)[pos:pos + payload_length], pos + payload_length
+
+
+def read_records(path: str):
+    #   iterate over all the records of a binary index file without loading it to memory
+    if not os.path.getsize(path):
+        return
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        pos = 0
+        while pos < len(buffer):
+            term, payload, pos = decode_record(buffer, pos)
+            yield term, bytes(payload)
+            payload.release()
+
+
+def load_offsets(path: str) -> array:
+    offsets = array("Q")
+    with open(path, "rb") as f:
+        offsets.frombytes(f.read())
+    return offsets
+
+
+#   estimated bytes used by the in memory blocks, typed arrays over-allocate about 1/8 when they grow
+TERM_SIZE = 2 * sys.getsizeof(array("I")) + sys.getsizeof("") + 100
+POSTING_SIZE = 2 * 4 * 1.125
+POSITION_SIZE = 4 * 1.125
+
+
+class PostingsBlock:
+
+    #   in memory block of the SPIMI inversion, every term gets an id and its postings are kept in typed arrays
+
+    def __init__(self) -> None:
+        self.term_ids = {}
+        self.doc_ids = []
+        self.tfs = []
+        self.size = 0
+
+    def __len__(self):
+        return len(self.term_ids)
+
+    def term_id(self, term: str) -> int:
+        try:
+            return self.term_ids[term]
+        except KeyError:
+            term_id = self.term_ids[term] = len(self.doc_ids)
+            self.doc_ids.append(array("I"))
+            self.tfs.append(array("I"))
+            self.size += TERM_SIZE + len(term)
+            return term_id
+
+    def add_document(self, doc_id: int, tokens: list[str]):
+        #   the term frequencies of the document are counted in a single pass
+        counts = Counter(tokens)
+        for term, tf in counts.items():
+            term_id = self.term_id(term)
+            self.doc_ids[term_id].append(doc_id)
+            self.tfs[term_id].append(tf)
+        self.size += len(counts) * POSTING_SIZE
+
+    def lines(self):
+        #   sorted lines in the format: term;doc1:freq;doc2:freq;...
+        for term in sorted(self.term_ids):
+            term_id = self.term_ids[term]
+            yield f"{term};{';'.join(f'{doc_id}:{tf}' for doc_id, tf in zip(self.doc_ids[term_id], self.tfs[term_id]))}\n"
+
+    def clear(self):
+        self.term_ids.clear()
+        self.doc_ids.clear()
+        self.tfs.clear()
+        self.size = 0
+
+
+class PositionalPostingsBlock(PostingsBlock):
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.positions = []
+
+    def term_id(self, term: str) -> int:
+        term_id = super().term_id(term)
+        if term_id == len(self.positions):
+            self.positions.append(array("I"))
+        return term_id
+
+    def add_document(self, doc_id: int, tokens: list[str]):
+        doc_positions = {}
+        for i, term in enumerate(tokens):
+            try:
+                doc_positions[term].append(i)
+            except KeyError:
+                doc_positions[term] = [i]
+
+        for term, positions in doc_positions.items():
+            term_id = self.term_id(term)
+            self.doc_ids[term_id].append(doc_id)
+            self.tfs[term_id].append(len(positions))
+            self.positions[term_id].extend(positions)
+        self.size += len(doc_positions) * POSTING_SIZE + len(tokens) * POSITION_SIZE
+
+    def lines(self):
+        #   sorted lines in the format: term;doc1:pos,pos,pos;doc2:pos,pos,pos;...
+        for term in sorted(self.term_ids):
+            term_id = self.term_ids[term]
+            positions = map(str, self.positions[term_id])
+            docs = ('{0}:{1}'.format(doc_id, ','.join(islice(positions, tf))) for doc_id, tf in zip(self.doc_ids[term_id], self.tfs[term_id]))
+            yield f"{term};{';'.join(docs)}\n"
+
+    def clear(self):
+        super().clear()
+        self.positions.clear()
@@ -0,0 +1,87 @@
+import time
+from accumulators import ScoreAccumulator, array_top
+from utils import np
+
+
+#   relative margin below the k-th partial score, it keeps the documents that could tie with the k-th best
+#   document once their scores are added in the order of the lists
+pruning_margin = 1e-9
+
+
+def max_score(lists: list, k: int, N: int) -> tuple[list, int, bool]:
+    #   term-at-a-time MaxScore over (last_docs, score_blocks, upper_bound) lists, in the order of the query and repeated
+    #   for a repeated term. last_docs is the last doc id of every block of postings of the list, score_blocks(blocks)
+    #   returns the doc ids and the scores (numpy arrays) of the postings of those blocks and upper_bound is the highest
+    #   score of the list. The lists are scored whole from the highest bound down until the k-th best partial score is
+    #   above the bounds of the lists left: a document without a scored posting cannot reach the top-k then, and the
+    #   lists left only decode the blocks of the candidates that still can. The scores of the candidates are added
+    #   again in the order of the lists, so they are the same floats as the exhaustive ones, with ties broken by the
+    #   lowest doc id. Returns the top-k (doc_id, score) pairs, the number of matched documents and whether every
+    #   matched document was counted, the documents of the blocks that are skipped are not
+    #   a repeated term is the same list, it is decoded once and its scores are added once for every repeat
+    repeats = {}
+    for _, score_blocks, _ in lists:
+        repeats[id(score_blocks)] = repeats.get(id(score_blocks), 0) + 1
+    distinct = sorted({id(term_list[1]): term_list for term_list in lists}.values(), key=lambda term_list: -term_list[2] * repeats[id(term_list[1])])
+    #   highest score that the lists that are not scored yet can add to a document
+    remaining = sum(upper_bound * repeats[id(score_blocks)] for _, score_blocks, upper_bound in distinct)
+
+    partial = np.zeros(N)
+    matched = np.zeros(N, dtype=bool)
+    candidates = None
+    counted = True
+    scored = {}
+
+    for last_docs, score_blocks, upper_bound in distinct:
+        key = id(score_blocks)
+        remaining -= upper_bound * repeats[key]
+        if candidates is None:
+            blocks = range(len(last_docs))
+        else:
+            #   the first block whose last doc id is not below the candidate is the only one that can hold it
+            blocks = np.unique(np.searchsorted(last_docs, candidates))
+            blocks = blocks[blocks < len(last_docs)].tolist()
+            counted = counted and len(blocks) == len(last_docs)
+        doc_ids, scores = scored[key] = score_blocks(blocks)
+        partial[doc_ids] += scores * repeats[key]
+        matched[doc_ids] = True
+
+        docs = np.flatnonzero(matched) if candidates is None else candidates
+        if len(docs) > k:
+            threshold = np.partition(partial[docs], len(docs) - k)[len(docs) - k] * (1 - pruning_margin)
+            if candidates is not None or threshold > remaining:
+                candidates = docs[partial[docs] + remaining >= threshold]
+
+    if candidates is None:
+        candidates = np.flatnonzero(matched)
+    scores = np.zeros(len(candidates))
+    for _, score_blocks, _ in lists:
+        doc_ids, list_scores = scored[id(score_blocks)]
+        if len(doc_ids):
+            i = np.minimum(np.searchsorted(doc_ids, candidates), len(doc_ids) - 1)
+            scores = scores + np.where(doc_ids[i] == candidates, list_scores[i], 0.0)
+    return array_top(candidates, scores, k), int(np.count_nonzero(matched)), counted
+
+
+def score_at_a_time(segments: list, k: int, N: int, deadline: float = None, posting_budget: int = None):
+    #   score-at-a-time evaluation over the (impact, count, doc_ids) segments of impact ordered lists, the
+    #   segments with the highest impacts are added first and the evaluation stops at the deadline (a
+    #   perf_counter time) or once posting_budget postings are added. Returns the top-k (doc_id, impact)
+    #   pairs, the number of matched documents and whether every segment was added
+    segments = sorted(segments, key=lambda segment: -segment[0])
+    accumulator = ScoreAccumulator(N, sum(count for _, count, _ in segments))
+    added = 0
+    exact = True
+
+    for impact, count, doc_ids in segments:
+        if deadline is not None and time.perf_counter() >= deadline or posting_budget is not None and added >= posting_budget:
+            exact = False
+            break
+        doc_ids = doc_ids()
+        if posting_budget is not None and added + count > posting_budget:
+            doc_ids = doc_ids[:posting_budget - added]
+            exact = False
+        accumulator.add(doc_ids, [impact] * len(doc_ids))
+        added += len(doc_ids)
+
+    return accumulator.top(k), len(accumulator), exact
@@ -1,5 +1,7 @@
 import json
 import gzip
+import time
+from collections import deque
 
 class Reader:
     def __init__(self, path_to_file: str):
@@ -27,4 +29,45 @@ class JsonReader(Reader):
     def read(self):
         for line in self.file:
             yield json.loads(line.strip())
-        self.file.close()
\ No newline at end of file
+        self.file.close()
+
+class RunReader(Reader):
+
+    def __init__(self, path_to_run: str, buffer_size: int = 1024 * 1024):
+        super().__init__(path_to_run)
+        self.path = path_to_run
+        self.buffer = deque()
+        self.buffer_size = max(1, buffer_size)
+        self.exhausted = False
+        self.bytes = 0
+        self.read_time = 0
+
+    def _fill(self):
+        #   read the next lines of the run until the buffer holds buffer_size bytes
+        start = time.perf_counter()
+        size = 0
+        for line in self.file:
+            size += len(line)
+            self.buffer.append(line.rstrip("\n").split(";", 1))
+            if size >= self.buffer_size:
+                break
+        self.bytes += size
+        self.read_time += time.perf_counter() - start
+
+        if not self.buffer:
+            self.exhausted = True
+            self.file.close()
+
+    def term(self):
+        #   term at the head of the run, None when the run is exhausted
+        if not self.buffer and not self.exhausted:
+            self._fill()
+        return self.buffer[0][0] if self.buffer else None
+
+    def pop(self):
+        #   remove the head of the run and return its postings as a single string
+        return self.buffer.popleft()[1]
+
+    def throughput(self):
+        #   MB read per second spent reading the run
+        return self.bytes / 1024 / 1024 / self.read_time if self.read_time else 0
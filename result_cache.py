@@ -0,0 +1,92 @@
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+
+
+class ResultCache:
+
+    def __init__(self, metadata_path: str, max_entries: int = 1024, ttl: float = 600, snapshot_path: str = None) -> None:
+        #   least recently used entries are at the start of the dict, every entry is (stored_at, value)
+        self.entries = OrderedDict()
+        self.metadata_path = metadata_path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.snapshot_path = snapshot_path
+        self.hits = 0
+        self.misses = 0
+
+        self.metadata_mtime = None
+        self.version = None
+        self.check_version()
+        if snapshot_path and os.path.exists(snapshot_path):
+            self.load()
+
+    @staticmethod
+    def key(query_tokens: list, settings: tuple, top_k: int) -> str:
+        #   the token multiset, the order of the tokens does not change the scores. settings holds the ranking and the
+        #   search settings that the results depend on
+        return json.dumps([sorted(query_tokens), list(settings), top_k])
+
+    def check_version(self):
+        #   the entries are dropped when the metadata of the index changes, the file is only hashed when its mtime changes
+        mtime = os.stat(self.metadata_path).st_mtime_ns
+        if mtime == self.metadata_mtime:
+            return
+        self.metadata_mtime = mtime
+        with open(self.metadata_path, "rb") as f:
+            version = hashlib.sha1(f.read()).hexdigest()
+        if version != self.version:
+            self.entries.clear()
+            self.version = version
+
+    def get(self, key: str):
+        #   the cached value of the key, None if it is missing or expired
+        self.check_version()
+        entry = self.entries.get(key)
+        if entry is not None and time.time() - entry[0] <= self.ttl:
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return entry[1]
+
+        if entry is not None:
+            del self.entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, key: str, value):
+        self.entries[key] = (time.time(), value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def load(self):
+        #   a snapshot of another version of the index or an unreadable one is ignored
+        try:
+            with open(self.snapshot_path, "r") as f:
+                snapshot = json.load(f)
+        except ValueError:
+            return
+        if snapshot.get("version") != self.version:
+            return
+        now = time.time()
+        for key, stored_at, value in snapshot["entries"]:
+            if now - stored_at <= self.ttl:
+                self.entries[key] = (stored_at, value)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def save(self):
+        if not self.snapshot_path:
+            return
+        self.check_version()
+        #   written to a temporary file first, so a crash never leaves a partial snapshot
+        with open(f"{self.snapshot_path}.tmp", "w") as f:
+            json.dump({"version": self.version, "entries": [[key, stored_at, value] for key, (stored_at, value) in self.entries.items()]}, f)
+        os.replace(f"{self.snapshot_path}.tmp", self.snapshot_path)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {"entries": len(self.entries), "max_entries": self.max_entries, "hits": self.hits, "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0}
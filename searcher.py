@@ -1,16 +1,47 @@
 import json
 import math
-from reader import JsonReader
+from reader import JsonReader, Reader
 from tokenizer import Tokenizer
 import time
 import os
-import linecache
+from itertools import chain
+from collections import Counter
 from utils import *
+from index_reader import IndexReader, map_file
+from documents import DocumentTable
+from accumulators import ScoreAccumulator, array_top
+from pruning import max_score, score_at_a_time
+from impacts import ImpactIndex
+from bm25_cache import BM25TFCache
+from intersection import intersect, phrase_match, window_match
+from posting_cache import PostingCache
+from result_cache import ResultCache
+from server import SearchServer, search_query, worker_pool
+from evaluator import Evaluator
+
+class RankedResults(dict):
+
+    #   pmid -> score of a search whose ranking can differ from the exhaustive one, exact tells if it does not. The
+    #   searches of the impact ordered lists rank by quantized scores and can stop before every posting is added, they
+    #   are never exact. counted tells if the number of results counts every matched document, a pruned search skips some
+
+    def __init__(self, results: dict, exact: bool, counted: bool = True) -> None:
+        super().__init__(results)
+        self.exact = exact
+        self.counted = counted
+
 
 class Searcher:
 
-    def __init__(self, searcher_mode: str, index_folder: str, path_to_questions: str, output_file: str, ranking_mode: str, 
-                 top_k: int = 10, ranking_bm25_k1: float = 1.2, ranking_bm25_b: float=0.75, ranking_tfidf_smart: str="lnc.ltc" ) -> None:
+    #   queries sent to a worker process at a time by the parallel batch search
+    batch_chunk_size = 8
+
+    def __init__(self, searcher_mode: str, index_folder: str, path_to_questions: str = None, output_file: str = None, ranking_mode: str = "ranking.bm25", 
+                 top_k: int = 10, ranking_bm25_k1: float = 1.2, ranking_bm25_b: float=0.75, ranking_tfidf_smart: str="lnc.ltc", dynamic_pruning: bool = False,
+                 host: str = "127.0.0.1", port: int = 8000, unix_socket: str = None, workers: int = 1,
+                 batch_strategy: str = "query", batch_memory: float = 512, posting_cache: float = 0, cache_warmup: str = None,
+                 result_cache: int = 0, result_cache_ttl: float = 600, result_cache_snapshot: str = None, query_operator: str = "or", proximity_window: int = 8,
+                 time_budget_ms: float = None, posting_budget: int = None, sweep_grid: list = None, sweep_metrics: list = ["F1", "DCG", "AP"]) -> None:
 
         #   load metadata
         metadata = json.load(open(f"{index_folder}metadata.json"))
@@ -20,18 +51,31 @@ class Searcher:
 
         self.cache = False
         self.cache_file = None
+        self.impact_index = None
+        self.tf_cache = None
+        self.index_folder = index_folder
+        #   document norms of every tf-idf weighting scheme, mapped once, the index only has the norms of the scheme it was built with
+        self.scheme_norms = {}
+        self.doc_norms_scheme = metadata.get("doc_norms")
         
         if ranking_mode == "ranking.bm25":
             self.__class__ = BM25Searcher
-            self.bm25_k1 = ranking_bm25_k1
-            self.bm25_b = ranking_bm25_b
+            self.set_ranking(ranking_bm25_k1, ranking_bm25_b)
             if os.path.exists(f"{index_folder}cache_bm25_{self.bm25_k1}_{self.bm25_b}"):
                 self.cache = True
                 self.cache_file = f"{index_folder}cache_bm25_{self.bm25_k1}_{self.bm25_b}"
+            #   impact ordered lists of the cache, searched score-at-a-time when there is a time or posting budget.
+            #   Only the build of the index writes them, for its own k1 and b
+            if metadata.get("bm25_impact_ordered") and (metadata["bm25_k1"], metadata["bm25_b"]) == (self.bm25_k1, self.bm25_b):
+                self.impact_index = ImpactIndex(f"{index_folder}impacts_bm25_{self.bm25_k1}_{self.bm25_b}", metadata["impact_scale"])
+            #   without the cache of these k1 and b the scores are computed from the columns of the parameter free cache,
+            #   when the build of the index wrote them
+            if not self.cache and metadata.get("bm25_tf_cache"):
+                self.tf_cache = BM25TFCache(f"{index_folder}cache_bm25_tf", metadata["avgdl"])
 
         elif ranking_mode == "ranking.tfidf":
             self.__class__ = TFIDFSearcher
-            self.smart = ranking_tfidf_smart.split(".")
+            self.set_ranking(ranking_tfidf_smart)
             if os.path.exists(f"{index_folder}cache_tfidf_{self.smart[0]}"):  
                 self.cache = True
                 self.cache_file = f"{index_folder}cache_tfidf_{self.smart[0]}"
@@ -39,32 +83,114 @@ class Searcher:
         else:
             raise Exception("Invalid ranking mode: {}".format(ranking_mode))
         
-        self.index_folder = index_folder
         self.path_to_questions = path_to_questions
-        self.output_file = output_file+".json"
+        self.output_file = f"{output_file}.json" if output_file else None
         self.top_k = top_k
+        self.dynamic_pruning = dynamic_pruning
         self.searcher_mode = searcher_mode
-        self.path_to_questions = path_to_questions
-
-        self.index_map = json.load(open(f"{index_folder}index_map.json"))
-        self.combinations = list(self.index_map.keys())
+        self.host = host
+        self.port = port
+        self.unix_socket = unix_socket
+        self.workers = max(1, workers)
+
+        #   the term strategy decodes every posting list needed by a group of questions once, the memory is given in MB
+        if batch_strategy not in ("query", "term"):
+            raise ValueError(f"Invalid batch strategy: {batch_strategy}")
+        self.batch_strategy = batch_strategy
+        self.batch_memory = batch_memory * 1024 * 1024
+        self.batch_lists = None
+
+        #   with the and operator only the documents that contain every query term are ranked, phrase also needs
+        #   the terms in the order of the query and near needs all of them inside proximity_window tokens
+        if query_operator not in ("or", "and", "phrase", "near"):
+            raise ValueError(f"Invalid query operator: {query_operator}")
+        self.query_operator = query_operator
+        self.proximity_window = proximity_window
+
+        #   the budgets trade exact results for latency, the search returns the best top-k found before reaching them
+        if (time_budget_ms is not None or posting_budget is not None) and self.impact_index is None:
+            raise ValueError("A time or posting budget needs an impact ordered bm25 cache of the ranking parameters")
+        self.time_budget_ms = time_budget_ms
+        self.posting_budget = posting_budget
+
+        #   the sweep ranks the questions with every point of the grid, each point holds the ranking arguments of the searcher
+        self.sweep_grid = sweep_grid or []
+        self.sweep_metrics = sweep_metrics
+
+        #   the index and the cache are memory mapped and only the posting lists of the query terms are decoded
+        self.index_format = metadata.get("index_format", "text")
+        self.positional = metadata["store_term_positions"]
+        if query_operator in ("phrase", "near") and not self.positional:
+            raise ValueError(f"The {query_operator} operator needs an index with term positions")
+        #   the scores of a quantized cache are integers, they are accumulated as they are and scaled once in the results
+        self.index_reader = IndexReader(index_folder, self.index_format, self.positional, self.cache_file, metadata.get("skip_block_size", 0),
+                                        metadata.get("cache_bits", 0), metadata.get("cache_scale", 1.0))
+        #   the adjacent pairs of a phrase query are read from the biword lists when the index has them
+        self.biword_reader = None
+        if metadata.get("biwords"):
+            self.biword_reader = IndexReader(f"{index_folder}biwords/", self.index_format, True, None, metadata.get("skip_block_size", 0))
+
+        #   the collection statistics and the document table do not change between queries
+        self.N = metadata["N"]
+        self.avgdl = metadata["avgdl"]
+        self.total_tokens = metadata["total_tokens"]
+        self.documents = DocumentTable(f"{index_folder}documents")
+        #   the lengths of the documents of a posting list are gathered at once with numpy
+        self.doc_lengths = np.frombuffer(self.documents.lengths, dtype=np.uint32) if np is not None else None
+        #   the shortest document bounds the bm25 scores of the lists that are pruned before they are decoded
+        if not self.N:
+            self.min_dl = 0
+        elif np is not None:
+            self.min_dl = int(self.doc_lengths.min())
+        else:
+            self.min_dl = min(self.documents.lengths)
 
-    def start(self):
-        if self.searcher_mode == "batch":
-            queries = JsonReader(self.path_to_questions).read()
-            self.batch_search(queries)
+        #   decoded term lists of popular terms, keyed by term and ranking parameters, the budget is given in MB
+        self.posting_cache = None
+        if posting_cache > 0:
+            self.posting_cache = PostingCache(int(posting_cache * 1024 * 1024))
+            if cache_warmup:
+                self.warm_up(cache_warmup)
 
-        elif self.searcher_mode == "interactive":
-            self.interative_search()
+        #   ranked results of the latest queries, dropped when the metadata of the index changes
+        self.result_cache = None
+        if result_cache > 0:
+            self.result_cache = ResultCache(f"{index_folder}metadata.json", result_cache, result_cache_ttl, result_cache_snapshot)
 
-        else:
-            raise Exception("Invalid searcher mode: {}".format(self.searcher_mode))
+    def start(self):
+        try:
+            if self.searcher_mode == "batch":
+                queries = JsonReader(self.path_to_questions).read()
+                self.batch_search(queries)
+
+            elif self.searcher_mode == "interactive":
+                self.interative_search()
+
+            elif self.searcher_mode == "sweep":
+                self.sweep_search()
+
+            elif self.searcher_mode == "serve":
+                #   the index stays loaded and every request only pays for the query
+                SearchServer(self, self.host, self.port, self.unix_socket, self.workers).run()
+
+            else:
+                raise Exception("Invalid searcher mode: {}".format(self.searcher_mode))
+        finally:
+            #   the result cache survives restarts through its snapshot
+            if self.result_cache is not None:
+                self.result_cache.save()
         
     def process_query(self, query: str):
         return self.tokenizer.tokenize(query)
 
     def batch_search(self, queries: list[str]):
 
+        if self.batch_strategy == "term":
+            return self.term_batch_search(queries)
+
+        if self.workers > 1:
+            return self.parallel_batch_search(queries)
+
         final_results = {}
 
         for query in queries:
@@ -80,38 +206,308 @@ class Searcher:
             query_tokens = self.process_query(query_text)
 
             results, query_processing_time, total_results_count = self.search(query_tokens)
-            print(f"{query_id}: {total_results_count} results found in {round(query_processing_time, 3)} seconds")
+            print(f"{query_id}: {self.results_found(results, total_results_count)} in {round(query_processing_time, 3)} seconds")
             final_results[query_id] = results
             #print(results)
             # print(query_id, query_text, query_tokens)
 
             # save results
 
+        self.print_cache_stats()
+        self.save_results(final_results, self.output_file)
+
+    def parallel_batch_search(self, queries: list[str]):
+        #   the queries are scored by the worker processes and the results come back in the order of the questions
+        queries = list(queries)
+        final_results = {}
+
+        with worker_pool(self, self.workers) as executor:
+            searches = executor.map(search_query, (query["query_text"] for query in queries), chunksize=self.batch_chunk_size)
+            for query, (results, query_processing_time, total_results_count) in zip(queries, searches):
+                print(f"{query['query_id']}: {self.results_found(results, total_results_count)} in {round(query_processing_time, 3)} seconds")
+                final_results[query["query_id"]] = results
+
+        self.save_results(final_results, self.output_file)
+
+    def term_batch_search(self, queries: list[str]):
+        #   all the questions are tokenized first, so the lists of the terms they share are decoded and scored once
+        queries = [(query["query_id"], self.process_query(query["query_text"])) for query in queries]
+        final_results = {}
+
+        for group in self.query_groups(queries):
+            start_time = time.perf_counter()
+            #   the lists are read in lexicon order
+            self.batch_lists = {term: self.shared_term_list(term) for term in sorted(set(chain.from_iterable(tokens for _, tokens in group)))}
+            print(f"{len(self.batch_lists)} posting lists of {len(group)} questions decoded in {round(time.perf_counter() - start_time, 3)} seconds")
+
+            for query_id, query_tokens in group:
+                results, query_processing_time, total_results_count = self.search(query_tokens)
+                print(f"{query_id}: {self.results_found(results, total_results_count)} in {round(query_processing_time, 3)} seconds")
+                final_results[query_id] = results
+
+            self.batch_lists = None
+
+        self.print_cache_stats()
         self.save_results(final_results, self.output_file)
 
+    def sweep_search(self):
+        #   the posting lists of a group of questions are decoded once and every point of the grid is scored from them,
+        #   the questions file is the gold standard and the runs are evaluated in memory
+        start_time = time.perf_counter()
+        evaluator = Evaluator(self.path_to_questions, metrics=self.sweep_metrics)
+        queries = [(query["query_id"], self.process_query(query["query_text"])) for query in evaluator.gold_standard_file]
+        runs = [[] for _ in self.sweep_grid]
+        #   the cache only holds the scores of the parameters of the index
+        self.cache = False
+
+        for group in self.query_groups(queries):
+            postings = {term: self.index_reader.postings(term) for term in sorted(set(chain.from_iterable(tokens for _, tokens in group)))}
+            for query_id, query_tokens in group:
+                for run, results in zip(runs, self.grid_search(query_tokens, postings)):
+                    run.append(self.result_json(query_id, results))
+
+        table = [(point, evaluator.compute(run)) for point, run in zip(self.sweep_grid, runs)]
+        print(f"{len(self.sweep_grid)} configurations of {len(queries)} questions ranked in {round(time.perf_counter() - start_time, 3)} seconds")
+        self.print_sweep(table, evaluator)
+
+        if self.output_file:
+            with open(self.output_file, "w") as f:
+                for point, evals in table:
+                    f.write(json.dumps({"ranking": point, **evals}) + "\n")
+
+    def grid_search(self, query_tokens: list[str], postings: dict) -> list[dict]:
+        #   results of the question for every point of the grid, the term lists of a point are built from the decoded postings
+        grid_results = []
+        for point in self.sweep_grid:
+            self.set_ranking(**point)
+            self.batch_lists = {term: self.postings_term_list(postings[term]) for term in sorted(set(query_tokens))}
+            grid_results.append(self.search(query_tokens)[0])
+        self.batch_lists = None
+        return grid_results
+
+    @staticmethod
+    def print_sweep(table: list, evaluator: Evaluator):
+        #   one row for every point of the grid and one column for every metric at every cutoff
+        columns = [(f"top_{cutoff}", evaluator.metric_names[metric], f"{metric}@{cutoff}") for cutoff in evaluator.cutoffs for metric in evaluator.metrics]
+        rows = [(" ".join(f"{name.split('_')[-1]}={value}" for name, value in point.items()), [evals[top][name] for top, name, _ in columns]) for point, evals in table]
+        width = max(len(label) for label, _ in rows)
+        print(" ".join([f"{'':<{width}}", *(f"{header:>10}" for _, _, header in columns)]))
+        for label, values in rows:
+            print(" ".join([f"{label:<{width}}", *(f"{value:>10.4f}" for value in values)]))
+
+    def set_ranking(self, **kwargs):
+        raise NotImplementedError
+
+    def postings_term_list(self, postings):
+        raise NotImplementedError
+
+    def query_groups(self, queries: list):
+        #   groups of consecutive questions whose decoded lists fit in the batch memory, a question that
+        #   does not fit alone makes a group by itself
+        group, terms, size = [], set(), 0
+        for query in queries:
+            new_terms = set(query[1]) - terms
+            new_size = sum(self.index_reader.df(term) for term in new_terms) * PostingCache.posting_size
+            if group and size + new_size > self.batch_memory:
+                yield group
+                group, terms, size = [], set(), 0
+                new_terms = set(query[1])
+                new_size = sum(self.index_reader.df(term) for term in new_terms) * PostingCache.posting_size
+            group.append(query)
+            terms |= new_terms
+            size += new_size
+        if group:
+            yield group
+
+    def get_term_list(self, term: str):
+        #   inside a term grouped batch the lists of the questions were already decoded
+        if self.batch_lists is not None and term in self.batch_lists:
+            return self.batch_lists[term]
+        if self.posting_cache is not None:
+            return self.shared_term_list(term)
+        return self.term_list(term)
+
+    def shared_term_list(self, term: str):
+        #   term list that is kept in memory for many questions, so it is scored up front
+        if self.posting_cache is None:
+            return self.term_list(term, shared=True)
+        return self.posting_cache.get((term, self.ranking_key), lambda key: self.term_list(key[0], shared=True))
+
+    def warm_up(self, path: str):
+        #   fill the posting cache with the most frequent terms of a questions file (jsonl) or a query log
+        #   (one query per line), terms whose lists do not fit in the remaining budget are skipped
+        start_time = time.perf_counter()
+        term_counts = Counter()
+        for line in Reader(path).read():
+            if not line:
+                continue
+            query_text = json.loads(line)["query_text"] if line.startswith("{") else line
+            term_counts.update(set(self.process_query(query_text)))
+
+        warmed = 0
+        for term, _ in term_counts.most_common():
+            if self.posting_cache.bytes >= self.posting_cache.max_bytes:
+                break
+            if (term, self.ranking_key) in self.posting_cache or not self.index_reader.df(term):
+                continue
+            if PostingCache.posting_size * self.index_reader.df(term) + self.posting_cache.bytes <= self.posting_cache.max_bytes:
+                warmed += self.posting_cache.put((term, self.ranking_key), self.term_list(term, shared=True))
+        print(f"Posting cache warmed up with {warmed} term lists in {round(time.perf_counter() - start_time, 3)} seconds")
+
+    def cached_search(self, query_tokens: list[str]):
+        #   a query with the same tokens, in any order, is answered from the result cache without scoring
+        start_time = time.perf_counter()
+        cached = self.cached_results(query_tokens)
+        if cached is not None:
+            results, total_results_count = cached
+            return results, time.perf_counter() - start_time, total_results_count
+
+        results, query_processing_time, total_results_count = self.search(query_tokens)
+        self.cache_results(query_tokens, results, total_results_count)
+        return results, query_processing_time, total_results_count
+
+    def cached_results(self, query_tokens: list[str]):
+        #   (results, total_results_count) of the query, None if it is not cached
+        if self.result_cache is None:
+            return None
+        cached = self.result_cache.get(self.result_key(query_tokens))
+        if cached is None:
+            return None
+        results, total_results_count, counted = cached
+        return results if counted else RankedResults(results, True, counted), total_results_count
+
+    def cache_results(self, query_tokens: list[str], results: dict, total_results_count: int):
+        #   results of the impact ordered lists are not cached, they are quantized and the ones cut by a budget depend
+        #   on the load of the machine
+        if self.result_cache is not None and getattr(results, "exact", True):
+            self.result_cache.put(self.result_key(query_tokens), [results, total_results_count, getattr(results, "counted", True)])
+
+    def result_key(self, query_tokens: list[str]) -> str:
+        #   the ranking and every search setting that changes the results or their count, so a snapshot of a searcher
+        #   started with other settings does not answer for this one
+        settings = (*self.ranking_key, self.query_operator, self.proximity_window, self.dynamic_pruning, self.time_budget_ms, self.posting_budget)
+        return ResultCache.key(query_tokens, settings, self.top_k)
+
+    def cache_stats(self):
+        #   hit, miss and eviction counters of the posting cache, None if it is disabled
+        return self.posting_cache.stats() if self.posting_cache is not None else None
+
+    def print_cache_stats(self):
+        stats = self.cache_stats()
+        if stats is not None:
+            print("Posting cache: {hits} hits, {misses} misses, {evictions} evictions, {entries} lists in {bytes} of {max_bytes} bytes".format(**stats))
+
+    def term_list(self, term: str, shared: bool = False):
+        raise NotImplementedError
+
+    def conjunctive_postings(self, query_tokens: list[str]):
+        #   documents that contain every term of the query and the term frequencies of every term in them,
+        #   the lists are intersected with their cursors so most postings of the long lists are never decoded
+        terms = sorted(set(query_tokens))
+        if self.query_operator == "phrase" and self.biword_reader is not None:
+            plan = self.phrase_plan(query_tokens)
+            if plan is not None:
+                return self.biword_phrase_postings(terms, plan)
+
+        cursors = [self.index_reader.cursor(term) for term in terms]
+        if not terms or None in cursors:
+            return [], {}
+        doc_ids, tfs = intersect(cursors, self.position_match(terms, query_tokens))
+        return doc_ids, dict(zip(terms, tfs))
+
+    def phrase_plan(self, query_tokens: list[str]):
+        #   the phrase is covered with biwords where they exist and with single terms elsewhere, the last term
+        #   can be covered by a biword that overlaps the previous one. Returns {unit: (reader, offsets in the
+        #   phrase)}, or None when no biword is used
+        def biword(i):
+            pair = f"{query_tokens[i]} {query_tokens[i + 1]}"
+            return pair if self.biword_reader.df(pair) else None
+
+        units = []
+        i = 0
+        while i < len(query_tokens):
+            if i + 1 < len(query_tokens) and biword(i):
+                units.append((biword(i), i, self.biword_reader))
+                i += 2
+            elif i == len(query_tokens) - 1 and i > 0 and biword(i - 1):
+                units.append((biword(i - 1), i - 1, self.biword_reader))
+                i += 1
+            else:
+                units.append((query_tokens[i], i, self.index_reader))
+                i += 1
+
+        if all(reader is self.index_reader for _, _, reader in units):
+            return None
+        plan = {}
+        for unit, offset, reader in units:
+            plan.setdefault(unit, (reader, []))[1].append(offset)
+        return plan
+
+    def biword_phrase_postings(self, terms: list[str], plan: dict):
+        #   the phrase is matched on the lists of the plan and the term frequencies of its terms are only read
+        #   for the matched documents, which are needed by the ranking
+        units = sorted(plan)
+        cursors = [plan[unit][0].cursor(unit) for unit in units]
+        if None in cursors:
+            return [], {}
+        doc_ids, _ = intersect(cursors, phrase_match([plan[unit][1] for unit in units]))
+
+        tfs = {}
+        for term in terms:
+            cursor = self.index_reader.cursor(term)
+            if cursor is None:
+                return [], {}
+            tfs[term] = []
+            for doc_id in doc_ids:
+                cursor.next_geq(doc_id)
+                tfs[term].append(cursor.tf())
+        return doc_ids, tfs
+
+    def position_match(self, terms: list[str], query_tokens: list[str]):
+        #   phrase and near queries check the positions of the documents that contain every term
+        if self.query_operator == "phrase":
+            return phrase_match([[i for i, token in enumerate(query_tokens) if token == term] for term in terms])
+        if self.query_operator == "near":
+            return window_match(self.proximity_window)
+        return None
+
     def interative_search(self):
         
         query = input("\nEnter query: ")
         while query:
             query_tokens = self.process_query(query)
-            results, query_processing_time, total_results_count = self.search(query_tokens)
+            results, query_processing_time, total_results_count = self.cached_search(query_tokens)
 
-            print(f"{total_results_count} results found in {round(query_processing_time, 3)} seconds")
+            print(f"{self.results_found(results, total_results_count)} in {round(query_processing_time, 3)} seconds")
 
             for document_pmid, score in results.items():
                 print("PMID: {0} - Score: {1}".format(document_pmid, round(score,3)))
 
             query = input("\nEnter query: ")
 
+    @staticmethod
+    def results_found(results: dict, total_results_count: int) -> str:
+        #   a pruned search does not count the documents of the postings it skips
+        if getattr(results, "counted", True):
+            return f"{total_results_count} results found"
+        return f"at least {total_results_count} results found"
+
+    @staticmethod
+    def result_json(query_id: str, results: dict) -> dict:
+        result_json = {"query_id": query_id, "documents_pmid": [], "scores": []}
+        for document_pmid, score in results.items():
+            result_json["documents_pmid"].append(document_pmid)
+            result_json["scores"].append(score)
+        #   only the results of a search that stopped early are marked, a pruned search has the exhaustive results
+        if not getattr(results, "exact", True):
+            result_json["exact"] = False
+        return result_json
+
     @staticmethod
     def save_results(final_results:dict, output_file: str):
         with open(output_file, "w") as f:  
             for query_id in final_results:
-                result_json = {"query_id": query_id, "documents_pmid": [], "scores": []}
-                for document_pmid, score in final_results[query_id].items():
-                    result_json["documents_pmid"].append(document_pmid)
-                    result_json["scores"].append(score)
-                f.write(json.dumps(result_json) + "\n")
+                f.write(json.dumps(Searcher.result_json(query_id, final_results[query_id])) + "\n")
 
 
     def print_results():
@@ -128,6 +524,22 @@ class TFIDFSearcher(Searcher):
 
         print("initializing TFIDFSearcher with SMART: {0}".format(self.smart))
 
+    def set_ranking(self, ranking_tfidf_smart: str):
+        self.smart = ranking_tfidf_smart.split(".")
+        self.ranking_key = ("tfidf", self.smart[0])
+        #   norms of the whole document vectors, written by the indexer for its weighting scheme
+        if self.smart[0] not in self.scheme_norms:
+            path = f"{self.index_folder}doc_norms_{self.smart[0]}"
+            self.scheme_norms[self.smart[0]] = memoryview(map_file(path)).cast("f") if self.smart[0] == self.doc_norms_scheme else None
+        self.doc_norms = self.scheme_norms[self.smart[0]]
+
+    def postings_term_list(self, postings):
+        #   term list of decoded (doc_ids, tfs) postings, None for a term that is not indexed
+        if postings is None:
+            return None
+        doc_ids, tfs = postings
+        return doc_ids, self.weight_list(tfs, len(doc_ids))
+
 
     def search(self, query_tokens: list[str]):
 
@@ -140,111 +552,90 @@ class TFIDFSearcher(Searcher):
 
         start_time = time.perf_counter()
 
-        #   Calculate N
-        N = sum(1 for _ in open('document_mapping'))
+        N = self.N
 
         doc_smart, query_smart = self.smart
 
         query_terms_freq = {}
         docs_freq = {}
-        coll_results = {}
+        postings = {}
+        #   the conjunctive query is scored from the term frequencies of the index
+        use_cache = self.cache and self.query_operator == "or"
 
-        if self.cache:
-            print("Using cache")
-            for term in set(query_tokens):
-                #   Calculate query term frequency of terms in query
+        if self.query_operator != "or":
+            doc_ids, tfs = self.conjunctive_postings(query_tokens)
+            for term in sorted(set(query_tokens)):
                 query_terms_freq[term] = query_tokens.count(term)
-                try:
-                    #   Check where term is in index
-                    start_idx = self.index_map[term[:2]]
-                    end_idx = self.index_map[self.combinations[self.combinations.index(term[:2])+1]]
-                except:
-                    continue
-                #   Iterate over the cache file to find the term
-                for idx in range(start_idx, end_idx):
-                    line = linecache.getline(self.cache_file, idx + 1)
-                    if line.startswith(term):
-                        line = line.split(";")[1:]
-                        #   Calculate document frequency of terms in query
-                        docs_freq[term] = len(line)
-                        for doc in line:
-                            #   Get the tf-idf score of the term in the document
-                            doc_id, score = doc.split(":")
-                            if doc_id not in coll_results:
-                                coll_results[doc_id] = {}	
-                            coll_results[doc_id][term] = float(score)
-                        break
-
-            query_terms_weights = term_frequency_weighting(query_smart[0], query_terms_freq)
-            doc_weights = document_frequency_weighting(query_smart[1], docs_freq, N)
-            query_tfidf = normalization_factor(query_smart[2], {term: query_terms_weights[term] * doc_weights[term] for term in query_terms_weights if term in doc_weights})
-
-            results = {}
-            for doc_id in coll_results:
-                new_doc = linecache.getline('document_mapping', int(doc_id)+1).split(":")[0]
-                #   Calculate similarity between query and document
-                if new_doc not in results:
-                    results[new_doc] = 0
-                results[new_doc] = sum(query_tfidf[term] * coll_results[doc_id].get(term, 0)  for term in query_tfidf)
-
+                if doc_ids:
+                    docs_freq[term] = self.index_reader.df(term)
+                    postings[term] = doc_ids, self.weight_list(tfs[term], docs_freq[term])
+
+        #   the terms are scored in lexicon order, so the sums of the scores do not depend on the hash of the strings
+        for term in sorted(set(query_tokens)) if self.query_operator == "or" else ():
+            #   Calculate query term frequency of terms in query
+            query_terms_freq[term] = query_tokens.count(term)
+            #   Find the term in the cache file or in the index
+            term_postings = self.get_term_list(term)
+            if term_postings is None:
+                continue
+            postings[term] = term_postings
+            #   Calculate document frequency of terms in query
+            docs_freq[term] = len(term_postings[0])
+
+        query_terms_weights = term_frequency_weighting(query_smart[0], query_terms_freq)
+        doc_weights = document_frequency_weighting(query_smart[1], docs_freq, N)
+        query_tfidf = normalization_factor(query_smart[2], {term: query_terms_weights[term] * doc_weights[term] for term in query_terms_weights if term in doc_weights})
+
+        #   the scores are accumulated by internal doc id
+        nr_postings = sum(len(doc_ids) for doc_ids, _ in postings.values())
+        accumulator = ScoreAccumulator(N, nr_postings)
+        norms = None
+
+        if use_cache:
+            print("Using cache")
+            for term, (doc_ids, scores) in postings.items():
+                #   the cache already holds the normalized tf-idf of the term in the document
+                accumulator.add(doc_ids, scale_array(query_tfidf[term] * self.index_reader.cache_scale, scores))
 
         else:
-            coll_terms_freq = {}
-            coll_terms_weights = {}
-            for term in set(query_tokens):
-                #   Calculate query term frequency of terms in query
-                query_terms_freq[term] = query_tokens.count(term)
-                try:
-                    #   Check where term is in index
-                    start_idx = self.index_map[term[:2]]
-                    end_idx = self.index_map[self.combinations[self.combinations.index(term[:2])+1]]
-                except:
-                    continue
-                #   Iterate over the index file to find the term
-                for idx in range(start_idx, end_idx):
-                    line = linecache.getline(f'{self.index_folder}index', idx + 1)
-                    if line.startswith(term):
-                        line = line.split(";")[1:]
-                        #   Calculate document frequency of terms in query
-                        docs_freq[term] = len(line)
-                        for doc in line:
-                            #   Get the tf-idf score of the term in the document
-                            doc_id, tf = doc.split(":")
-                            if term not in coll_terms_freq:
-                                coll_terms_freq[term] = {}	
-                            coll_terms_freq[term][doc_id] = int(tf)
-                        break
-            
-            query_terms_weights = term_frequency_weighting(query_smart[0], query_terms_freq)
-            doc_weights = document_frequency_weighting(query_smart[1], docs_freq, N)
-            query_tfidf = normalization_factor(query_smart[2], {term: query_terms_weights[term] * doc_weights[term] for term in query_terms_weights if term in doc_weights})
-            doc_weights = document_frequency_weighting(doc_smart[1], docs_freq, N)
-
-            for term in coll_terms_freq:
-                #   Calculate tf-idf score of terms in collection
-                coll_terms_weights = term_frequency_weighting(doc_smart[0], coll_terms_freq[term])
-                for doc_id in coll_terms_weights:
-                    if doc_id not in coll_results:
-                        coll_results[doc_id] = {}
-                    coll_results[doc_id][term] = coll_terms_weights[doc_id] * doc_weights[term]
-            
-            coll_results = {doc_id: normalization_factor(doc_smart[2], coll_results[doc_id]) for doc_id in coll_results}
-            
-            results = {}
-            for doc_id in coll_results:
-                new_doc = linecache.getline('document_mapping', int(doc_id) + 1).split(":")[0]
-                #   Calculate similarity between query and document
-                if new_doc not in results:
-                    results[new_doc] = 0
-                results[new_doc] = sum(query_tfidf[term] * coll_results[doc_id].get(term, 0)  for term in query_tfidf)
-
+            if doc_smart[2] == "c" and self.doc_norms is not None:
+                #   the cosine normalization uses the norm of the whole document vector, a single division for each document
+                norms = self.doc_norms
+            elif doc_smart[2] == "c":
+                #   without the norms of the index the cosine normalization is done over the weights of the query terms in the document
+                squares = ScoreAccumulator(N, nr_postings)
+            elif doc_smart[2] != "n":
+                raise NotImplementedError()
+
+            for term, (doc_ids, weights) in postings.items():
+                accumulator.add(doc_ids, scale_array(query_tfidf[term], weights))
+                if doc_smart[2] == "c" and self.doc_norms is None:
+                    squares.add(doc_ids, [weight ** 2 for weight in weights] if np is None else np.square(weights))
+            if doc_smart[2] == "c" and self.doc_norms is None:
+                norms = squares.roots()
+
+        # Select the top-k documents and find the pmid of only those
+        results = {self.documents.pmid(doc_id): doc_score for doc_id, doc_score in accumulator.top(self.top_k, norms)}
         query_processing_time = time.perf_counter() - start_time
-        # Sort results by cosine similarity (score)
-        results = dict(sorted(results.items(), key=lambda x: x[1], reverse=True))
-        # Return top-k documents
-        results2 = {k: results[k] for k in list(results)[:self.top_k]}
 
-        return results2, query_processing_time, len(results)
+        return results, query_processing_time, len(accumulator)
+
+    def term_list(self, term: str, shared: bool = False):
+        #   (doc_ids, weight of the term in every document), None if the term is not indexed
+        if self.cache:
+            return self.index_reader.cache_postings(term)
+
+        postings = self.index_reader.postings(term)
+        if postings is None:
+            return None
+        doc_ids, tfs = postings
+        return doc_ids, self.weight_list(tfs, len(doc_ids))
+
+    def weight_list(self, tfs: list[int], df: int):
+        #   Calculate tf-idf score of terms in collection, an array with numpy
+        doc_smart = self.smart[0]
+        idf = single_document_frequency_weighting(doc_smart[1], df, self.N)
+        return scale_array(idf, term_frequency_weighting_array(doc_smart[0], tfs))
     
     
 class BM25Searcher(Searcher):        
@@ -252,7 +643,39 @@ class BM25Searcher(Searcher):
     def __init__(self, **kwargs) -> None:
         super().__init__(**kwargs)
     
-        print("initializing BM25Searcher with k1: {0} and b: {1}".format(self.k1, self.b))
+        print("initializing BM25Searcher with k1: {0} and b: {1}".format(self.bm25_k1, self.bm25_b))
+
+    def set_ranking(self, ranking_bm25_k1: float, ranking_bm25_b: float):
+        self.bm25_k1 = ranking_bm25_k1
+        self.bm25_b = ranking_bm25_b
+        self.ranking_key = ("bm25", self.bm25_k1, self.bm25_b)
+
+    def postings_term_list(self, postings):
+        if postings is None:
+            return None
+        doc_ids, tfs = postings
+        return self.score_list(doc_ids, tfs, len(doc_ids))
+
+    def grid_search(self, query_tokens: list[str], postings: dict) -> list[dict]:
+        #   with numpy the postings of all the terms are scored for a point at once and summed by document with bincount
+        if np is None:
+            return super().grid_search(query_tokens, postings)
+
+        lists = [postings[term] for term in query_tokens if postings[term] is not None]
+        if not lists:
+            return [{} for _ in self.sweep_grid]
+        doc_ids = np.concatenate([np.asarray(doc_ids, dtype=np.int64) for doc_ids, _ in lists])
+        tfs = np.concatenate([np.asarray(tfs, dtype=np.float64) for _, tfs in lists])
+        idfs = np.concatenate([np.full(len(doc_ids), math.log10(self.N / len(doc_ids))) for doc_ids, _ in lists])
+        dls = self.doc_lengths[doc_ids]
+        docs, inverse = np.unique(doc_ids, return_inverse=True)
+
+        grid_results = []
+        for point in self.sweep_grid:
+            scores = rsv_array(bm25_b=point["ranking_bm25_b"], bm25_k1=point["ranking_bm25_k1"], idfs=idfs, tfs=tfs, dls=dls, avgdl=self.avgdl)
+            top = array_top(docs, np.bincount(inverse, weights=scores, minlength=len(docs)), self.top_k)
+            grid_results.append({self.documents.pmid(doc_id): score for doc_id, score in top})
+        return grid_results
 
     def search(self, query_tokens: str):
         
@@ -265,68 +688,132 @@ class BM25Searcher(Searcher):
         if len(query_tokens) == 0:
             return results, 0, 0
 
-        if self.cache:
+        if self.query_operator == "or" and (self.time_budget_ms is not None or self.posting_budget is not None):
+            return self.impact_search(query_tokens, start_time)
+
+        #   every list is (doc_ids, score of every posting, highest score of the list), the scores of a document are
+        #   added in the order of the lists
+        lists = []
+
+        if self.query_operator != "or":
+            #   only the documents with every term are scored, from the term frequencies of the index
+            doc_ids, tfs = self.conjunctive_postings(query_tokens)
+            if doc_ids:
+                lists = [self.score_list(doc_ids, tfs[term], self.index_reader.df(term)) for term in query_tokens]
+            terms = ()
+        elif self.cache:
             print("Using cache")
-            for term in set(query_tokens):
-                try:
-                    #   Check where term is in index
-                    start_idx= self.index_map[term[:2]]
-                    end_idx = self.index_map[self.combinations[self.combinations.index(term[:2])+1]]
-                except:
-                    continue
-                for idx in range(start_idx, end_idx):
-                    #   Iterate over the cache file to find the term
-                    line = linecache.getline(self.cache_file, idx + 1)
-                    if line.startswith(term):
-                        line = line.split(";")[1:]
-                        for doc in line:
-                            doc_id, score = doc.split(":")
-                            document_pmid=linecache.getline('document_mapping', int(doc_id)+1).split(":")[0]
-                            #   Add the score of the term in the document to the total score of the document
-                            if document_pmid not in results:
-                                results[document_pmid] = 0
-                            results[document_pmid] += float(score)
-                        break
+            terms = sorted(set(query_tokens))
+        else:
+            terms = query_tokens
+
+        counted = True
+        #   the blocks of postings that only hold documents that cannot reach the top-k are not decoded, their documents
+        #   are not counted in the results. Lists that are already scored, or without skip blocks, have nothing to skip
+        decoded = self.cache or self.tf_cache is not None or self.batch_lists is not None or self.posting_cache is not None
+        if self.dynamic_pruning and np is not None and self.index_reader.skips and not decoded and terms:
+            pruning_lists = {term: self.pruning_list(term) for term in set(terms)}
+            top, total_results_count, counted = max_score([pruning_lists[term] for term in terms if pruning_lists[term] is not None], self.top_k, self.N)
 
         else:
-            # Average document length
-            # document length = number of terms in document document mapping doc:dl
-            dl = [int(line.split(":")[1]) for line in open('document_mapping')]
-            N = len(dl)
-            avgdl = sum(dl) / N
-            # Compute BM25 score for each document
-            for term in query_tokens:
-                # Obtain inverted list for term
-                try:
-                    start_idx = self.index_map[term[:2]]
-                    end_idx = self.index_map[self.combinations[self.combinations.index(term[:2])+1]]
-                except:
-                    continue
-                for idx in range(start_idx, end_idx):
-                    #   Iterate over the index file to find the term
-                    line = linecache.getline('index', idx + 1)
-                    if line.startswith(term):
-                        line = line.split(";")[1:]
-                        for doc in line:
-                            doc_id, tf = doc.split(":")
-                            #   Calculate idf
-                            idf = math.log10(N / len(line))
-                            #   Calculate BM25 score
-                            score = rsv(bm25_b=self.bm25_b, bm25_k1=self.bm25_k1, idf=idf, tf=int(tf), dl=dl[int(doc_id)], avgdl = avgdl)
-                            document_pmid=linecache.getline('document_mapping', int(doc_id)+1).split(":")[0]
-                            #   Add the score of the term in the document to the total score of the document
-                            if document_pmid not in results:
-                                results[document_pmid] = 0
-                            results[document_pmid] += score
-                        break
+            for term in terms:
+                term_list = self.get_term_list(term)
+                if term_list is not None:
+                    lists.append(term_list)
+
+            #   the scores are accumulated by internal doc id
+            accumulator = ScoreAccumulator(self.N, sum(len(doc_ids) for doc_ids, _, _ in lists))
+            for doc_ids, scores, _ in lists:
+                #   Add the score of the term in the document to the total score of the document
+                accumulator.add(doc_ids, scores)
+            top = accumulator.top(self.top_k)
+            total_results_count = len(accumulator)
 
+        # ----------- Return results
+        # Find the pmid of only the top-k documents
+        scale = self.index_reader.cache_scale if self.cache and self.query_operator == "or" else 1.0
+        results = {self.documents.pmid(doc_id): score * scale for doc_id, score in top}
+        if not counted:
+            results = RankedResults(results, True, counted)
         query_processing_time = time.perf_counter() - start_time
 
-        # ----------- Return results
-        # Sort results by BM25 score
-        results = dict(sorted(results.items(), key=lambda x: x[1], reverse=True))
-        # Return top-k documents
-        results2 = {k: results[k] for k in list(results)[:self.top_k]}
+        return results, query_processing_time, total_results_count
+
+    def pruning_list(self, term: str):
+        #   (last doc id of every block, score_blocks(blocks), highest score of the list) of max_score, None if the term
+        #   is not indexed. The blocks of the skip index are decoded and scored when max_score asks for them, the bound
+        #   is the score of the highest possible tf in the shortest possible document
+        entry = self.index_reader.lexicon.get(term)
+        if entry is None:
+            return None
+        _, _, _, df, ctf = entry
+        idf = math.log10(self.N / df)
+        #   every other document of the list has the term at least once and a document is at least as long as
+        #   its tf, the score grows with tf when the length grows with it
+        max_tf = ctf - df + 1
+        upper_bound = rsv(bm25_b=self.bm25_b, bm25_k1=self.bm25_k1, idf=idf, tf=max_tf, dl=max(self.min_dl, max_tf), avgdl=self.avgdl)
+        cursor = self.index_reader.cursor(term)
+
+        def score_blocks(blocks):
+            doc_ids, tfs = cursor.block_postings(blocks)
+            doc_ids = np.asarray(doc_ids, dtype=np.intp)
+            return doc_ids, rsv_array(bm25_b=self.bm25_b, bm25_k1=self.bm25_k1, idfs=idf, tfs=tfs, dls=self.doc_lengths[doc_ids], avgdl=self.avgdl)
+
+        return cursor.last_docs, score_blocks, upper_bound
+
+    def term_list(self, term: str, shared: bool = False):
+        #   (doc_ids, score of every posting, highest score of the list), None if the term is not indexed
+        if self.cache:
+            #   Find the term in the cache file
+            postings = self.index_reader.cache_postings(term)
+            if postings is None:
+                return None
+            doc_ids, scores = postings
+            upper_bound = self.index_reader.cache_max_score(term)
+            return doc_ids, scores, max(scores) if upper_bound is None else upper_bound
+
+        if self.tf_cache is not None:
+            ordinal = self.index_reader.lexicon.find(term)
+            if ordinal is None:
+                return None
+            return self.tf_cache.postings(ordinal, self.bm25_k1, self.bm25_b)
+
+        # Obtain inverted list for term
+        postings = self.index_reader.postings(term)
+        if postings is None:
+            return None
+        doc_ids, tfs = postings
+        return self.score_list(doc_ids, tfs, len(doc_ids))
+
+    def impact_search(self, query_tokens: list[str], start_time: float):
+        #   the segments of all the query terms are added by decreasing impact until a budget is reached
+        segments = []
+        for term in sorted(set(query_tokens)):
+            ordinal = self.index_reader.lexicon.find(term)
+            if ordinal is not None:
+                segments.extend(self.impact_index.segments(ordinal))
+
+        deadline = start_time + self.time_budget_ms / 1000 if self.time_budget_ms is not None else None
+        top, total_results_count, _ = score_at_a_time(segments, self.top_k, self.N, deadline, self.posting_budget)
+
+        #   the impacts are quantized scores, even with every segment added the ranking can differ from the bm25
+        results = RankedResults({self.documents.pmid(doc_id): impact * self.impact_index.scale for doc_id, impact in top}, False)
+        return results, time.perf_counter() - start_time, total_results_count
+
+    def score_list(self, doc_ids: list[int], tfs: list[int], df: int):
+        #   Calculate idf
+        idf = math.log10(self.N / df)
+
+        # Document lengths of the postings
+        if np is None:
+            dls = list(map(self.documents.lengths.__getitem__, doc_ids))
+            min_dl = min(dls)
+        else:
+            dls = self.doc_lengths[np.asarray(doc_ids, dtype=np.intp)]
+            min_dl = int(dls.min())
+
+        #   the score grows with tf and decreases with dl so the highest tf and the shortest document bound it
+        upper_bound = rsv(bm25_b=self.bm25_b, bm25_k1=self.bm25_k1, idf=idf, tf=max(tfs), dl=min_dl, avgdl=self.avgdl)
 
-        return results2, query_processing_time, len(results)
-        
\ No newline at end of file
+        #   Calculate BM25 score of every posting, an array with numpy
+        return doc_ids, rsv_array(bm25_b=self.bm25_b, bm25_k1=self.bm25_k1, idfs=idf, tfs=tfs, dls=dls, avgdl=self.avgdl), upper_bound
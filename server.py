@@ -0,0 +1,142 @@
+import asyncio
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import parse_qs, urlsplit
+
+#   searcher shared with the workers of the server and of the parallel batch search
+_worker_searcher = None
+
+def _init_worker(searcher):
+    global _worker_searcher
+    _worker_searcher = searcher
+
+def search_query(query_text: str):
+    return _worker_searcher.search(_worker_searcher.process_query(query_text))
+
+def search_tokens(query_tokens: list):
+    return _worker_searcher.search(query_tokens)
+
+def cache_stats():
+    #   counters of the posting cache of this worker, with the pid of the worker
+    stats = _worker_searcher.cache_stats()
+    return stats if stats is None else {"worker_pid": os.getpid(), **stats}
+
+def worker_pool(searcher, workers: int):
+    #   fork keeps the loaded index in the workers without pickling it, the read only mappings of the index
+    #   are shared through the page cache. A single worker scores in a thread of the current process
+    if workers > 1:
+        return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("fork"), initializer=_init_worker, initargs=(searcher,))
+    _init_worker(searcher)
+    return ThreadPoolExecutor(1)
+
+
+class SearchServer:
+
+    #   largest request body that is accepted
+    max_body_size = 1024 * 1024
+
+    def __init__(self, searcher, host: str = "127.0.0.1", port: int = 8000, unix_socket: str = None, workers: int = 1) -> None:
+        self.searcher = searcher
+        self.host = host
+        self.port = port
+        self.unix_socket = unix_socket
+        self.workers = max(1, workers)
+
+    def run(self):
+        self.executor = worker_pool(self.searcher, self.workers)
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.executor.shutdown()
+
+    async def serve(self):
+        if self.unix_socket:
+            server = await asyncio.start_unix_server(self.handle, path=self.unix_socket)
+            print(f"Serving on unix socket {self.unix_socket}")
+        else:
+            server = await asyncio.start_server(self.handle, self.host, self.port)
+            print(f"Serving on http://{self.host}:{self.port}/search")
+
+        async with server:
+            await server.serve_forever()
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        #   minimal HTTP/1.1, the connection is kept open until the client closes it
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+
+                headers = {}
+                line = await reader.readline()
+                while line.strip():
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                    line = await reader.readline()
+
+                length = int(headers.get("content-length", 0))
+                if length > self.max_body_size:
+                    await self.respond(writer, 413, {"error": "request body too large"})
+                    break
+                body = await reader.readexactly(length) if length else b""
+
+                status, response = await self.route(method, target, body)
+                await self.respond(writer, status, response)
+                if headers.get("connection", "").lower() == "close":
+                    break
+
+        except (ValueError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def route(self, method: str, target: str, body: bytes):
+        #   GET /search?query_text=...&query_id=... or POST /search with {"query_id": ..., "query_text": ...}
+        url = urlsplit(target)
+        if url.path == "/stats":
+            #   every worker process has its own posting cache, the counters are the ones of the single worker that
+            #   answers, labelled with its pid, and not a total of the workers
+            if method != "GET":
+                return 405, {"error": "method not allowed"}
+            result_cache = self.searcher.result_cache
+            return 200, {"workers": self.workers,
+                         "posting_cache": await asyncio.get_running_loop().run_in_executor(self.executor, cache_stats),
+                         "result_cache": result_cache.stats() if result_cache is not None else None}
+        if url.path != "/search":
+            return 404, {"error": "not found"}
+
+        if method == "GET":
+            query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        elif method == "POST":
+            try:
+                query = json.loads(body)
+            except ValueError:
+                return 400, {"error": "invalid json"}
+        else:
+            return 405, {"error": "method not allowed"}
+
+        if not isinstance(query, dict) or not isinstance(query.get("query_text"), str):
+            return 400, {"error": "missing query_text"}
+
+        #   the result cache is looked up here, so it is shared by all the workers
+        query_tokens = self.searcher.process_query(query["query_text"])
+        cached = self.searcher.cached_results(query_tokens)
+        if cached is not None:
+            results = cached[0]
+        else:
+            results, _, total_results_count = await asyncio.get_running_loop().run_in_executor(self.executor, search_tokens, query_tokens)
+            self.searcher.cache_results(query_tokens, results, total_results_count)
+        return 200, self.searcher.result_json(query.get("query_id"), results)
+
+    @staticmethod
+    async def respond(writer: asyncio.StreamWriter, status: int, response: dict):
+        reasons = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large"}
+        body = json.dumps(response).encode("utf-8")
+        writer.write(f"HTTP/1.1 {status} {reasons[status]}\r\nContent-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n".encode("latin-1") + body)
+        await writer.drain()
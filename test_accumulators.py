@@ -0,0 +1,47 @@
+import random
+import pytest
+import accumulators
+from accumulators import ScoreAccumulator
+
+np = pytest.importorskip("numpy")
+random.seed(0)
+N = 2000
+
+
+def random_lists():
+    #   scores rounded so many documents tie, the top-k breaks the ties by the lowest doc id
+    lists = []
+    for _ in range(4):
+        doc_ids = sorted(random.sample(range(N), random.choice((5, 50, 1500))))
+        lists.append((doc_ids, [round(random.uniform(0, 2), 1) for _ in doc_ids]))
+    return lists
+
+
+def accumulate(lists, nr_postings: int, norms=None, k: int = 10):
+    accumulator = ScoreAccumulator(N, nr_postings)
+    for doc_ids, scores in lists:
+        accumulator.add(doc_ids, np.asarray(scores) if accumulator.vectorized else scores)
+    return accumulator.vectorized, accumulator.dense, len(accumulator), accumulator.top(k, norms)
+
+
+def test_modes(monkeypatch):
+    #   the numpy, dense array and dict accumulators find the same documents with the same scores
+    for _ in range(20):
+        lists = random_lists()
+        norms = [random.choice((0, 0.5, 1.5)) for _ in range(N)]
+        for norm in (None, norms):
+            k = random.choice((1, 10, 1000))
+            vectorized = accumulate(lists, N, norm, k)
+            with monkeypatch.context() as patch:
+                patch.setattr(accumulators, "np", None)
+                dense = accumulate(lists, N, norm, k)
+                sparse = accumulate(lists, 1, norm, k)
+            assert vectorized[:2] == (True, True) and dense[:2] == (False, True) and sparse[:2] == (False, False)
+            assert vectorized[2:] == dense[2:] == sparse[2:]
+
+
+def test_roots():
+    accumulator = ScoreAccumulator(N, N)
+    accumulator.add([1, 5], np.array([4.0, 9.0]))
+    assert accumulator.roots()[[1, 5]].tolist() == [2.0, 3.0]
+    assert accumulator.get(5) == 9.0 and list(accumulator.doc_ids()) == [1, 5]
@@ -0,0 +1,84 @@
+import json
+import random
+import pytest
+
+
+@pytest.fixture
+def questions(collection):
+    #   questions of the collection words, with the ids and the documents of a gold standard
+    random.seed(1)
+    path = collection / "questions.jsonl"
+    with open(path, "w") as f:
+        for i in range(40):
+            query_text = " ".join(f"word{random.randrange(300)}" for _ in range(random.randint(1, 8)))
+            f.write(json.dumps({"query_id": f"q{i}", "query_text": query_text, "documents_pmid": [str(random.randrange(500)) for _ in range(5)]}) + "\n")
+    return str(path)
+
+
+def batch_results(searcher, folder: str, questions: str, output_file: str, **kwargs):
+    #   contents of the results file of a batch search of the questions
+    searcher(folder, path_to_questions=questions, output_file=output_file, **kwargs).start()
+    with open(f"{output_file}.json") as f:
+        return f.read()
+
+
+@pytest.mark.parametrize("ranking_mode", ["ranking.bm25", "ranking.tfidf"])
+def test_parallel_batch(build, searcher, questions, ranking_mode):
+    #   the workers answer the questions in chunks, the results file is the one of a single process
+    folder, _ = build("index")
+    sequential = batch_results(searcher, folder, questions, f"{folder}sequential", ranking_mode=ranking_mode)
+    parallel = batch_results(searcher, folder, questions, f"{folder}parallel", ranking_mode=ranking_mode, workers=2)
+    assert parallel == sequential and len(sequential.splitlines()) == 40
+
+
+@pytest.mark.parametrize("ranking_mode", ["ranking.bm25", "ranking.tfidf"])
+def test_term_batch(build, searcher, questions, ranking_mode, capsys):
+    #   a batch memory of a few lists splits the questions in groups of a few questions, decoded lists give the results of the query strategy
+    folder, _ = build("index")
+    query = batch_results(searcher, folder, questions, f"{folder}query", ranking_mode=ranking_mode)
+    for options in ({}, {"posting_cache": 0.01}):
+        capsys.readouterr()
+        term = batch_results(searcher, folder, questions, f"{folder}term", ranking_mode=ranking_mode, batch_strategy="term", batch_memory=0.05, **options)
+        assert term == query
+        assert 5 < capsys.readouterr().out.count("posting lists of") < 40
+
+
+def sweep_questions(searcher, questions: str):
+    with open(questions) as f:
+        return [searcher.process_query(json.loads(line)["query_text"]) for line in f]
+
+
+@pytest.mark.parametrize("ranking_mode, grid", [
+    ("ranking.bm25", [{"ranking_bm25_k1": k1, "ranking_bm25_b": b} for k1 in (0.5, 1.2) for b in (0.3, 0.75)]),
+    ("ranking.tfidf", [{"ranking_tfidf_smart": smart} for smart in ("lnc.ltc", "nnc.ntc", "bnn.btn", "lnc.ltc")])])
+def test_sweep(build, searcher, questions, ranking_mode, grid):
+    #   every point of the grid ranks the questions as a searcher with the ranking arguments of the point
+    folder, _ = build("index")
+    sweep = searcher(folder, ranking_mode=ranking_mode, sweep_grid=grid)
+    points = [searcher(folder, ranking_mode=ranking_mode, **point) for point in grid]
+    for query_tokens in sweep_questions(sweep, questions):
+        postings = {term: sweep.index_reader.postings(term) for term in set(query_tokens)}
+        for results, point in zip(sweep.grid_search(query_tokens, postings), points):
+            expected = point.search(query_tokens)[0]
+            assert list(results) == list(expected) and list(results.values()) == pytest.approx(list(expected.values()))
+
+    sweep = searcher(folder, ranking_mode=ranking_mode, searcher_mode="sweep", path_to_questions=questions, output_file=f"{folder}sweep", sweep_grid=grid)
+    sweep.start()
+    with open(f"{folder}sweep.json") as f:
+        assert [json.loads(line)["ranking"] for line in f] == grid
+
+
+def test_sweep_norms(build, searcher, questions, monkeypatch):
+    #   the norms of the scheme of the index are mapped once for all the points, the other schemes have none
+    import searcher as searcher_module
+    mapped = []
+    map_file = searcher_module.map_file
+    monkeypatch.setattr(searcher_module, "map_file", lambda path: mapped.append(path) or map_file(path))
+    folder, _ = build("index")
+    grid = [{"ranking_tfidf_smart": smart} for smart in ("lnc.ltc", "nnc.ntc", "lnc.ltc", "nnc.ntc")]
+    sweep = searcher(folder, ranking_mode="ranking.tfidf", sweep_grid=grid)
+    for query_tokens in sweep_questions(sweep, questions):
+        sweep.grid_search(query_tokens, {term: sweep.index_reader.postings(term) for term in set(query_tokens)})
+    assert [path for path in mapped if "doc_norms_" in path] == [f"{folder}doc_norms_lnc"]
+    sweep.set_ranking("lnc.ltc")
+    assert sweep.scheme_norms["nnc"] is None and sweep.scheme_norms["lnc"] is sweep.doc_norms is not None
@@ -0,0 +1,133 @@
+import math
+import os
+import pytest
+import bm25_cache
+from bm25_cache import BM25TFCache
+from documents import DocumentTable
+from index_reader import IndexReader
+from impacts import ImpactIndex
+from utils import rsv
+
+
+def test_impact_ordered_without_cache_bits(build):
+    folder, metadata = build("impacts", bm25_cache_in_disk=True, bm25_impact_ordered=True)
+    assert metadata["cache_bits"] == 0 and "cache_scale" not in metadata
+    impacts = ImpactIndex(f"{folder}impacts_bm25_1.2_0.75", metadata["impact_scale"])
+    reader = IndexReader(folder, "binary", cache_file=f"{folder}cache_bm25_1.2_0.75", skip_block_size=metadata["skip_block_size"])
+
+    #   every posting is in a segment of its term, with an impact within half a quantization step of its score
+    for ordinal in range(len(reader.lexicon)):
+        doc_ids, scores = reader.cache_postings_at(ordinal)
+        impact = {doc_id: value for value, _, segment in impacts.segments(ordinal) for doc_id in segment()}
+        assert sorted(impact) == doc_ids
+        for doc_id, score in zip(doc_ids, scores):
+            assert abs(impact[doc_id] * impacts.scale - score) <= impacts.scale / 2 + 1e-4
+
+
+def test_impact_search(build, searcher):
+    folder, metadata = build("impacts", bm25_cache_in_disk=True, bm25_impact_ordered=True, bm25_impact_bits=4)
+    assert metadata["bm25_impact_bits"] == 4
+    impacts = ImpactIndex(f"{folder}impacts_bm25_1.2_0.75", metadata["impact_scale"])
+    assert {value for ordinal in range(len(impacts.offsets) - 1) for value, _, _ in impacts.segments(ordinal)} <= set(range(1, 16))
+
+    #   the scores are quantized, the results are not exact and are not cached even when every segment is added
+    impact_searcher = searcher(folder, posting_budget=10 ** 9, result_cache=16)
+    results, _, _ = impact_searcher.cached_search(["word1", "word2", "word50"])
+    assert len(results) == 10 and not results.exact and not impact_searcher.result_cache.entries
+    assert impact_searcher.result_json("q", results)["exact"] is False
+
+
+def test_rebuild_without_impacts(build, searcher):
+    #   the impact ordered lists of an earlier build of the folder are deleted and never searched
+    folder, _ = build("index", bm25_cache_in_disk=True, bm25_impact_ordered=True)
+    assert searcher(folder).impact_index is not None
+    folder, _ = build("index", bm25_cache_in_disk=True)
+    assert not [file for file in os.listdir(folder) if file.startswith("impacts_")]
+    assert searcher(folder).impact_index is None
+    folder, _ = build("index", bm25_cache_in_disk=True, bm25_impact_ordered=True, bm25_k1=1.0)
+    assert searcher(folder).impact_index is None
+
+
+@pytest.mark.parametrize("cache", ["bm25", "tfidf"])
+def test_quantized_cache(build, cache):
+    cache_file = "cache_bm25_1.2_0.75" if cache == "bm25" else "cache_tfidf_lnc"
+    options = {"bm25_cache_in_disk": True} if cache == "bm25" else {"tfidf_cache_in_disk": True}
+    folder, _ = build("text", **options)
+    text = IndexReader(folder, "binary", cache_file=f"{folder}{cache_file}", skip_block_size=128)
+
+    for bits in (8, 16):
+        folder, metadata = build(f"quantized{bits}", cache_bits=bits, **options)
+        quantized = IndexReader(folder, "binary", cache_file=f"{folder}{cache_file}", skip_block_size=128, cache_bits=bits, cache_scale=metadata["cache_scale"])
+        #   the values are scaled to the highest score, the text cache rounds them to 4 decimal places
+        for ordinal in range(len(text.lexicon)):
+            doc_ids, scores = text.cache_postings_at(ordinal)
+            quantized_doc_ids, values = quantized.cache_postings_at(ordinal)
+            assert quantized_doc_ids == doc_ids
+            assert all(0 <= value < 1 << bits for value in values)
+            for score, value in zip(scores, values):
+                assert abs(value * quantized.cache_scale - score) <= quantized.cache_scale / 2 + 1e-4
+
+
+def test_bm25_cache(build, monkeypatch):
+    #   the scores written with the postings at merge time are the bm25 of every posting, with numpy and without it
+    import indexer
+    import utils
+    for use_numpy in (True, False):
+        with monkeypatch.context() as patch:
+            if not use_numpy:
+                patch.setattr(indexer, "np", None)
+                patch.setattr(utils, "np", None)
+            folder, metadata = build(f"bm25_{use_numpy}", bm25_cache_in_disk=True)
+        reader = IndexReader(folder, "binary", cache_file=f"{folder}cache_bm25_1.2_0.75", skip_block_size=metadata["skip_block_size"])
+        documents = DocumentTable(f"{folder}documents")
+
+        for ordinal, (term, doc_ids, tfs) in enumerate(reader):
+            idf = math.log10(metadata["N"] / len(doc_ids))
+            expected = [rsv(0.75, 1.2, idf, tf, documents.length(doc_id), metadata["avgdl"]) for doc_id, tf in zip(doc_ids, tfs)]
+            cached_doc_ids, scores = reader.cache_postings_at(ordinal)
+            assert cached_doc_ids == doc_ids
+            assert all(abs(score - value) <= 5e-5 + 1e-9 for score, value in zip(scores, expected))
+            assert reader.cache_max_score(term) == max(scores)
+
+
+def test_bm25_tf_cache(build, monkeypatch):
+    #   the scores of the parameter free cache are the bm25 of the index, with numpy and without it
+    folder, metadata = build("tf_cache", bm25_tf_cache=True)
+    reader = IndexReader(folder, "binary", skip_block_size=metadata["skip_block_size"])
+    documents = DocumentTable(f"{folder}documents")
+    cache = BM25TFCache(f"{folder}cache_bm25_tf", metadata["avgdl"])
+
+    for k1, b in ((1.2, 0.75), (0.5, 0.1)):
+        for ordinal, (_, doc_ids, tfs) in enumerate(reader):
+            idf = math.log10(metadata["N"] / len(doc_ids))
+            expected = [rsv(b, k1, idf, tf, documents.length(doc_id), metadata["avgdl"]) for doc_id, tf in zip(doc_ids, tfs)]
+            cached_doc_ids, scores, upper_bound = cache.postings(ordinal, k1, b)
+            with monkeypatch.context() as patch:
+                patch.setattr(bm25_cache, "np", None)
+                assert cache.postings(ordinal, k1, b) == (doc_ids, expected, upper_bound)
+            assert cached_doc_ids == doc_ids and list(scores) == expected
+            assert max(expected) <= upper_bound
+
+
+def test_rebuild_without_bm25_tf_cache(build, searcher):
+    #   the columns of an earlier build of the folder are deleted and never scored with the new index
+    folder, metadata = build("index", bm25_tf_cache=True)
+    assert metadata["bm25_tf_cache"] and searcher(folder).tf_cache is not None
+    folder, metadata = build("index", regular_exp="[a-zA-Z]{3,}")
+    assert "bm25_tf_cache" not in metadata
+    assert not [file for file in os.listdir(folder) if file.startswith("cache_bm25_tf")]
+    assert searcher(folder).tf_cache is None
+
+
+def test_rebuild_without_doc_norms(build, searcher):
+    #   the norms of an earlier build of the folder are deleted and the cosine is computed over the query terms
+    folder, metadata = build("index")
+    assert metadata["doc_norms"] == "lnc"
+    assert searcher(folder, ranking_mode="ranking.tfidf").doc_norms is not None
+    folder, metadata = build("index", tfidf_smart="lnn.ltc")
+    assert "doc_norms" not in metadata and not os.path.exists(f"{folder}doc_norms_lnc")
+    assert searcher(folder, ranking_mode="ranking.tfidf").doc_norms is None
+    #   norms that this build did not write are not read
+    with open(f"{folder}doc_norms_lnc", "wb") as f:
+        f.write(bytes(4 * metadata["N"]))
+    assert searcher(folder, ranking_mode="ranking.tfidf").doc_norms is None
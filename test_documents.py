@@ -0,0 +1,23 @@
+from documents import DocumentTable, DocumentTableWriter
+
+
+def test_document_table(tmp_path):
+    (tmp_path / "document_mapping").write_text("123:10\n45:0\nabc:def:7\n")
+    writer = DocumentTableWriter()
+    writer.add_mapping(str(tmp_path / "document_mapping"))
+    writer.add("ação", 1 << 20)
+    writer.write(str(tmp_path / "documents"))
+    assert writer.statistics() == {"N": 4, "total_tokens": 17 + (1 << 20), "avgdl": (17 + (1 << 20)) / 4}
+
+    documents = DocumentTable(str(tmp_path / "documents"))
+    assert len(documents) == 4
+    assert [documents.pmid(doc_id) for doc_id in range(4)] == ["123", "45", "abc:def", "ação"]
+    assert [documents.length(doc_id) for doc_id in range(4)] == [10, 0, 7, 1 << 20]
+    assert list(documents.lengths) == [10, 0, 7, 1 << 20]
+
+
+def test_empty_document_table(tmp_path):
+    writer = DocumentTableWriter()
+    writer.write(str(tmp_path / "documents"))
+    assert writer.statistics() == {"N": 0, "total_tokens": 0, "avgdl": 0}
+    assert len(DocumentTable(str(tmp_path / "documents"))) == 0
@@ -0,0 +1,71 @@
+import random
+import pytest
+from lexicon import LexiconWriter
+from postings import *
+from index_reader import IndexReader
+
+random.seed(0)
+
+#   term -> (doc_ids, positions of every document)
+POSTINGS = {}
+for term in ("apple", "banana", "cherry", "date"):
+    doc_ids = sorted(random.sample(range(2000), random.randint(1, 400)))
+    POSTINGS[term] = doc_ids, [sorted(random.sample(range(300), random.randint(1, 5))) for _ in doc_ids]
+
+
+def write_index(folder, index_format: str, positional: bool, skip_block_size: int = 0):
+    #   index and lexicon files in the layout written by the indexer
+    lexicon = LexiconWriter()
+    position = 0
+    with open(folder / "index", "wb") as f:
+        for term, (doc_ids, positions) in sorted(POSTINGS.items()):
+            tfs = list(map(len, positions))
+            if index_format == "text" and positional:
+                docs = ('{0}:{1}'.format(doc_id, ','.join(map(str, pos))) for doc_id, pos in zip(doc_ids, positions))
+                data = f"{term};{';'.join(docs)}\n".encode("utf-8")
+            elif index_format == "text":
+                data = f"{term};{';'.join(f'{doc_id}:{tf}' for doc_id, tf in zip(doc_ids, tfs))}\n".encode("utf-8")
+            elif positional and skip_block_size:
+                data = encode_record(term, encode_positional_skip_postings(doc_ids, positions, skip_block_size))
+            elif positional:
+                data = encode_record(term, encode_positional_postings(doc_ids, positions))
+            elif skip_block_size:
+                data = encode_record(term, encode_skip_postings(doc_ids, tfs, skip_block_size))
+            else:
+                data = encode_record(term, encode_postings(doc_ids, tfs))
+            lexicon.add(term, position, len(data), len(doc_ids), sum(tfs))
+            f.write(data)
+            position += len(data)
+    lexicon.write(str(folder / "lexicon"))
+    return IndexReader(f"{folder}/", index_format, positional, skip_block_size=skip_block_size)
+
+
+FORMATS = [("text", False, 0), ("text", True, 0), ("binary", False, 0), ("binary", True, 0), ("binary", False, 16), ("binary", True, 16)]
+
+
+@pytest.mark.parametrize("index_format, positional, skip_block_size", FORMATS)
+def test_postings(tmp_path, index_format, positional, skip_block_size):
+    reader = write_index(tmp_path, index_format, positional, skip_block_size)
+    for term, (doc_ids, positions) in POSTINGS.items():
+        assert reader.postings(term) == (doc_ids, list(map(len, positions)))
+        assert reader.df(term) == len(doc_ids)
+    assert reader.postings("missing") is None and reader.cursor("missing") is None and reader.df("missing") == 0
+    assert [(term, doc_ids, tfs) for term, doc_ids, tfs in reader] == [(term, doc_ids, list(map(len, positions))) for term, (doc_ids, positions) in sorted(POSTINGS.items())]
+
+
+@pytest.mark.parametrize("index_format, positional, skip_block_size", FORMATS)
+def test_cursor(tmp_path, index_format, positional, skip_block_size):
+    reader = write_index(tmp_path, index_format, positional, skip_block_size)
+    for term, (doc_ids, positions) in POSTINGS.items():
+        #   forward targets, some of them repeated, must land on the first doc id >= target
+        cursor = reader.cursor(term)
+        assert len(cursor) == len(doc_ids)
+        for target in sorted(random.choices(range(2100), k=100)):
+            i = next((i for i, doc_id in enumerate(doc_ids) if doc_id >= target), None)
+            if i is None:
+                assert cursor.next_geq(target) is None
+                break
+            assert cursor.next_geq(target) == doc_ids[i]
+            assert cursor.tf() == len(positions[i])
+            if positional:
+                assert cursor.positions() == positions[i]
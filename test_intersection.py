@@ -0,0 +1,110 @@
+import json
+import random
+from intersection import ListCursor, SkipCursor, intersect, phrase_match, window_match
+from postings import encode_positional_skip_postings, encode_skip_postings
+
+random.seed(0)
+N = 3000
+
+
+def random_list(size: int):
+    doc_ids = sorted(random.sample(range(N), size))
+    positions = [sorted(random.sample(range(40), random.randint(1, 4))) for _ in doc_ids]
+    return doc_ids, positions
+
+
+def cursors(lists: list, skips: bool):
+    #   cursors over (doc_ids, positions) lists, decoded or encoded with skip blocks of random sizes
+    if not skips:
+        return [ListCursor(doc_ids, list(map(len, positions)), positions.__getitem__) for doc_ids, positions in lists]
+    return [SkipCursor(memoryview(encode_positional_skip_postings(doc_ids, positions, random.choice((1, 4, 64)))), len(doc_ids), positional=True)
+            for doc_ids, positions in lists]
+
+
+def test_intersect():
+    for skips in (False, True):
+        for _ in range(30):
+            lists = [random_list(random.choice((1, 30, 600, 2500))) for _ in range(random.randint(1, 4))]
+            common = sorted(set.intersection(*(set(doc_ids) for doc_ids, _ in lists)))
+            tfs = [[len(positions[doc_ids.index(doc)]) for doc in common] for doc_ids, positions in lists]
+            assert intersect(cursors(lists, skips)) == (common, tfs)
+
+
+def test_skip_cursor():
+    doc_ids = sorted(random.sample(range(N), 500))
+    tfs = [random.randint(1, 9) for _ in doc_ids]
+    cursor = SkipCursor(memoryview(encode_skip_postings(doc_ids, tfs, 16)), len(doc_ids))
+    #   targets in the current block, in a later block and before the cursor, which does not move back
+    i = 0
+    for target in (0, doc_ids[3], doc_ids[3] + 1, doc_ids[200], doc_ids[15], doc_ids[-1]):
+        while doc_ids[i] < target:
+            i += 1
+        assert cursor.next_geq(target) == doc_ids[i]
+        assert cursor.tf() == tfs[i]
+    assert cursor.next_geq(doc_ids[-1] + 1) is None
+    assert cursor.next_geq(doc_ids[-1] + 2) is None
+
+
+def random_documents():
+    #   token sequences over a small vocabulary, so phrases and windows match often
+    return [[random.choice("abcd") for _ in range(random.randint(1, 30))] for _ in range(300)]
+
+
+def term_lists(documents: list, terms: list[str]):
+    lists = []
+    for term in terms:
+        doc_ids, positions = [], []
+        for doc_id, tokens in enumerate(documents):
+            term_positions = [i for i, token in enumerate(tokens) if token == term]
+            if term_positions:
+                doc_ids.append(doc_id)
+                positions.append(term_positions)
+        lists.append((doc_ids, positions))
+    return lists
+
+
+def test_phrase():
+    documents = random_documents()
+    for skips in (False, True):
+        for phrase in (["a", "b"], ["c", "c"], ["a", "b", "a"], ["d", "a", "c", "b"], ["b"]):
+            terms = sorted(set(phrase))
+            offsets = [[i for i, token in enumerate(phrase) if token == term] for term in terms]
+            expected = [doc_id for doc_id, tokens in enumerate(documents)
+                        if any(tokens[start:start + len(phrase)] == phrase for start in range(len(tokens)))]
+            assert intersect(cursors(term_lists(documents, terms), skips), phrase_match(offsets))[0] == expected
+
+
+def test_near():
+    documents = random_documents()
+    for skips in (False, True):
+        for terms, window in ((["a", "b"], 2), (["a", "c", "d"], 3), (["a", "b", "c", "d"], 5), (["b", "d"], 30)):
+            expected = [doc_id for doc_id, tokens in enumerate(documents)
+                        if any(set(terms) <= set(tokens[start:start + window]) for start in range(len(tokens)))]
+            assert intersect(cursors(term_lists(documents, terms), skips), window_match(window))[0] == expected
+
+
+def test_biword_phrase(collection, build, searcher):
+    #   the phrases of the collection and of random terms are matched on the biword lists with the results of the term lists
+    with open(collection / "collection.jsonl") as f:
+        texts = [json.loads(line)["abstract"] for line in f]
+    folder, _ = build("positions", store_term_positions=True)
+    biwords, metadata = build("biwords", store_term_positions=True, biwords=200, biword_terms=50)
+    assert metadata["biwords"]
+    terms = searcher(folder, query_operator="phrase")
+    pairs = searcher(biwords, query_operator="phrase")
+
+    phrases = []
+    for _ in range(100):
+        tokens = terms.process_query(random.choice(texts))
+        start = random.randrange(len(tokens))
+        phrases.append(tokens[start:start + random.randint(1, 5)])
+        phrases.append([f"word{random.randrange(20)}" for _ in range(random.randint(2, 4))])
+    assert sum(pairs.phrase_plan(phrase) is not None for phrase in phrases) > 10
+
+    found = 0
+    for phrase in phrases:
+        doc_ids, tfs = terms.conjunctive_postings(phrase)
+        found += bool(doc_ids)
+        assert pairs.conjunctive_postings(phrase) == (doc_ids, tfs)
+        assert list(pairs.search(phrase)[0].items()) == list(terms.search(phrase)[0].items())
+    assert found > 100
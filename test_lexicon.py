@@ -0,0 +1,26 @@
+from lexicon import Lexicon, LexiconWriter
+
+
+def test_lexicon(tmp_path):
+    terms = sorted(["alpha", "beta", "ação", "zeta", "b"], key=lambda term: term.encode("utf-8"))
+    writer = LexiconWriter()
+    for i, term in enumerate(terms):
+        writer.add(term, offset=(1 << 33) + 10 * i, length=i + 1, df=i + 2, ctf=(1 << 40) + i)
+    writer.write(str(tmp_path / "lexicon"))
+
+    lexicon = Lexicon(str(tmp_path / "lexicon"))
+    assert len(lexicon) == len(terms)
+    assert list(lexicon) == [(term, i + 2, (1 << 40) + i) for i, term in enumerate(terms)]
+    for i, term in enumerate(terms):
+        assert lexicon.find(term) == i
+        assert lexicon.get(term) == (i, (1 << 33) + 10 * i, i + 1, i + 2, (1 << 40) + i)
+
+    #   terms before, between and after the indexed ones
+    for term in ("", "a", "alphab", "c", "zz"):
+        assert lexicon.find(term) is None and lexicon.get(term) is None
+
+
+def test_empty_lexicon(tmp_path):
+    LexiconWriter().write(str(tmp_path / "lexicon"))
+    lexicon = Lexicon(str(tmp_path / "lexicon"))
+    assert len(lexicon) == 0 and list(lexicon) == [] and lexicon.find("a") is None
@@ -0,0 +1,36 @@
+from posting_cache import PostingCache
+
+SIZE = PostingCache.posting_size
+
+
+def test_lru_eviction():
+    cache = PostingCache(10 * SIZE)
+    loads = []
+
+    def load(key):
+        loads.append(key)
+        return list(range(key)), list(range(key))
+
+    assert cache.get(4, load) == (list(range(4)), list(range(4)))
+    cache.get(5, load)
+    cache.get(4, load)
+    #   4 was used last, so 5 is evicted to make room for 3
+    cache.get(3, load)
+    assert loads == [4, 5, 3]
+    assert 5 not in cache and 4 in cache and 3 in cache
+    assert cache.stats() == {"entries": 2, "bytes": 7 * SIZE, "max_bytes": 10 * SIZE, "hits": 1, "misses": 3, "evictions": 1, "hit_rate": 0.25}
+
+
+def test_budget():
+    cache = PostingCache(10 * SIZE)
+    #   a list larger than the budget is returned but not cached, a missing term takes the size of one posting
+    assert not cache.put("large", ([0] * 11, [0] * 11))
+    assert cache.put("missing", None)
+    assert cache.bytes == SIZE and "large" not in cache
+
+    #   replacing an entry does not count it twice
+    cache.put("term", ([0] * 5, [0] * 5))
+    cache.put("term", ([0] * 9, [0] * 9))
+    assert cache.bytes == 10 * SIZE and len(cache) == 2
+    cache.clear()
+    assert cache.bytes == 0 and len(cache) == 0
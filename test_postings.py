@@ -0,0 +1,118 @@
+import random
+from postings import *
+
+random.seed(0)
+
+
+def random_list(size: int):
+    #   sorted doc ids with small and large gaps, term frequencies and positions
+    doc_ids = sorted(random.sample(range(1 << 21), size))
+    positions = [sorted(random.sample(range(5000), random.randint(1, 6))) for _ in doc_ids]
+    return doc_ids, [len(doc_positions) for doc_positions in positions], positions
+
+
+def test_varints():
+    values = [0, 1, 127, 128, 255, 16383, 16384, 1 << 32, (1 << 63) - 1]
+    buffer = bytearray()
+    for value in values:
+        encode_varint(value, buffer)
+    assert decode_varints(buffer) == values
+
+    pos = 0
+    for value in values:
+        decoded, pos = decode_varint(buffer, pos)
+        assert decoded == value
+    assert pos == len(buffer)
+
+
+def test_postings():
+    doc_ids, tfs, positions = random_list(1000)
+    assert decode_postings(encode_postings(doc_ids, tfs)) == (doc_ids, tfs)
+    assert decode_positional_postings(encode_positional_postings(doc_ids, positions)) == (doc_ids, tfs, positions)
+    assert decode_gaps(encode_gaps(positions[0])) == positions[0]
+
+
+def test_skip_postings():
+    for size, block_size in ((1, 128), (128, 128), (129, 128), (1000, 16)):
+        doc_ids, tfs, _ = random_list(size)
+        payload = encode_skip_postings(doc_ids, tfs, block_size)
+        last_docs, offsets, position_offsets, start = decode_skips(payload)
+
+        #   one skip entry with the last doc id of every block, the blocks together are the whole list
+        assert last_docs == doc_ids[block_size - 1::block_size] + ([] if size % block_size == 0 else [doc_ids[-1]])
+        assert position_offsets is None
+        assert decode_postings(skip_blocks(payload)) == (doc_ids, tfs)
+
+        #   a block decoded on its own continues from the last doc id of the previous block
+        for block in range(len(last_docs)):
+            block_doc_ids, block_tfs = decode_postings(payload[start + offsets[block]:start + offsets[block + 1]])
+            base = last_docs[block - 1] if block else 0
+            assert [doc_id + base for doc_id in block_doc_ids] == doc_ids[block * block_size:(block + 1) * block_size]
+            assert block_tfs == tfs[block * block_size:(block + 1) * block_size]
+
+
+def test_positional_skip_postings():
+    doc_ids, tfs, positions = random_list(300)
+    block_size = 64
+    payload = encode_positional_skip_postings(doc_ids, positions, block_size)
+    last_docs, offsets, position_offsets, start = decode_skips(payload, positional=True)
+    stream = payload[start + offsets[-1]:]
+    assert len(stream) == position_offsets[-1]
+
+    decoded_doc_ids, decoded_tfs, lengths = decode_positional_skip_blocks(skip_blocks(payload, positional=True))
+    assert decoded_doc_ids == doc_ids and decoded_tfs == tfs
+
+    #   the positions of every document are found in the stream from the lengths of the block
+    for block in range(len(last_docs)):
+        _, _, lengths = decode_positional_skip_blocks(payload[start + offsets[block]:start + offsets[block + 1]])
+        offset = position_offsets[block]
+        for i, length in enumerate(lengths, block * block_size):
+            assert decode_gaps(stream[offset:offset + length]) == positions[i]
+            offset += length
+
+
+def test_records(tmp_path):
+    records = [("alpha", encode_postings([1, 5], [2, 1])), ("ação", bytearray()), ("beta", bytearray(range(200)))]
+    data = b"".join(encode_record(term, payload) for term, payload in records)
+
+    pos = 0
+    for term, payload in records:
+        decoded_term, decoded_payload, pos = decode_record(data, pos)
+        assert (decoded_term, bytes(decoded_payload)) == (term, bytes(payload))
+    assert pos == len(data)
+
+    (tmp_path / "index").write_bytes(data)
+    assert list(read_records(str(tmp_path / "index"))) == [(term, bytes(payload)) for term, payload in records]
+
+
+def test_blocks():
+    block = PositionalPostingsBlock()
+    block.add_document(0, ["b", "a", "b"])
+    block.add_document(3, ["a"])
+    assert list(block.lines()) == ["a;0:1;3:0\n", "b;0:0,2\n"]
+
+    block = PostingsBlock()
+    block.add_document(0, ["b", "a", "b"])
+    block.add_document(3, ["a"])
+    assert list(block.lines()) == ["a;0:1;3:1\n", "b;0:2\n"]
+
+
+def test_random_blocks():
+    #   the typed arrays of a block give the same lines as postings kept in dictionaries, also after it is cleared
+    for block, positional in ((PostingsBlock(), False), (PositionalPostingsBlock(), True)):
+        for _ in range(2):
+            expected = {}
+            size = block.size
+            for doc_id in sorted(random.sample(range(10000), 200)):
+                tokens = [f"term{random.randrange(50)}" for _ in range(random.randint(0, 30))]
+                block.add_document(doc_id, tokens)
+                for i, term in enumerate(tokens):
+                    expected.setdefault(term, {}).setdefault(doc_id, []).append(i)
+                assert block.size >= size
+                size = block.size
+
+            lines = [f"{term};{';'.join(f'{doc_id}:' + (','.join(map(str, positions)) if positional else str(len(positions))) for doc_id, positions in postings.items())}\n"
+                     for term, postings in sorted(expected.items())]
+            assert list(block.lines()) == lines and len(block) == len(expected)
+            block.clear()
+            assert len(block) == 0 and block.size == 0 and list(block.lines()) == []
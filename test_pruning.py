@@ -0,0 +1,84 @@
+import random
+import pytest
+from accumulators import ScoreAccumulator
+from pruning import max_score
+
+np = pytest.importorskip("numpy")
+random.seed(0)
+N = 5000
+
+
+def random_lists(n: int):
+    #   lists of very different lengths, with scores rounded so many documents tie
+    lists = []
+    for _ in range(n):
+        doc_ids = sorted(random.sample(range(N), random.choice((1, 20, 300, 3000))))
+        lists.append((doc_ids, [round(random.uniform(0.1, 3), 1) for _ in doc_ids]))
+    return lists
+
+
+def exhaustive_top(lists, k: int):
+    accumulator = ScoreAccumulator(N, N)
+    for doc_ids, scores in lists:
+        accumulator.add(doc_ids, np.asarray(scores))
+    return accumulator.top(k), len(accumulator)
+
+
+def pruning_list(doc_ids: list[int], scores: list[float], block_size: int, upper_bound: float, decoded: list = None):
+    #   (last_docs, score_blocks, upper_bound) of a list split in blocks of block_size postings, the decoded blocks are
+    #   appended to decoded
+    starts = range(0, len(doc_ids), block_size)
+
+    def score_blocks(blocks):
+        if decoded is not None:
+            decoded.extend(blocks)
+        indexes = [i for block in blocks for i in range(starts[block], min(starts[block] + block_size, len(doc_ids)))]
+        return np.asarray(doc_ids, dtype=np.intp)[indexes], np.asarray(scores)[indexes]
+
+    return [doc_ids[min(start + block_size, len(doc_ids)) - 1] for start in starts], score_blocks, upper_bound
+
+
+def test_max_score():
+    for _ in range(50):
+        lists = random_lists(random.randint(1, 6))
+        k = random.choice((1, 10, 100))
+        #   the bound of a list can be above its highest score and a repeated term repeats the same list
+        pruning_lists = [pruning_list(doc_ids, scores, random.choice((1, 16, 128)), max(scores) * random.choice((1, 1.5))) for doc_ids, scores in lists]
+        repeat = random.randrange(len(lists))
+        lists.append(lists[repeat])
+        pruning_lists.append(pruning_lists[repeat])
+
+        top, count, counted = max_score(pruning_lists, k, N)
+        expected, expected_count = exhaustive_top(lists, k)
+        assert top == expected
+        assert count == expected_count if counted else count <= expected_count
+
+
+def test_max_score_skips_blocks():
+    #   once the top-k is full with the documents of the short list, the long list only decodes their blocks
+    short = (list(range(0, N, 500)), [10.0] * 10)
+    long = (list(range(N)), [1.0] * N)
+    decoded = []
+    lists = [pruning_list(*short, 4, 10.0), pruning_list(*long, 16, 1.0, decoded)]
+
+    top, count, counted = max_score(lists, 5, N)
+    assert top == exhaustive_top([short, long], 5)[0]
+    assert len(decoded) == 10 and not counted and count == 10 * 16
+
+
+def test_max_score_empty():
+    assert max_score([], 10, N) == ([], 0, True)
+    assert max_score([pruning_list([], [], 16, 0.0)], 10, N) == ([], 0, True)
+
+
+def test_pruned_search(build, searcher):
+    folder, _ = build("index", skip_block_size=8)
+    for k in (1, 10, 100):
+        exhaustive = searcher(folder, top_k=k)
+        pruned = searcher(folder, top_k=k, dynamic_pruning=True)
+        for _ in range(20):
+            query_tokens = [f"word{random.randrange(300)}" for _ in range(random.randint(1, 12))] + ["unknown"]
+            results, _, count = exhaustive.search(query_tokens)
+            pruned_results, _, pruned_count = pruned.search(query_tokens)
+            assert list(pruned_results.items()) == list(results.items())
+            assert pruned_count == count if getattr(pruned_results, "counted", True) else pruned_count <= count
@@ -0,0 +1,89 @@
+import os
+import result_cache
+from result_cache import ResultCache
+
+
+class Clock:
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def new_cache(tmp_path, monkeypatch, **kwargs):
+    clock = Clock()
+    monkeypatch.setattr(result_cache.time, "time", clock)
+    (tmp_path / "metadata.json").write_text('{"N": 10}')
+    return ResultCache(str(tmp_path / "metadata.json"), **kwargs), clock
+
+
+def test_key():
+    #   the order of the tokens does not matter, their count, the ranking and the top-k do
+    assert ResultCache.key(["b", "a"], ("bm25", 1.2, 0.75), 10) == ResultCache.key(["a", "b"], ("bm25", 1.2, 0.75), 10)
+    assert ResultCache.key(["a", "a"], ("bm25", 1.2, 0.75), 10) != ResultCache.key(["a"], ("bm25", 1.2, 0.75), 10)
+    assert ResultCache.key(["a"], ("bm25", 1.2, 0.75), 10) != ResultCache.key(["a"], ("bm25", 1.2, 0.5), 10)
+    assert ResultCache.key(["a"], ("bm25", 1.2, 0.75), 10) != ResultCache.key(["a"], ("bm25", 1.2, 0.75), 100)
+
+
+def test_ttl(tmp_path, monkeypatch):
+    cache, clock = new_cache(tmp_path, monkeypatch, ttl=60)
+    cache.put("q", [{"1": 2.0}, 1])
+    clock.now += 60
+    assert cache.get("q") == [{"1": 2.0}, 1]
+    clock.now += 1
+    assert cache.get("q") is None and "q" not in cache.entries
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_lru(tmp_path, monkeypatch):
+    cache, _ = new_cache(tmp_path, monkeypatch, max_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert list(cache.entries) == ["a", "c"]
+
+
+def test_invalidation(tmp_path, monkeypatch):
+    cache, _ = new_cache(tmp_path, monkeypatch)
+    cache.put("q", 1)
+    #   a new mtime with the same metadata keeps the entries, new metadata drops them
+    os.utime(tmp_path / "metadata.json", ns=(0, 1))
+    assert cache.get("q") == 1
+    (tmp_path / "metadata.json").write_text('{"N": 11}')
+    os.utime(tmp_path / "metadata.json", ns=(0, 2))
+    assert cache.get("q") is None
+
+
+def test_snapshot(tmp_path, monkeypatch):
+    cache, clock = new_cache(tmp_path, monkeypatch, ttl=60, snapshot_path=str(tmp_path / "snapshot"))
+    cache.put("old", 1)
+    clock.now += 30
+    cache.put("new", 2)
+    cache.save()
+
+    #   the expired entries are not loaded
+    clock.now += 40
+    assert ResultCache(str(tmp_path / "metadata.json"), ttl=60, snapshot_path=str(tmp_path / "snapshot")).entries == {"new": (1030.0, 2)}
+
+    #   a snapshot of other metadata is ignored
+    (tmp_path / "metadata.json").write_text('{"N": 11}')
+    assert not ResultCache(str(tmp_path / "metadata.json"), ttl=60, snapshot_path=str(tmp_path / "snapshot")).entries
+
+    (tmp_path / "snapshot").write_text("{")
+    assert not ResultCache(str(tmp_path / "metadata.json"), snapshot_path=str(tmp_path / "snapshot")).entries
+
+
+def test_search_settings(build, searcher, tmp_path):
+    #   a snapshot only answers the searches with the settings that stored its results
+    folder, _ = build("index")
+    snapshot = str(tmp_path / "results")
+    pruned = searcher(folder, dynamic_pruning=True, result_cache=16, result_cache_snapshot=snapshot)
+    pruned.cached_search(["word1", "word2"])
+    pruned.result_cache.save()
+
+    assert searcher(folder, result_cache=16, result_cache_snapshot=snapshot).cached_results(["word1", "word2"]) is None
+    assert searcher(folder, top_k=5, dynamic_pruning=True, result_cache=16, result_cache_snapshot=snapshot).cached_results(["word1", "word2"]) is None
+    assert searcher(folder, dynamic_pruning=True, result_cache=16, result_cache_snapshot=snapshot).cached_results(["word2", "word1"]) is not None
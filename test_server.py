@@ -0,0 +1,91 @@
+import asyncio
+import json
+import os
+from urllib.parse import quote
+from server import SearchServer, worker_pool
+
+
+def serve(searcher, workers: int):
+    server = SearchServer(searcher, workers=workers)
+    server.executor = worker_pool(searcher, workers)
+    return server
+
+
+def test_stats(build, searcher):
+    #   the posting cache counters are the ones of the worker that answers
+    folder, _ = build("index")
+    server = serve(searcher(folder, posting_cache=1, result_cache=16), 2)
+    try:
+        for _ in range(4):
+            status, stats = asyncio.run(server.route("GET", "/stats", b""))
+            assert status == 200 and stats["workers"] == 2
+            assert stats["posting_cache"]["worker_pid"] != os.getpid() and stats["posting_cache"]["max_bytes"] == 1024 * 1024
+            assert stats["result_cache"]["max_entries"] == 16
+    finally:
+        server.executor.shutdown()
+
+
+def test_search(build, searcher):
+    #   GET and POST answer the results of the searcher, from the workers or from the result cache
+    folder, _ = build("index")
+    reference = searcher(folder)
+    for workers, result_cache in ((1, 0), (2, 16)):
+        server = serve(searcher(folder, result_cache=result_cache), workers)
+        try:
+            for query_text in ("word1 word7", "word20 word3 unknown", "word1 word7"):
+                expected = reference.result_json("q", reference.search(reference.process_query(query_text))[0])
+                assert asyncio.run(server.route("GET", f"/search?query_id=q&query_text={quote(query_text)}", b"")) == (200, expected)
+                body = json.dumps({"query_id": "q", "query_text": query_text}).encode()
+                assert asyncio.run(server.route("POST", "/search", body)) == (200, expected)
+        finally:
+            server.executor.shutdown()
+
+
+def test_errors(build, searcher):
+    folder, _ = build("index")
+    server = serve(searcher(folder), 1)
+    try:
+        assert asyncio.run(server.route("GET", "/other", b""))[0] == 404
+        assert asyncio.run(server.route("DELETE", "/search", b""))[0] == 405
+        assert asyncio.run(server.route("POST", "/stats", b""))[0] == 405
+        assert asyncio.run(server.route("POST", "/search", b"{")) == (400, {"error": "invalid json"})
+        assert asyncio.run(server.route("POST", "/search", b"[]")) == (400, {"error": "missing query_text"})
+        assert asyncio.run(server.route("GET", "/search?query_id=q", b"")) == (400, {"error": "missing query_text"})
+    finally:
+        server.executor.shutdown()
+
+
+def test_connection(build, searcher):
+    #   several requests on a kept alive connection, the connection is closed after a body that is too large
+    folder, _ = build("index")
+    server = serve(searcher(folder), 1)
+
+    async def requests():
+        listener = await asyncio.start_server(server.handle, "127.0.0.1", 0)
+        reader, writer = await asyncio.open_connection(*listener.sockets[0].getsockname()[:2])
+        responses = []
+        for body, length in ((b'{"query_text": "word1"}', 23), (b"{", 1), (b"", server.max_body_size + 1)):
+            writer.write(b"POST /search HTTP/1.1\r\nContent-Length: %d\r\n\r\n" % length + body)
+            await writer.drain()
+            status = await reader.readline()
+            if not status:
+                break
+            headers = {}
+            line = await reader.readline()
+            while line.strip():
+                name, _, value = line.decode().partition(":")
+                headers[name.lower()] = value.strip()
+                line = await reader.readline()
+            responses.append((status.split()[1], json.loads(await reader.readexactly(int(headers["content-length"])))))
+        closed = await reader.read() == b""
+        writer.close()
+        listener.close()
+        await listener.wait_closed()
+        return responses, closed
+
+    try:
+        responses, closed = asyncio.run(requests())
+    finally:
+        server.executor.shutdown()
+    assert [status for status, _ in responses] == [b"200", b"400", b"413"] and closed
+    assert len(responses[0][1]["documents_pmid"]) == 10
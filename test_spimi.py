@@ -0,0 +1,47 @@
+import os
+from indexer import SPIMI
+from memory_manager import MemoryManager
+
+
+def files(folder: str) -> dict:
+    #   contents of the files of an index folder
+    contents = {}
+    for file in sorted(os.listdir(folder)):
+        with open(f"{folder}{file}", "rb") as f:
+            contents[file] = f.read()
+    return contents
+
+
+def test_parallel_build(build, monkeypatch):
+    #   the workers invert blocks of documents in parallel, the index, the lexicon, the document table and the
+    #   norms are the same bytes as the ones of a single process
+    monkeypatch.setattr(SPIMI, "parallel_block_size", 60)
+    for options in ({}, {"store_term_positions": True}, {"bm25_cache_in_disk": True}, {"index_format": "text"}):
+        sequential, _ = build("sequential", **options)
+        parallel, _ = build("parallel", workers=3, **options)
+        assert files(parallel) == files(sequential)
+
+
+def test_min_block_budget(collection, capsys):
+    #   a high-water mark below the memory in use still gives blocks of the minimum budget
+    manager = MemoryManager(memory_limit_percentage=1e-9)
+    manager.start_accounting(2, 1000)
+    assert manager.budget == 1000 and "using blocks of" in capsys.readouterr().out
+
+    MemoryManager._MemoryManager__instance = None
+    manager = MemoryManager()
+    manager.start_accounting(2, 1000)
+    assert manager.budget > 1000 and "using blocks of" not in capsys.readouterr().out
+
+
+def test_merge_passes(build, monkeypatch, capsys):
+    #   tiny blocks give many runs, merged a few at a time in several passes into the index of a single run
+    single, _ = build("single")
+    capsys.readouterr()
+    monkeypatch.setattr(SPIMI, "min_block_budget", 2000)
+    monkeypatch.setattr(SPIMI, "max_merge_fan_in", 3)
+    for workers in (1, 2):
+        passes, _ = build("passes", memory_threshold=1e-9, workers=workers)
+        out = capsys.readouterr().out
+        assert "Intermediate merge passes:" in out and "Intermediate merge passes:   1\n" not in out
+        assert files(passes) == files(single)
@@ -0,0 +1,54 @@
+import math
+import random
+import pytest
+import utils
+from utils import *
+
+pytest.importorskip("numpy")
+random.seed(0)
+N = 10000
+TFS = [random.choice((1, 1, 2, 3, 7, 40)) for _ in range(1000)]
+DLS = [random.randint(1, 600) for _ in TFS]
+
+
+def fallback(monkeypatch, kernel, *args):
+    #   result of the kernel without numpy
+    with monkeypatch.context() as patch:
+        patch.setattr(utils, "np", None)
+        return kernel(*args)
+
+
+def assert_ulps(values, expected, ulps: int = 1):
+    #   numpy and math can round the logarithms differently in the last bit
+    assert len(values) == len(expected)
+    for value, other in zip(values, expected):
+        assert abs(value - other) <= ulps * math.ulp(other)
+
+
+def test_rsv_array(monkeypatch):
+    idfs = [math.log10(N / random.randint(1, N)) for _ in TFS]
+    for idf in (idfs, idfs[0]):
+        values = rsv_array(0.75, 1.2, idf, TFS, DLS, 123.4)
+        assert values.tolist() == fallback(monkeypatch, rsv_array, 0.75, 1.2, idf, TFS, DLS, 123.4)
+    assert rsv_array(0.75, 1.2, idfs[0], TFS, DLS, 123.4).tolist() == [rsv(0.75, 1.2, idfs[0], tf, dl, 123.4) for tf, dl in zip(TFS, DLS)]
+
+
+def test_term_frequency_weighting_array(monkeypatch):
+    for smart in "nlb":
+        expected = fallback(monkeypatch, term_frequency_weighting_array, smart, TFS)
+        assert expected == [single_term_frequency_weighting(smart, tf) for tf in TFS]
+        assert_ulps(term_frequency_weighting_array(smart, TFS).tolist(), expected)
+
+
+def test_document_frequency_weighting_array(monkeypatch):
+    #   the prob idf of a term in every document is not defined
+    dfs = [random.randint(1, N - 1) for _ in range(1000)] + [1, N // 2]
+    for smart in "ntp":
+        expected = fallback(monkeypatch, document_frequency_weighting_array, smart, dfs, N)
+        assert expected == [single_document_frequency_weighting(smart, df, N) for df in dfs]
+        assert_ulps(document_frequency_weighting_array(smart, dfs, N).tolist(), expected)
+
+
+def test_scale_array(monkeypatch):
+    weights = term_frequency_weighting_array("l", TFS)
+    assert scale_array(0.37, weights).tolist() == fallback(monkeypatch, scale_array, 0.37, weights.tolist())
@@ -1,4 +1,11 @@
 import math
+from itertools import repeat
+
+#   numpy is optional, the array kernels fall back to plain python when it is not installed
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 def load_index(path_to_index: str) -> dict:
 
@@ -96,6 +103,72 @@ def single_term_frequency_weighting(smart, freq) -> int:
 
     raise NotImplementedError()
 
+def single_document_frequency_weighting(smart, doc_freq, N) -> float:
+
+    if smart == 'n':
+        # Return no document frequency
+        return 1
+
+    if smart == 't':
+        # Return idf
+        return math.log10(N / doc_freq)
+
+    if smart == 'p':
+        # Return prob idf
+        return max(0, math.log10((N - doc_freq) / doc_freq))
+
+    raise NotImplementedError()
+
+# Calculates the term frequency weight of every posting of a list with algorithm tf
+def term_frequency_weighting_array(smart, tfs):
+    if np is None:
+        return [single_term_frequency_weighting(smart, tf) for tf in tfs]
+
+    tfs = np.asarray(tfs, dtype=np.float64)
+    if smart == 'n':
+        return tfs
+
+    if smart == 'l':
+        return 1 + np.log10(tfs)
+
+    if smart == 'b':
+        return np.ones_like(tfs)
+
+    raise NotImplementedError()
+
+# Calculates the document frequency weight of many terms at once with algorithm df
+def document_frequency_weighting_array(smart, doc_freqs, N):
+    if np is None:
+        return [single_document_frequency_weighting(smart, doc_freq, N) for doc_freq in doc_freqs]
+
+    doc_freqs = np.asarray(doc_freqs, dtype=np.float64)
+    if smart == 'n':
+        return np.ones_like(doc_freqs)
+
+    if smart == 't':
+        return np.log10(N / doc_freqs)
+
+    if smart == 'p':
+        return np.maximum(0, np.log10((N - doc_freqs) / doc_freqs))
+
+    raise NotImplementedError()
+
+def scale_array(factor: float, values):
+    # Multiplies the weights of a posting list by a single factor
+    if np is None:
+        return [factor * value for value in values]
+    return factor * np.asarray(values, dtype=np.float64)
+
 def rsv(bm25_b:float, bm25_k1:float, idf: float, tf: int, dl: int, avgdl: float):
 
-    return idf * ((tf * (bm25_k1 + 1)) / (tf + bm25_k1 * (1-bm25_b) + bm25_b * (dl / avgdl)))
\ No newline at end of file
+    return idf * ((tf * (bm25_k1 + 1)) / (tf + bm25_k1 * (1-bm25_b) + bm25_b * (dl / avgdl)))
+
+def rsv_array(bm25_b: float, bm25_k1: float, idfs, tfs, dls, avgdl: float):
+    # Calculates the rsv of many postings at once, idfs, tfs and dls are aligned sequences, idfs can be the single idf of a list
+    if np is None:
+        if isinstance(idfs, (int, float)):
+            idfs = repeat(idfs)
+        return [rsv(bm25_b, bm25_k1, idf, tf, dl, avgdl) for idf, tf, dl in zip(idfs, tfs, dls)]
+
+    tfs = np.asarray(tfs, dtype=np.float64)
+    return np.asarray(idfs) * ((tfs * (bm25_k1 + 1)) / (tfs + bm25_k1 * (1-bm25_b) + bm25_b * (np.asarray(dls) / avgdl)))